@@ -4,16 +4,84 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///app_database.db"
+    DATABASE_ECHO: bool = False  # Log every SQL statement (debugging only, costs throughput)
+    ASYNC_DATABASE_URL: str = ""  # Async driver URL; derived from DATABASE_URL (sqlite+aiosqlite / postgresql+asyncpg) if empty
+    SQLITE_WAL: bool = True  # journal_mode=WAL: readers do not block the writer and vice versa
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # Wait this long for a competing write lock instead of failing
     AI_API_KEY: str = "your_ai_api_key_please_set_in_env"
     WEBHOOK_URL: str = "https://example.com/webhook"
+    WEBHOOK_ROUTES: str = ""  # JSON list of {"name", "url", "feedback_types"} routes; empty sends every report to WEBHOOK_URL
+    WEBHOOK_TIMEOUT_SECONDS: float = 10.0  # Per-request timeout for webhook deliveries
+    WEBHOOK_MAX_ATTEMPTS: int = 8  # Delivery attempts before an outbox entry is marked failed
+    WEBHOOK_RETRY_BASE_DELAY_SECONDS: float = 5.0
+    WEBHOOK_RETRY_MAX_DELAY_SECONDS: float = 900.0
+    WEBHOOK_POLL_SECONDS: float = 5.0  # How often the delivery worker looks for due outbox entries
+    WEBHOOK_DELIVERY_CONCURRENCY: int = 8  # Max concurrent webhook POSTs
     OPENAI_MODEL_NAME: str = "X.grok-3-mini-fast-beta"
     OPENAI_API_BASE_URL: str = "https://ai.bangwu.top/api/"
+    OPENAI_REQUEST_TIMEOUT_SECONDS: float = 120.0  # Per-request timeout for LLM calls
+    OPENAI_MAX_RETRIES: int = 3  # Retries on 429/5xx/timeouts, with jittered exponential backoff
+    OPENAI_RETRY_BASE_DELAY_SECONDS: float = 1.0
+    OPENAI_RETRY_MAX_DELAY_SECONDS: float = 30.0
     SUMMARY_SCHEDULE_HOURS: str = "17"  # Default to run daily at midnight UTC, comma-separated for multiple hours e.g., "0,6,12,18"
     SUMMARY_INTERVAL_HOURS: int = (
         0  # Alternative: run every X hours, 0 to disable interval-based scheduling
     )
+    LLM_CACHE_ENABLED: bool = True  # Reuse stored completions for identical prompts (restarts, overlapping windows)
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # How long a cached completion may be reused
+    LLM_CACHE_MAX_ENTRIES: int = 5000  # Least recently used completions beyond this are evicted
+    SUMMARY_CHUNK_TOKEN_BUDGET: int = 12000  # Max estimated feedback tokens per LLM prompt before map-reduce kicks in
+    SUMMARY_MAX_CONCURRENCY: int = 4  # Max concurrent LLM calls during map-reduce summarization
+    SUMMARY_DEDUP_ENABLED: bool = True  # Collapse identical / near-identical feedback before prompting
+    SUMMARY_DEDUP_SIMILARITY: float = 0.8  # Jaccard similarity of character 3-grams to treat as near-duplicate
+    SUMMARY_FETCH_BATCH_SIZE: int = 1000  # Rows fetched per keyset page by the summary jobs
+    SUMMARY_SEGMENT_BY: str = ""  # "app_channel" or "app_version": one report per value instead of a combined one
+    SUMMARY_SEGMENT_MIN_COUNT: int = 20  # Segments with fewer entries are folded into one "其他" report
+    SUMMARY_SEGMENT_CONCURRENCY: int = 3  # Segment reports generated at once (each with up to SUMMARY_MAX_CONCURRENCY calls)
+    IMAGE_LINK_VALIDATION_ENABLED: bool = True  # Check image_url links before prompting and drop broken ones
+    IMAGE_CHECK_CONCURRENCY: int = 16  # Max concurrent image link checks
+    IMAGE_CHECK_TIMEOUT_SECONDS: float = 5.0  # Per-request timeout for a link check
+    IMAGE_CHECK_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # Reuse link check results for a week (daily -> weekly)
+    IMAGE_CHECK_CACHE_MAX_ENTRIES: int = 100000
+    IMAGE_CHECK_ALLOW_PRIVATE_HOSTS: bool = False  # Allow loopback/private IP links (local testing only)
+    WEEKLY_SUMMARY_MODE: str = (
+        "incremental"  # "incremental" reuses stored daily summaries, "full" re-summarizes all raw feedback
+    )
     RUN_SUMMARY_ON_STARTUP: bool = False  # Added for debugging startup task
     RUN_WEEKLY_SUMMARY_ON_STARTUP: bool = False
+    FEEDBACK_INGEST_MODE: str = (
+        "sync"  # "sync" commits each row per request, "group_commit" batches rows through a background writer
+    )
+    INGEST_BATCH_MAX_SIZE: int = 256  # group_commit: flush once this many rows are queued
+    INGEST_BATCH_MAX_WAIT_MS: int = 20  # group_commit: flush at most this long after the first queued row
+    INGEST_QUEUE_MAX_SIZE: int = 10000  # group_commit: bounded queue, requests are rejected when full
+    INGEST_SUBMIT_TIMEOUT_SECONDS: float = 10.0  # group_commit: how long a request waits for its commit
+    INGEST_BULK_CHUNK_SIZE: int = 500  # POST /feedback/batch: rows per multi-row INSERT
+    IDEMPOTENCY_ENABLED: bool = True  # Honour Idempotency-Key and suppress identical re-submissions
+    DUPLICATE_WINDOW_SECONDS: int = 300  # Identical (user_uid, device_id, feedback) within this window is a retry (up to 2x apart if recently seen)
+    IDEMPOTENCY_CACHE_MAX_ENTRIES: int = 10000  # Recent submissions answered from memory
+    INGEST_MAX_IN_FLIGHT_WRITES: int = 64  # In-flight POST /feedback/ and /feedback/batch requests; more get 503, 0 disables
+    RATE_LIMIT_ENABLED: bool = True  # Per-device / per-user token buckets on POST /feedback/ (and per item of /feedback/batch)
+    RATE_LIMIT_DEVICE_PER_MINUTE: float = 30  # Sustained submissions per device_id
+    RATE_LIMIT_DEVICE_BURST: int = 10  # Submissions a device may make back to back
+    RATE_LIMIT_USER_PER_MINUTE: float = 30  # Sustained submissions per user_uid
+    RATE_LIMIT_USER_BURST: int = 10
+    RATE_LIMIT_MAX_TRACKED_KEYS: int = 200000  # Buckets kept per limiter (LRU evicted), bounds memory
+    SCHEDULER_LEADER_ELECTION: bool = True  # Only the worker holding the DB lease runs scheduled jobs
+    SCHEDULER_LEASE_TTL_SECONDS: int = 30  # A dead leader is replaced at most this long after its last renewal
+    SCHEDULER_LEASE_RENEW_SECONDS: int = 10  # Heartbeat interval for renewing / trying to take the lease
+    WORKER_ID: str = ""  # Lease owner name, defaults to "<hostname>:<pid>"
+    FEEDBACK_RETENTION_DAYS: int = 0  # Move feedback older than this many days to the archive, 0 disables
+    FEEDBACK_ARCHIVE_DIR: str = "archive"  # Monthly gzip JSONL archive files (feedback-YYYY-MM.jsonl.gz)
+    FEEDBACK_ARCHIVE_BATCH_SIZE: int = 1000  # Rows moved per short delete transaction
+    FEEDBACK_RETENTION_HOUR: int = 3  # Daily retention run at this hour (UTC+8)
+    SPIKE_DETECTION_ENABLED: bool = True  # Alert through the webhooks when a (type, version, channel) bucket surges
+    SPIKE_WINDOW_MINUTES: int = 10  # Sliding window the current rate is counted over
+    SPIKE_THRESHOLD_MULTIPLIER: float = 3.0  # Alert when the window count exceeds this multiple of the baseline
+    SPIKE_MIN_COUNT: int = 20  # ...and holds at least this many submissions (keeps quiet buckets from alerting)
+    SPIKE_BASELINE_HALF_LIFE_HOURS: float = 6.0  # Decay of the per-bucket baseline rate
+    SPIKE_BASELINE_LOOKBACK_HOURS: int = 24  # History read from the hourly rollups to seed baselines on startup
+    SPIKE_ALERT_COOLDOWN_MINUTES: int = 60  # At most one alert per bucket within this period
 
     class Config:
         env_file = ".env"  # Load variables from .env file in the project root
@@ -0,0 +1,280 @@
+# app/core/metrics.py
+"""
+Minimal in-process Prometheus metrics (text exposition format 0.0.4).
+Each metric keeps a dict of label values -> numbers guarded by a lock, so
+recording a sample is a dict lookup and a few additions.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 2)
+            data[index] += 1
+            data[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the `with` block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels) -> Tuple[int, float]:
+        """Returns (observation count, sum of observed values) for one label set."""
+        with self._lock:
+            data = self._values.get(self._key(labels))
+            if data is None:
+                return 0, 0.0
+            return sum(data[:-1]), data[-1]
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        for key, data in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), data[:-1]):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(float(bound))}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(data[-1]))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request latency per method, route template
+    and status code (cheaper than BaseHTTPMiddleware, no body buffering).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status["code"],
+            )
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency.",
+    ["method", "route", "status"],
+)
+DB_COMMIT_SECONDS = Histogram(
+    "feedback_db_commit_seconds",
+    "Time spent committing feedback inserts.",
+    ["operation"],
+)
+FEEDBACK_ROWS_INGESTED = Counter(
+    "feedback_rows_ingested_total",
+    "Feedback rows committed to the database.",
+    ["operation"],
+)
+SUMMARY_STAGE_SECONDS = Histogram(
+    "summary_stage_duration_seconds",
+    "Duration of each summary job stage (fetch, aggregate, llm, enqueue).",
+    ["job", "stage"],
+)
+SUMMARY_RUNS = Counter(
+    "summary_runs_total",
+    "Summary job runs by outcome (success, failure, empty).",
+    ["job", "outcome"],
+)
+LLM_REQUESTS = Counter(
+    "llm_requests_total",
+    "Chat completion requests by outcome (success, failure, retry).",
+    ["outcome"],
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported by the LLM API.",
+    ["kind"],
+)
+LLM_CACHE_LOOKUPS = Counter(
+    "llm_cache_lookups_total",
+    "LLM response cache lookups by result (hit, miss, error).",
+    ["result"],
+)
+IMAGE_LINK_CHECKS = Counter(
+    "image_link_checks_total",
+    "Image link checks by result (valid, invalid, error, rejected, cached).",
+    ["result"],
+)
+INGEST_REJECTIONS = Counter(
+    "feedback_ingest_rejected_total",
+    "Feedback submissions refused by admission control, by reason.",
+    ["reason"],
+)
+FEEDBACK_ROWS_ARCHIVED = Counter(
+    "feedback_rows_archived_total",
+    "Feedback rows moved from the database to the cold archive.",
+)
+DUPLICATE_SUBMISSIONS = Counter(
+    "feedback_duplicate_submissions_total",
+    "Retried / duplicate feedback submissions answered with the original row.",
+    ["source"],
+)
+WEBHOOK_DELIVERIES = Counter(
+    "webhook_deliveries_total",
+    "Webhook delivery attempts by route and outcome (delivered, retry, failed).",
+    ["route", "outcome"],
+)
+SPIKE_ALERTS = Counter(
+    "feedback_spike_alerts_total",
+    "Spike alerts raised by the ingestion spike detector, by feedback type.",
+    ["feedback_type"],
+)
+WEBHOOK_DELIVERY_SECONDS = Histogram(
+    "webhook_delivery_duration_seconds",
+    "Latency of webhook delivery attempts.",
+    ["route"],
+)
+STARTUP_PHASE_SECONDS = Gauge(
+    "app_startup_phase_seconds",
+    "Duration of each cold-start phase of this process (import, migrations, ...).",
+    ["phase"],
+)
@@ -0,0 +1,42 @@
+# app/core/startup.py
+"""
+Cold-start timing: how long importing the application and each startup phase
+took in this process, printed once startup completes and exported as the
+app_startup_phase_seconds gauge so restarts can be compared.
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from .metrics import STARTUP_PHASE_SECONDS
+
+
+class StartupReport:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = seconds
+        STARTUP_PHASE_SECONDS.set(round(seconds, 6), phase=phase)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Records the wall time of the `with` block as phase `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            **{phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+            "total": round(sum(self.phases.values()), 4),
+        }
+
+    def log(self):
+        parts = [f"{phase} {seconds:.3f}s" for phase, seconds in self.as_dict().items()]
+        print(f"Startup report: {' | '.join(parts)}")
+
+
+startup_report = StartupReport()
@@ -1,32 +1,245 @@
 # app/crud.py
+import html
+import re
 from sqlmodel import Session, select, and_  # Added and_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import DateTime, delete, func, insert, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects import postgresql, sqlite
 from datetime import datetime, timezone, timedelta, date
-from typing import List
+from typing import Any, AsyncIterator, Iterator, List, Sequence, Tuple
 from . import models, schemas
+from .core import metrics
+from .services import feedback_archive
 
 
-def create_feedback_db(
-    session: Session, feedback_in: schemas.UserFeedbackCreate
-) -> models.UserFeedback:
+def _now_utc_plus_8_naive() -> datetime:
     """
-    Creates a new feedback entry in the database.
-    The created_at field is set to current UTC+8 time and stored as a naive datetime.
+    Returns the current UTC+8 time as a naive datetime, matching how
+    created_at is stored in the database.
     """
-    db_feedback = models.UserFeedback.model_validate(feedback_in)
-
     # Define UTC+8 timezone
     utc_plus_8 = timezone(timedelta(hours=8))
     # Get current time in UTC+8
     now_utc_plus_8 = datetime.now(utc_plus_8)
     # Convert to naive datetime for storage, as per model's sa_column definition
-    db_feedback.created_at = now_utc_plus_8.replace(tzinfo=None)
+    return now_utc_plus_8.replace(tzinfo=None)
 
-    session.add(db_feedback)
-    session.commit()
-    session.refresh(db_feedback)
+
+ROLLUP_DIMENSIONS = ("feedback_type", "app_version", "app_channel")
+
+
+def _hour_bucket(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _increment_hourly_rollups(session: Session, rows: Sequence[Any]):
+    """
+    Adds freshly inserted feedback to the hourly rollups in the caller's
+    transaction with one upsert statement. `rows` are objects or dicts with
+    created_at and the rollup dimensions. Dialects without an upsert are left
+    to rebuild_hourly_rollups.
+    """
+    counts: dict = {}
+    for row in rows:
+        values = row if isinstance(row, dict) else vars(row)
+        key = (_hour_bucket(values["created_at"]),) + tuple(
+            values[dimension] for dimension in ROLLUP_DIMENSIONS
+        )
+        counts[key] = counts.get(key, 0) + 1
+    if not counts:
+        return
+
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        upsert = sqlite.insert
+    elif dialect == "postgresql":
+        upsert = postgresql.insert
+    else:
+        return
+    rollup = models.FeedbackHourlyRollup
+    statement = upsert(rollup).values(
+        [
+            dict(zip(("hour_bucket",) + ROLLUP_DIMENSIONS, key), count=count)
+            for key, count in counts.items()
+        ]
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=["hour_bucket", *ROLLUP_DIMENSIONS],
+        set_={"count": rollup.count + statement.excluded.count},
+    )
+    session.execute(statement)
+
+
+def _new_feedback(
+    feedback_in: schemas.UserFeedbackCreate, submission_key: str | None = None
+) -> models.UserFeedback:
+    """Builds the ORM row, with the debug payload compressed into its side-table record."""
+    db_feedback = models.UserFeedback.model_validate(
+        feedback_in.model_dump(exclude={"debug"})
+    )
+    db_feedback.created_at = _now_utc_plus_8_naive()
+    db_feedback.submission_key = submission_key
+    # Set explicitly (also to None) so .debug is readable on detached rows too
+    db_feedback.debug_record = (
+        models.FeedbackDebug(data=models.compress_debug(feedback_in.debug))
+        if feedback_in.debug is not None
+        else None
+    )
     return db_feedback
 
 
+def get_feedback_by_submission_keys(
+    session: Session, keys: Sequence[str]
+) -> dict:
+    """Returns {submission_key: UserFeedback} for the keys that are stored."""
+    if not keys:
+        return {}
+    statement = select(models.UserFeedback).where(
+        models.UserFeedback.submission_key.in_(set(keys))  # type: ignore
+    )
+    return {row.submission_key: row for row in session.exec(statement)}
+
+
+def create_feedback_db(
+    session: Session,
+    feedback_in: schemas.UserFeedbackCreate,
+    submission_key: str | None = None,
+) -> Tuple[models.UserFeedback, bool]:
+    """
+    Creates a new feedback entry in the database.
+    The created_at field is set to current UTC+8 time and stored as a naive datetime.
+    Returns (row, created). If a row with the same submission_key already
+    exists (a retried submission), nothing is written and that original row
+    is returned with created False.
+    """
+    db_feedback = _new_feedback(feedback_in, submission_key)
+
+    try:
+        session.add(db_feedback)
+        # The rollup upsert autoflushes, so a duplicate key can surface here too
+        _increment_hourly_rollups(session, [db_feedback])
+        with metrics.DB_COMMIT_SECONDS.time(operation="single"):
+            session.commit()
+    except IntegrityError:
+        session.rollback()
+        original = get_feedback_by_submission_keys(
+            session, [submission_key] if submission_key else []
+        ).get(submission_key)
+        if original is None:
+            raise
+        metrics.DUPLICATE_SUBMISSIONS.inc(source="database")
+        return original, False
+    metrics.FEEDBACK_ROWS_INGESTED.inc(operation="single")
+    session.refresh(db_feedback)
+    return db_feedback, True
+
+
+def create_feedback_batch_db(
+    session: Session,
+    feedbacks_in: List[schemas.UserFeedbackCreate],
+    submission_keys: Sequence[str | None] | None = None,
+) -> List[models.UserFeedback]:
+    """
+    Creates several feedback entries in a single transaction (one commit/fsync).
+    Every row gets the same UTC+8 created_at semantics as create_feedback_db.
+    Use a session with expire_on_commit=False so the returned rows can be read
+    without a refresh query per row. Raises IntegrityError (nothing stored)
+    if any submission_key already exists.
+    """
+    keys = submission_keys or [None] * len(feedbacks_in)
+    db_feedbacks = [
+        _new_feedback(feedback_in, key) for feedback_in, key in zip(feedbacks_in, keys)
+    ]
+
+    session.add_all(db_feedbacks)
+    _increment_hourly_rollups(session, db_feedbacks)
+    with metrics.DB_COMMIT_SECONDS.time(operation="group_commit"):
+        session.commit()
+    metrics.FEEDBACK_ROWS_INGESTED.inc(len(db_feedbacks), operation="group_commit")
+    return db_feedbacks
+
+
+def insert_feedback_rows_db(
+    session: Session,
+    feedbacks_in: List[schemas.UserFeedbackCreate],
+    submission_keys: Sequence[str | None] | None = None,
+) -> List[tuple]:
+    """
+    Inserts a chunk of feedback with one multi-row INSERT ... RETURNING statement
+    and a single commit, bypassing the ORM unit of work.
+    Rows whose submission_key already exists (or repeats within the chunk)
+    are skipped by ON CONFLICT DO NOTHING on SQLite/PostgreSQL.
+    Returns (id, created) per item in the order of feedbacks_in, where a
+    skipped duplicate reports the id of the original row.
+    """
+    if not feedbacks_in:
+        return []
+    keys = list(submission_keys or [None] * len(feedbacks_in))
+    created_at = _now_utc_plus_8_naive()
+    rows = [
+        {
+            **feedback_in.model_dump(exclude={"debug"}),
+            "created_at": created_at,
+            "submission_key": key,
+        }
+        for feedback_in, key in zip(feedbacks_in, keys)
+    ]
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql") and all(keys):
+        upsert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        statement = upsert(models.UserFeedback).on_conflict_do_nothing(
+            index_elements=["submission_key"]
+        )
+    else:
+        statement = insert(models.UserFeedback)
+    statement = statement.returning(
+        models.UserFeedback.id, sort_by_parameter_order=True
+    )
+    ids = list(session.execute(statement, rows).scalars().all())
+
+    if len(ids) == len(rows):
+        outcomes = [(new_id, True) for new_id in ids]
+        inserted = list(zip(rows, feedbacks_in))
+    else:
+        # Some rows were skipped: match the returned ids back by submission key
+        returned_keys = session.execute(
+            select(models.UserFeedback.submission_key, models.UserFeedback.id).where(
+                models.UserFeedback.id.in_(ids)  # type: ignore
+            )
+        ).all()
+        new_ids = {key: new_id for key, new_id in returned_keys}
+        originals = {
+            key: row.id
+            for key, row in get_feedback_by_submission_keys(
+                session, [key for key in keys if key and key not in new_ids]
+            ).items()
+        }
+        outcomes, inserted, claimed = [], [], set()
+        for row, feedback_in, key in zip(rows, feedbacks_in, keys):
+            if key in new_ids and key not in claimed:
+                claimed.add(key)
+                outcomes.append((new_ids[key], True))
+                inserted.append((row, feedback_in))
+            else:
+                outcomes.append((new_ids.get(key) or originals.get(key), False))
+        metrics.DUPLICATE_SUBMISSIONS.inc(len(rows) - len(ids), source="database")
+
+    debug_rows = [
+        {"feedback_id": new_id, "data": models.compress_debug(feedback_in.debug)}
+        for (new_id, created), feedback_in in zip(outcomes, feedbacks_in)
+        if created and feedback_in.debug is not None
+    ]
+    if debug_rows:
+        session.execute(insert(models.FeedbackDebug), debug_rows)
+    _increment_hourly_rollups(session, [row for row, _ in inserted])
+    with metrics.DB_COMMIT_SECONDS.time(operation="bulk"):
+        session.commit()
+    metrics.FEEDBACK_ROWS_INGESTED.inc(len(ids), operation="bulk")
+    return outcomes
+
+
 def get_feedback_since(
     session: Session, since_datetime_utc: datetime
 ) -> List[models.UserFeedback]:
@@ -67,5 +280,851 @@ def get_feedback_for_date_range(
             models.UserFeedback.created_at <= end_datetime_naive,  # type: ignore
         )
     )
-    results = session.exec(statement)
-    return list(results.all())  # Convert to list
+    results = list(session.exec(statement).all())
+
+    # Rows past the retention age live in the monthly archive files instead
+    archived = feedback_archive.read_archived_feedback(
+        start_datetime_naive, end_datetime_naive
+    )
+    if not archived:
+        return results
+    # A retention batch interrupted between writing the archive and deleting
+    # the rows leaves them in both places; the database copy wins
+    hot_ids = {row.id for row in results}
+    results.extend(row for row in archived if row.id not in hot_ids)
+    results.sort(key=lambda row: (row.created_at, row.id))
+    return results
+
+
+def archive_feedback_batch(
+    session: Session, cutoff_naive: datetime, batch_size: int = 1000
+) -> int:
+    """
+    Moves up to batch_size of the oldest feedback rows created before
+    cutoff_naive to the archive and deletes them. The rows are read and the
+    read transaction ended before the archive is written, and the delete is
+    a single short transaction, so writers are never blocked for long.
+    Hourly rollups are left alone, so stats keep counting archived rows.
+    Returns the number of rows moved (0 once nothing is left to archive).
+    """
+    feedback = models.UserFeedback
+    rows = session.exec(
+        select(feedback)
+        .where(feedback.created_at < cutoff_naive)  # type: ignore
+        .order_by(feedback.created_at, feedback.id)  # type: ignore
+        .limit(batch_size)
+        .options(selectinload(feedback.debug_record))
+    ).all()
+    records = []
+    for row in rows:
+        record = {field: getattr(row, field) for field in feedback_archive.ARCHIVED_FIELDS}
+        record["created_at"] = row.created_at
+        record["debug"] = (
+            models.decompress_debug(row.debug_record.data) if row.debug_record else None
+        )
+        records.append(record)
+    session.rollback()
+    session.expunge_all()
+    if not records:
+        return 0
+
+    # Durable on disk before the rows go away
+    feedback_archive.append_records(records)
+    ids = [record["id"] for record in records]
+    session.execute(
+        delete(models.FeedbackDebug).where(models.FeedbackDebug.feedback_id.in_(ids))  # type: ignore
+    )
+    session.execute(delete(feedback).where(feedback.id.in_(ids)))  # type: ignore
+    session.commit()
+    metrics.FEEDBACK_ROWS_ARCHIVED.inc(len(ids))
+    return len(ids)
+
+
+LIST_FILTER_FIELDS = (
+    "feedback_type",
+    "app_version",
+    "app_channel",
+    "user_uid",
+    "device_id",
+)
+
+
+def list_feedback(
+    session: Session,
+    start_naive: datetime | None = None,
+    end_naive: datetime | None = None,
+    filters: dict | None = None,
+    after: tuple | None = None,
+    limit: int = 50,
+    include_debug: bool = False,
+) -> List[Any]:
+    """
+    Returns up to `limit` feedback rows, newest first, optionally restricted to
+    [start_naive, end_naive] and equality `filters` on LIST_FILTER_FIELDS.
+    `after` is the (created_at, id) of the last row of the previous page
+    (keyset pagination, no OFFSET). Without include_debug the debug side table
+    is not queried at all; with it, payloads of the whole page are loaded in
+    one extra query.
+    """
+    feedback = models.UserFeedback
+    if include_debug:
+        statement = select(feedback).options(selectinload(feedback.debug_record))
+    else:
+        # Plain column rows: no ORM objects, so no lazy load per row
+        statement = select(
+            *(getattr(feedback, column.name) for column in feedback.__table__.columns)
+        )
+    statement = statement.where(feedback.created_at.is_not(None))  # type: ignore
+    if start_naive is not None:
+        statement = statement.where(feedback.created_at >= start_naive)  # type: ignore
+    if end_naive is not None:
+        statement = statement.where(feedback.created_at <= end_naive)  # type: ignore
+    for field, value in (filters or {}).items():
+        if field not in LIST_FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter: {field}")
+        statement = statement.where(getattr(feedback, field) == value)
+    if after is not None:
+        statement = statement.where(
+            tuple_(feedback.created_at, feedback.id) < tuple_(*after)
+        )
+    statement = statement.order_by(
+        feedback.created_at.desc(), feedback.id.desc()  # type: ignore
+    ).limit(limit)
+    return list(session.exec(statement).all())
+
+
+def _feedback_range_page(
+    start_naive: datetime,
+    end_naive: datetime | None,
+    columns: Sequence[Any] | None,
+    batch_size: int,
+    last_key: tuple | None,
+):
+    """One keyset page of iter_feedback_in_range: rows after last_key in (created_at, id) order."""
+    feedback = models.UserFeedback
+    if columns:
+        selected = list(columns)
+        for key_column in (feedback.created_at, feedback.id):
+            if not any(key_column is column for column in selected):
+                selected.append(key_column)
+        statement = select(*selected)
+    else:
+        statement = select(feedback)
+
+    statement = statement.where(feedback.created_at >= start_naive)  # type: ignore
+    if end_naive is not None:
+        statement = statement.where(feedback.created_at <= end_naive)  # type: ignore
+    if last_key is not None:
+        statement = statement.where(
+            tuple_(feedback.created_at, feedback.id) > tuple_(*last_key)
+        )
+    return statement.order_by(feedback.created_at, feedback.id).limit(batch_size)  # type: ignore
+
+
+def iter_feedback_in_range(
+    session: Session,
+    start_naive: datetime,
+    end_naive: datetime | None = None,
+    columns: Sequence[Any] | None = None,
+    batch_size: int = 1000,
+) -> Iterator[Any]:
+    """
+    Yields feedback created in [start_naive, end_naive] (naive UTC+8, end optional)
+    in (created_at, id) order, fetching batch_size rows per query.
+    Pagination is keyset-based on (created_at, id), so every batch is an index
+    range scan and the iterator itself holds at most one batch in memory.
+
+    `columns` selects only the given UserFeedback columns (e.g.
+    [models.UserFeedback.feedback_type, models.UserFeedback.feedback]) and yields
+    lightweight rows with attribute access; by default full ORM objects are
+    yielded and detached from the session once their batch has been consumed.
+    """
+    last_key = None
+    while True:
+        statement = _feedback_range_page(start_naive, end_naive, columns, batch_size, last_key)
+        batch = session.exec(statement).all()
+        if not batch:
+            return
+        for row in batch:
+            yield row
+        last = batch[-1]
+        last_key = (last.created_at, last.id)
+        if not columns:
+            for row in batch:
+                session.expunge(row)
+        if len(batch) < batch_size:
+            return
+
+
+def iter_feedback_since(
+    session: Session,
+    since_datetime_utc: datetime,
+    columns: Sequence[Any] | None = None,
+    batch_size: int = 1000,
+) -> Iterator[Any]:
+    """
+    Streaming variant of get_feedback_since; see iter_feedback_in_range.
+    """
+    utc_plus_8_tz = timezone(timedelta(hours=8))
+    since_datetime_local_naive = since_datetime_utc.astimezone(utc_plus_8_tz).replace(
+        tzinfo=None
+    )
+    return iter_feedback_in_range(
+        session, since_datetime_local_naive, columns=columns, batch_size=batch_size
+    )
+
+
+def count_feedback_by_type_in_range(
+    session: Session, start_naive: datetime, end_naive: datetime
+) -> dict:
+    """
+    Returns {feedback_type: count} for feedback in [start_naive, end_naive]
+    (naive UTC+8), answered from the hourly rollups.
+    """
+    return {
+        key[0]: count
+        for key, count in count_feedback_grouped(
+            session, start_naive, end_naive, ["feedback_type"]
+        ).items()
+    }
+
+
+STATS_GROUP_BY_FIELDS = ROLLUP_DIMENSIONS + ("hour", "day")
+
+
+def _group_key(hour_bucket: datetime, row: Any, group_by: Sequence[str]) -> tuple:
+    key = []
+    for field in group_by:
+        if field == "hour":
+            key.append(hour_bucket)
+        elif field == "day":
+            key.append(hour_bucket.replace(hour=0))
+        else:
+            key.append(getattr(row, field))
+    return tuple(key)
+
+
+def count_feedback_grouped(
+    session: Session,
+    start_naive: datetime,
+    end_naive: datetime,
+    group_by: Sequence[str],
+) -> dict:
+    """
+    Counts feedback in [start_naive, end_naive] (naive UTC+8) grouped by any of
+    STATS_GROUP_BY_FIELDS. Whole hours are read from the hourly rollups; only
+    the partial hours at either edge of the range touch raw feedback rows.
+    Returns {tuple of group values: count}.
+    """
+    end_exclusive = end_naive + timedelta(microseconds=1)
+    full_start = _hour_bucket(start_naive)
+    if full_start < start_naive:
+        full_start += timedelta(hours=1)
+    full_end = _hour_bucket(end_exclusive)
+
+    counts: dict = {}
+    raw_ranges = []
+    if full_start < full_end:
+        rollup = models.FeedbackHourlyRollup
+        statement = select(rollup).where(
+            rollup.hour_bucket >= full_start,  # type: ignore
+            rollup.hour_bucket < full_end,  # type: ignore
+        )
+        for row in session.exec(statement):
+            key = _group_key(row.hour_bucket, row, group_by)
+            counts[key] = counts.get(key, 0) + row.count
+        raw_ranges = [(start_naive, full_start), (full_end, end_exclusive)]
+    else:
+        raw_ranges = [(start_naive, end_exclusive)]
+
+    feedback = models.UserFeedback
+    for range_start, range_end in raw_ranges:
+        if range_start >= range_end:
+            continue
+        statement = select(
+            feedback.created_at,
+            feedback.feedback_type,
+            feedback.app_version,
+            feedback.app_channel,
+        ).where(
+            feedback.created_at >= range_start,  # type: ignore
+            feedback.created_at < range_end,  # type: ignore
+        )
+        for row in session.exec(statement):
+            key = _group_key(_hour_bucket(row.created_at), row, group_by)
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def rebuild_hourly_rollups(session: Session) -> int:
+    """
+    Catch-up pass: recomputes every hourly rollup from the raw feedback table
+    with one GROUP BY query (e.g. for databases created before rollups existed).
+    Returns the number of rollup rows written.
+    """
+    feedback = models.UserFeedback
+    if session.get_bind().dialect.name == "sqlite":
+        hour = func.strftime("%Y-%m-%d %H:00:00", feedback.created_at)
+    else:
+        hour = func.date_trunc("hour", feedback.created_at)
+    statement = (
+        select(
+            hour,
+            feedback.feedback_type,
+            feedback.app_version,
+            feedback.app_channel,
+            func.count(),
+        )
+        .where(feedback.created_at.is_not(None))  # type: ignore
+        .group_by(hour, feedback.feedback_type, feedback.app_version, feedback.app_channel)
+    )
+    rollups = []
+    for hour_value, feedback_type, app_version, app_channel, count in session.exec(
+        statement
+    ):
+        if isinstance(hour_value, str):
+            hour_value = datetime.fromisoformat(hour_value)
+        rollups.append(
+            models.FeedbackHourlyRollup(
+                hour_bucket=hour_value,
+                feedback_type=feedback_type,
+                app_version=app_version,
+                app_channel=app_channel,
+                count=count,
+            )
+        )
+    session.execute(delete(models.FeedbackHourlyRollup))
+    session.add_all(rollups)
+    session.commit()
+    return len(rollups)
+
+
+def ensure_hourly_rollups(session: Session):
+    """Rebuilds the rollups if feedback exists but the rollup table is empty."""
+    has_rollups = session.exec(select(models.FeedbackHourlyRollup).limit(1)).first()
+    has_feedback = session.exec(select(models.UserFeedback.id).limit(1)).first()
+    if has_feedback is not None and has_rollups is None:
+        written = rebuild_hourly_rollups(session)
+        print(f"Built {written} hourly feedback rollup rows from existing feedback.")
+
+
+def create_feedback_summary_db(
+    session: Session,
+    summary: models.FeedbackSummary,
+    deliveries: Sequence[models.WebhookDelivery] = (),
+) -> models.FeedbackSummary:
+    """
+    Stores a generated report; created_at is set to current UTC+8 time.
+    `deliveries` (webhook outbox entries for the report) are committed in the
+    same transaction, so a stored report is never left without them.
+    """
+    now = _now_utc_plus_8_naive()
+    summary.created_at = now
+    session.add(summary)
+    if deliveries:
+        session.flush()  # Assigns summary.id
+        for delivery in deliveries:
+            delivery.summary_id = summary.id
+            delivery.created_at = now
+            delivery.next_attempt_at = now
+            session.add(delivery)
+    session.commit()
+    session.refresh(summary)
+    return summary
+
+
+def enqueue_webhook_deliveries(
+    session: Session, deliveries: Sequence[models.WebhookDelivery]
+) -> int:
+    """Stores outbox entries not tied to a report (e.g. alerts), due immediately."""
+    now = _now_utc_plus_8_naive()
+    for delivery in deliveries:
+        delivery.created_at = now
+        delivery.next_attempt_at = now
+        session.add(delivery)
+    session.commit()
+    return len(deliveries)
+
+
+def get_feedback_summaries_in_range(
+    session: Session,
+    job_name: str,
+    start_naive: datetime,
+    end_naive: datetime,
+    segment: str | None = None,
+) -> List[models.FeedbackSummary]:
+    """
+    Returns stored reports of `job_name` for `segment` (None: reports over all
+    feedback) whose window lies entirely inside [start_naive, end_naive],
+    ordered by window start (newest run first on ties).
+    """
+    statement = (
+        select(models.FeedbackSummary)
+        .where(
+            models.FeedbackSummary.job_name == job_name,
+            models.FeedbackSummary.segment == segment,
+            models.FeedbackSummary.window_start >= start_naive,  # type: ignore
+            models.FeedbackSummary.window_end <= end_naive,  # type: ignore
+        )
+        .order_by(
+            models.FeedbackSummary.window_start,  # type: ignore
+            models.FeedbackSummary.id.desc(),  # type: ignore
+        )
+    )
+    return list(session.exec(statement).all())
+
+
+def try_acquire_lease(
+    session: Session, name: str, owner: str, ttl_seconds: float
+) -> bool:
+    """
+    Takes or renews the lease `name` for `owner` until now + ttl_seconds.
+    A conditional UPDATE only succeeds if `owner` already holds the lease or
+    it has expired, so concurrent workers cannot both win; the INSERT covers
+    the very first acquisition. Returns True if `owner` now holds the lease.
+    """
+    now = _now_utc_plus_8_naive()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    lease = models.SchedulerLease
+    result = session.execute(
+        update(lease)
+        .where(
+            lease.name == name,
+            (lease.owner == owner) | (lease.expires_at < now),  # type: ignore
+        )
+        .values(owner=owner, expires_at=expires_at)
+    )
+    if result.rowcount == 1:
+        session.commit()
+        return True
+    session.rollback()
+    if session.get(lease, name) is not None:
+        return False  # Held by a live owner
+    try:
+        session.add(lease(name=name, owner=owner, expires_at=expires_at))
+        session.commit()
+        return True
+    except IntegrityError:
+        session.rollback()  # Another worker created it first
+        return False
+
+
+def release_lease(session: Session, name: str, owner: str):
+    """Expires the lease immediately (if `owner` holds it) so another worker can take over."""
+    lease = models.SchedulerLease
+    session.execute(
+        update(lease)
+        .where(lease.name == name, lease.owner == owner)
+        .values(expires_at=_now_utc_plus_8_naive())
+    )
+    session.commit()
+
+
+def claim_job_execution(
+    session: Session,
+    job_id: str,
+    occurrence: datetime,
+    owner: str,
+    stale_after_seconds: float | None = None,
+) -> models.JobExecution | None:
+    """
+    Records that `owner` runs `job_id` for `occurrence`. Returns None if that
+    occurrence was already claimed (the (job_id, occurrence) key is unique),
+    unless the claim is still "running" more than `stale_after_seconds` after
+    it was made: its owner is presumed dead and `owner` takes it over.
+    """
+    now = _now_utc_plus_8_naive()
+    execution = models.JobExecution(
+        job_id=job_id,
+        occurrence=occurrence,
+        owner=owner,
+        started_at=now,
+    )
+    session.add(execution)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        if stale_after_seconds is None:
+            return None
+        # Conditional UPDATE, so of several workers only one takes over
+        job_execution = models.JobExecution
+        result = session.execute(
+            update(job_execution)
+            .where(
+                job_execution.job_id == job_id,
+                job_execution.occurrence == occurrence,
+                job_execution.status == "running",
+                job_execution.started_at <= now - timedelta(seconds=stale_after_seconds),  # type: ignore
+            )
+            .values(owner=owner, started_at=now)
+        )
+        session.commit()
+        if result.rowcount != 1:
+            return None
+        return session.exec(
+            select(job_execution).where(
+                job_execution.job_id == job_id, job_execution.occurrence == occurrence
+            )
+        ).one()
+    session.refresh(execution)
+    return execution
+
+
+def get_stale_job_executions(
+    session: Session, stale_after_seconds: float
+) -> List[models.JobExecution]:
+    """Claims still "running" more than `stale_after_seconds` after they were made."""
+    job_execution = models.JobExecution
+    statement = select(job_execution).where(
+        job_execution.status == "running",
+        job_execution.started_at  # type: ignore
+        <= _now_utc_plus_8_naive() - timedelta(seconds=stale_after_seconds),
+    )
+    return list(session.exec(statement).all())
+
+
+def finish_job_execution(
+    session: Session, execution: models.JobExecution, status: str
+) -> models.JobExecution:
+    execution.status = status
+    execution.finished_at = _now_utc_plus_8_naive()
+    session.add(execution)
+    session.commit()
+    session.refresh(execution)
+    return execution
+
+
+def claim_due_webhook_deliveries(
+    session: Session, limit: int, claim_seconds: float
+) -> List[models.WebhookDelivery]:
+    """
+    Claims up to `limit` pending deliveries whose next attempt is due, counting
+    the attempt and pushing next_attempt_at claim_seconds ahead so no other
+    worker picks them up meanwhile. Each claim is a conditional UPDATE, so
+    concurrent workers never claim the same entry. Returns detached rows.
+    """
+    now = _now_utc_plus_8_naive()
+    delivery = models.WebhookDelivery
+    due = session.exec(
+        select(delivery.id)
+        .where(delivery.status == "pending", delivery.next_attempt_at <= now)  # type: ignore
+        .order_by(delivery.next_attempt_at)  # type: ignore
+        .limit(limit)
+    ).all()
+    claimed_ids = []
+    for delivery_id in due:
+        result = session.execute(
+            update(delivery)
+            .where(
+                delivery.id == delivery_id,
+                delivery.status == "pending",
+                delivery.next_attempt_at <= now,  # type: ignore
+            )
+            .values(
+                attempts=delivery.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=claim_seconds),
+            )
+        )
+        if result.rowcount == 1:
+            claimed_ids.append(delivery_id)
+    session.commit()
+    if not claimed_ids:
+        return []
+    claimed = list(
+        session.exec(select(delivery).where(delivery.id.in_(claimed_ids))).all()  # type: ignore
+    )
+    session.expunge_all()
+    return claimed
+
+
+def record_webhook_delivery_result(
+    session: Session,
+    delivery_id: int,
+    error: str | None = None,
+    retry_at: datetime | None = None,
+):
+    """
+    Marks a claimed delivery delivered (no error), pending again until
+    `retry_at`, or failed for good (error without retry_at).
+    """
+    delivery = models.WebhookDelivery
+    if error is None:
+        values = {
+            "status": "delivered",
+            "delivered_at": _now_utc_plus_8_naive(),
+            "last_error": None,
+        }
+    elif retry_at is not None:
+        values = {"next_attempt_at": retry_at, "last_error": error[:1000]}
+    else:
+        values = {"status": "failed", "last_error": error[:1000]}
+    session.execute(update(delivery).where(delivery.id == delivery_id).values(**values))
+    session.commit()
+
+
+def list_webhook_deliveries(
+    session: Session,
+    status: str | None = None,
+    summary_id: int | None = None,
+    limit: int = 50,
+) -> List[models.WebhookDelivery]:
+    """Most recent outbox entries first, optionally filtered by status / summary."""
+    delivery = models.WebhookDelivery
+    statement = select(delivery)
+    if status:
+        statement = statement.where(delivery.status == status)
+    if summary_id is not None:
+        statement = statement.where(delivery.summary_id == summary_id)
+    statement = statement.order_by(delivery.id.desc()).limit(limit)  # type: ignore
+    return list(session.exec(statement).all())
+
+
+def get_cached_llm_response(session: Session, key: str) -> str | None:
+    """Returns an unexpired cached completion for `key` and marks it as used."""
+    now = _now_utc_plus_8_naive()
+    entry = session.get(models.LLMResponseCache, key)
+    if entry is None or entry.expires_at <= now:
+        return None
+    entry.last_used_at = now
+    entry.hits += 1
+    session.add(entry)
+    session.commit()
+    return entry.response
+
+
+def store_llm_response(
+    session: Session,
+    key: str,
+    model: str,
+    response: str,
+    ttl_seconds: float,
+    max_entries: int,
+):
+    """
+    Stores (or replaces) a completion, then evicts expired entries and the
+    least recently used ones beyond max_entries.
+    """
+    now = _now_utc_plus_8_naive()
+    cache = models.LLMResponseCache
+    session.merge(
+        cache(
+            key=key,
+            model=model,
+            response=response,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl_seconds),
+            last_used_at=now,
+        )
+    )
+    session.execute(delete(cache).where(cache.expires_at <= now))  # type: ignore
+    excess = session.exec(select(func.count()).select_from(cache)).one() - max(1, max_entries)
+    if excess > 0:
+        oldest = (
+            select(cache.key).order_by(cache.last_used_at).limit(excess)  # type: ignore
+        )
+        session.execute(delete(cache).where(cache.key.in_(oldest)))  # type: ignore
+    session.commit()
+
+
+# Shortest term the trigram FTS index can match; shorter terms use LIKE
+_FTS_MIN_TERM_LENGTH = 3
+_SEARCH_COLUMNS = (
+    "id",
+    "created_at",
+    "feedback_type",
+    "app_version",
+    "app_channel",
+    "feedback",
+)
+
+
+def highlight_terms(
+    value: str, terms: Sequence[str], start: str = "<mark>", end: str = "</mark>"
+) -> str:
+    """
+    HTML-escapes `value` and wraps case-insensitive occurrences of any term in
+    start/end markers. Matching runs on the raw text and every piece is
+    escaped on its own, so feedback cannot inject markup and a term can
+    never match inside an entity produced by the escaping.
+    """
+    if not terms:
+        return html.escape(value)
+    pattern = re.compile(
+        "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)),
+        re.IGNORECASE,
+    )
+    pieces = []
+    last = 0
+    for match in pattern.finditer(value):
+        pieces.append(html.escape(value[last : match.start()]))
+        pieces.append(f"{start}{html.escape(match.group(0))}{end}")
+        last = match.end()
+    pieces.append(html.escape(value[last:]))
+    return "".join(pieces)
+
+
+def search_feedback(
+    session: Session, query: str, limit: int = 20, offset: int = 0
+) -> List[dict]:
+    """
+    Full-text search over feedback text; every whitespace-separated term must
+    match. On SQLite, terms of 3+ characters go through the FTS5 trigram index
+    and results are ranked by bm25. Shorter terms (common for Chinese words
+    such as "闪退") cannot use trigrams and are matched with LIKE; queries made
+    only of such terms (or on other databases) are returned newest first.
+    Returns dicts with the _SEARCH_COLUMNS and a bm25 `score` (lower is better).
+    """
+    from .database import FTS_TABLE, fts_enabled
+
+    terms = [term for term in query.split() if term]
+    if not terms:
+        return []
+    feedback = models.UserFeedback
+    if fts_enabled():
+        long_terms = [t for t in terms if len(t) >= _FTS_MIN_TERM_LENGTH]
+        short_terms = [t for t in terms if len(t) < _FTS_MIN_TERM_LENGTH]
+    else:
+        long_terms, short_terms = [], terms
+
+    if long_terms:
+        # Quote each term so FTS5 query syntax in user input is matched literally
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in long_terms)
+        columns = ", ".join(f"f.{column}" for column in _SEARCH_COLUMNS)
+        like_sql = "".join(
+            f" AND f.feedback LIKE :like{i} ESCAPE '\\'" for i in range(len(short_terms))
+        )
+        statement = text(
+            f"SELECT {columns}, bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} "
+            f"JOIN userfeedback AS f ON f.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :match{like_sql} "
+            f"ORDER BY score LIMIT :limit OFFSET :offset"
+        ).columns(created_at=DateTime)
+        params = {"match": match, "limit": limit, "offset": offset}
+        for i, term in enumerate(short_terms):
+            params[f"like{i}"] = f"%{_escape_like(term)}%"
+        rows = session.execute(statement, params).mappings().all()
+        return [dict(row) for row in rows]
+
+    statement = (
+        select(*(getattr(feedback, column) for column in _SEARCH_COLUMNS))
+        .where(
+            *(
+                feedback.feedback.like(f"%{_escape_like(term)}%", escape="\\")
+                for term in short_terms
+            )
+        )
+        .order_by(feedback.id.desc())  # type: ignore
+        .limit(limit)
+        .offset(offset)
+    )
+    return [dict(row._mapping, score=None) for row in session.exec(statement)]
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Async variants, for code running on the event loop (async endpoints and the
+# scheduled jobs). They run the sync implementations above through
+# AsyncSession.run_sync, so the SQL is identical but the I/O goes through the
+# async driver instead of blocking the loop. Anything they return is fully
+# loaded: lazy attributes cannot be fetched implicitly under asyncio.
+
+
+async def create_feedback_db_async(
+    session: AsyncSession,
+    feedback_in: schemas.UserFeedbackCreate,
+    submission_key: str | None = None,
+) -> Tuple[schemas.UserFeedbackRead, bool]:
+    """See create_feedback_db; returns the stored (or original) row as UserFeedbackRead."""
+
+    def create(sync_session: Session) -> Tuple[schemas.UserFeedbackRead, bool]:
+        row, created = create_feedback_db(sync_session, feedback_in, submission_key)
+        return schemas.UserFeedbackRead.model_validate(row), created
+
+    return await session.run_sync(create)
+
+
+async def iter_feedback_in_range_async(
+    session: AsyncSession,
+    start_naive: datetime,
+    end_naive: datetime | None = None,
+    columns: Sequence[Any] | None = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[Any]:
+    """Async counterpart of iter_feedback_in_range (same keyset pages and ordering)."""
+    last_key = None
+    while True:
+        statement = _feedback_range_page(start_naive, end_naive, columns, batch_size, last_key)
+        batch = (await session.exec(statement)).all()
+        if not batch:
+            return
+        for row in batch:
+            yield row
+        last = batch[-1]
+        last_key = (last.created_at, last.id)
+        if not columns:
+            for row in batch:
+                session.expunge(row)
+        if len(batch) < batch_size:
+            return
+
+
+async def count_feedback_by_type_in_range_async(
+    session: AsyncSession, start_naive: datetime, end_naive: datetime
+) -> dict:
+    return await session.run_sync(count_feedback_by_type_in_range, start_naive, end_naive)
+
+
+async def count_feedback_grouped_async(
+    session: AsyncSession,
+    start_naive: datetime,
+    end_naive: datetime,
+    group_by: Sequence[str],
+) -> dict:
+    return await session.run_sync(count_feedback_grouped, start_naive, end_naive, group_by)
+
+
+async def create_feedback_summary_db_async(
+    session: AsyncSession,
+    summary: models.FeedbackSummary,
+    deliveries: Sequence[models.WebhookDelivery] = (),
+) -> models.FeedbackSummary:
+    return await session.run_sync(create_feedback_summary_db, summary, deliveries)
+
+
+async def get_feedback_summaries_in_range_async(
+    session: AsyncSession,
+    job_name: str,
+    start_naive: datetime,
+    end_naive: datetime,
+    segment: str | None = None,
+) -> List[models.FeedbackSummary]:
+    return await session.run_sync(
+        get_feedback_summaries_in_range, job_name, start_naive, end_naive, segment
+    )
+
+
+async def claim_job_execution_async(
+    session: AsyncSession,
+    job_id: str,
+    occurrence: datetime,
+    owner: str,
+    stale_after_seconds: float | None = None,
+) -> models.JobExecution | None:
+    return await session.run_sync(
+        claim_job_execution, job_id, occurrence, owner, stale_after_seconds
+    )
+
+
+async def get_stale_job_executions_async(
+    session: AsyncSession, stale_after_seconds: float
+) -> List[models.JobExecution]:
+    return await session.run_sync(get_stale_job_executions, stale_after_seconds)
+
+
+async def finish_job_execution_async(
+    session: AsyncSession, execution: models.JobExecution, status: str
+) -> models.JobExecution:
+    return await session.run_sync(finish_job_execution, execution, status)
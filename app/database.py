@@ -1,19 +1,350 @@
 # app/database.py
+import hashlib
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, NamedTuple
+from sqlalchemy import event, inspect, insert, make_url, select, text
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex, CreateTable
 from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .core.config import settings
 
 # This import is crucial to ensure models are registered with SQLModel.metadata
-# before create_db_and_tables is called.
+# before run_migrations is called.
 from . import models
 
 
-engine = create_engine(settings.DATABASE_URL, echo=True)  # echo=True for debugging SQL
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    # WAL lets readers (stats, summaries) run alongside the writer, and the
+    # busy timeout makes competing writers wait for the lock instead of failing
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
 
 
-def create_db_and_tables():
+engine = create_engine(
+    settings.DATABASE_URL, echo=settings.DATABASE_ECHO
+)  # Set DATABASE_ECHO=true to log SQL when debugging
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _configure_sqlite_connection)
+
+
+def async_database_url() -> URL:
+    """
+    ASYNC_DATABASE_URL if set, else DATABASE_URL with its async driver:
+    sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg.
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return make_url(settings.ASYNC_DATABASE_URL)
+    url = make_url(settings.DATABASE_URL)
+    async_drivers = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+    drivername = async_drivers.get(url.get_backend_name())
+    if drivername is None:
+        raise ValueError(
+            f"No async driver known for {url.get_backend_name()}; set ASYNC_DATABASE_URL."
+        )
+    return url.set(drivername=drivername)
+
+
+# Created on first use, so the async driver is only imported when needed
+_async_engine = None
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        _async_engine = create_async_engine(
+            async_database_url(), echo=settings.DATABASE_ECHO
+        )
+        if _async_engine.dialect.name == "sqlite":
+            event.listen(
+                _async_engine.sync_engine, "connect", _configure_sqlite_connection
+            )
+    return _async_engine
+
+
+def async_session() -> AsyncSession:
+    """
+    A new AsyncSession. Objects stay loaded after commit (expire_on_commit
+    is off) because attribute refreshes cannot run implicitly under asyncio.
+    """
+    return AsyncSession(get_async_engine(), expire_on_commit=False)
+
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        async_engine, _async_engine = _async_engine, None
+        await async_engine.dispose()
+
+
+def _add_missing_columns():
+    """
+    create_all never alters existing tables, so add nullable columns that
+    were introduced after a database was created (existing rows get NULL).
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(
+                    text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+                )
+                print(f"Added column {table.name}.{column.name}.")
+
+
+def _sync_schema():
     SQLModel.metadata.create_all(engine)
+    _add_missing_columns()
+    # create_all skips tables that already exist, including their indexes,
+    # so make sure indexes added later also reach existing databases.
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def _schema_checksum() -> str:
+    """Changes whenever a model's table, column or index definition changes."""
+    statements = []
+    for table in SQLModel.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            statements.append(str(CreateIndex(index).compile(dialect=engine.dialect)))
+    return _checksum(*statements)
+
+
+FTS_TABLE = "userfeedback_fts"
+
+# External-content FTS5 index over userfeedback.feedback, kept in sync by
+# triggers. The trigram tokenizer indexes every 3-character window, which works
+# for Chinese text without word segmentation (unicode61 would treat a whole
+# CJK run as one token).
+_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        feedback, content='userfeedback', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS userfeedback_fts_ai AFTER INSERT ON userfeedback BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, feedback) VALUES (new.id, new.feedback);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS userfeedback_fts_ad AFTER DELETE ON userfeedback BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, feedback) VALUES ('delete', old.id, old.feedback);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS userfeedback_fts_au AFTER UPDATE OF feedback ON userfeedback BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, feedback) VALUES ('delete', old.id, old.feedback);
+        INSERT INTO {FTS_TABLE}(rowid, feedback) VALUES (new.id, new.feedback);
+    END""",
+]
+
+
+def fts_enabled() -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def create_fts_index():
+    """Creates the FTS5 table and sync triggers (SQLite only), indexing existing rows once."""
+    if not fts_enabled():
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first()
+        for statement in _FTS_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def rebuild_fts_index():
+    """Re-indexes every feedback row, e.g. after restoring or bulk-editing the database."""
+    if not fts_enabled():
+        print("Full-text search index is only available on SQLite.")
+        return
+    create_fts_index()
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    print("Full-text search index rebuilt.")
+
+
+_DEBUG_MIGRATION_BATCH_SIZE = 1000
+
+
+def _has_legacy_debug_column() -> bool:
+    columns = inspect(engine).get_columns(models.UserFeedback.__tablename__)
+    return any(column["name"] == "debug" for column in columns)
+
+
+def database_size_bytes() -> int | None:
+    """Allocated size of the database (SQLite file pages or PostgreSQL database)."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            page_count = conn.execute(text("PRAGMA page_count")).scalar()
+            page_size = conn.execute(text("PRAGMA page_size")).scalar()
+            return page_count * page_size
+        if engine.dialect.name == "postgresql":
+            return conn.execute(
+                text("SELECT pg_database_size(current_database())")
+            ).scalar()
+    return None
+
+
+def _vacuum():
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+
+
+def migrate_debug_payloads(vacuum: bool = False) -> dict:
+    """
+    Moves debug payloads from the legacy userfeedback.debug column into the
+    compressed feedbackdebug side table and drops the column, in one
+    transaction. With vacuum=True the database is compacted afterwards so the
+    freed pages are returned to the filesystem. Returns the size report.
+    """
+    size_before = database_size_bytes()
+    moved = 0
+    if _has_legacy_debug_column():
+        legacy_rows = text(
+            "SELECT id, debug FROM userfeedback"
+            " WHERE debug IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit"
+        )
+        with engine.begin() as conn:
+            existing = set(conn.execute(select(models.FeedbackDebug.feedback_id)).scalars())
+            last_id = 0
+            while True:
+                rows = conn.execute(
+                    legacy_rows,
+                    {"last_id": last_id, "limit": _DEBUG_MIGRATION_BATCH_SIZE},
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                payloads = [
+                    {"feedback_id": row.id, "data": models.compress_debug(row.debug)}
+                    for row in rows
+                    if row.id not in existing
+                ]
+                if payloads:
+                    conn.execute(insert(models.FeedbackDebug), payloads)
+                    moved += len(payloads)
+            conn.execute(text("ALTER TABLE userfeedback DROP COLUMN debug"))
+        print(f"Moved {moved} debug payloads into the compressed side table.")
+    if vacuum:
+        _vacuum()
+    size_after = database_size_bytes()
+    report = {"moved": moved, "size_before": size_before, "size_after": size_after}
+    if vacuum and size_before and size_after is not None:
+        saved = size_before - size_after
+        print(
+            f"Database size: {size_before / 1048576:.1f} MiB -> {size_after / 1048576:.1f} MiB"
+            f" ({saved / 1048576:.1f} MiB, {saved / size_before:.0%} smaller)."
+        )
+    return report
+
+
+def _migrate_legacy_debug_column():
+    if _has_legacy_debug_column():
+        migrate_debug_payloads()
+        print(
+            "Run `python -m app.database migrate-debug` to reclaim the freed space (VACUUM)."
+        )
+
+
+def _checksum(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[], None]
+    # Checksum of the step's definition; the step re-runs when it changes,
+    # so every step must be idempotent
+    checksum: Callable[[], str]
+
+
+MIGRATIONS = (
+    Migration(1, "schema", _sync_schema, _schema_checksum),
+    Migration(2, "fts", create_fts_index, lambda: _checksum(FTS_TABLE, *_FTS_DDL)),
+    Migration(3, "debug_side_table", _migrate_legacy_debug_column, lambda: _checksum("1")),
+)
+
+
+def run_migrations() -> List[str]:
+    """
+    Brings the database schema up to date. Each step in MIGRATIONS runs
+    only if its recorded checksum differs from the current one, so a boot
+    against an up-to-date database costs a single query instead of
+    create_all plus schema inspection. Returns the names of steps applied.
+    """
+    table = models.SchemaMigration.__table__
+    table.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        applied = dict(conn.execute(select(table.c.version, table.c.checksum)).all())
+
+    ran = []
+    for migration in MIGRATIONS:
+        checksum = migration.checksum()
+        if applied.get(migration.version) == checksum:
+            continue
+        print(f"Applying schema migration {migration.version} ({migration.name})...")
+        migration.apply()
+        with Session(engine) as session:
+            session.merge(
+                models.SchemaMigration(
+                    version=migration.version,
+                    name=migration.name,
+                    checksum=checksum,
+                    applied_at=datetime.now(timezone(timedelta(hours=8))).replace(
+                        tzinfo=None
+                    ),
+                )
+            )
+            try:
+                session.commit()
+            except IntegrityError:
+                session.rollback()  # Another worker recorded the same step
+        ran.append(migration.name)
+    return ran
+
+
+def create_db_and_tables():
+    """Kept for scripts and benchmarks; see run_migrations."""
+    run_migrations()
 
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session():
+    async with async_session() as session:
+        yield session
+
+
+if __name__ == "__main__":
+    # Usage: python -m app.database migrate | rebuild-fts | migrate-debug
+    if sys.argv[1:] == ["migrate"]:
+        applied = run_migrations()
+        print(f"Applied: {', '.join(applied)}" if applied else "Schema is up to date.")
+    elif sys.argv[1:] == ["rebuild-fts"]:
+        rebuild_fts_index()
+    elif sys.argv[1:] == ["migrate-debug"]:
+        SQLModel.metadata.create_all(engine)
+        migrate_debug_payloads(vacuum=True)
+    else:
+        print("Usage: python -m app.database migrate | rebuild-fts | migrate-debug")
+        sys.exit(2)
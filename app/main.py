@@ -1,48 +1,495 @@
-from fastapi import FastAPI, Depends
+import time
+
+_import_started = time.perf_counter()  # For the startup report's "import" phase
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import ValidationError
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 import asyncio  # Added asyncio for create_task
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import List
 
 from . import (
     crud,
+    models,
     schemas,
 )
 from .database import (
-    create_db_and_tables,
+    dispose_async_engine,
+    engine,
+    get_async_session,
     get_session,
+    run_migrations,
 )
 from .tasks.daily_summary import (
     schedule_feedback_summary,
     run_feedback_summary_job,
+    run_scheduled_job,
     run_weekly_feedback_summary_job,  # Import the weekly job function
 )
+from .tasks.retention import schedule_feedback_retention
 from .core.config import settings  # Moved import to top
-
-create_db_and_tables()
-
+from .core.startup import startup_report
+from .core.metrics import (
+    DUPLICATE_SUBMISSIONS,
+    INGEST_REJECTIONS,
+    MetricsMiddleware,
+    render_metrics,
+)
+from .services.admission import (
+    AdmissionRejected,
+    WriteAdmissionMiddleware,
+    check_rate_limits,
+)
+from .services.feedback_writer import feedback_writer, IngestQueueFullError
+from .services.idempotency import recent_submissions, submission_keys
+from .services.feedback_analyzer import close_llm_client
+from .services.leader_election import scheduler_lease
+from .services.spike_detector import spike_detector
+from .services.webhook_outbox import webhook_outbox
+from .services.batch_ingest import (
+    BatchBodyError,
+    iter_json_array_items,
+    iter_ndjson_items,
+)
 
 app = FastAPI(
     title="User Feedback API",
     description="API for collecting and managing user feedback.",
     version="0.1.0",
 )
+app.add_middleware(WriteAdmissionMiddleware, paths=("/feedback/", "/feedback/batch"))
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers
+    )
 
 
 @app.post("/feedback/", response_model=schemas.UserFeedbackRead)
-def create_feedback_endpoint(
+async def create_feedback_endpoint(
     feedback_in: schemas.UserFeedbackCreate,  # Use the new schema for creation
-    session: Session = Depends(get_session),  # Use dependency injection for session
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """
     Create new user feedback.
+    With FEEDBACK_INGEST_MODE=group_commit the row is committed by the background
+    writer together with other concurrent submissions.
+    Retries carrying the same Idempotency-Key header, or identical submissions
+    from the same user and device within DUPLICATE_WINDOW_SECONDS, return the
+    originally stored feedback instead of creating a new row.
+    Over-eager devices/users get 429 and a saturated writer 503, both with
+    Retry-After, instead of piling up behind the database.
+    Runs on the event loop with the async engine, so concurrent submissions
+    are not capped by the threadpool size.
     """
-    return crud.create_feedback_db(session=session, feedback_in=feedback_in)
+    key, previous_key = submission_keys(feedback_in, idempotency_key)
+    # previous_key catches a retry that crossed into the next duplicate window
+    # bucket; it is only checked in memory, the unique index covers `key`
+    original = recent_submissions.get(key) or recent_submissions.get(previous_key)
+    if original is not None:
+        DUPLICATE_SUBMISSIONS.inc(source="memory")
+        return original
+
+    check_rate_limits(feedback_in.device_id, feedback_in.user_uid)
+    if settings.FEEDBACK_INGEST_MODE == "group_commit":
+        try:
+            stored, created = await feedback_writer.submit_async(
+                feedback_in,
+                timeout=settings.INGEST_SUBMIT_TIMEOUT_SECONDS,
+                submission_key=key,
+            )
+        except IngestQueueFullError as e:
+            INGEST_REJECTIONS.inc(reason="queue_full")
+            raise HTTPException(
+                status_code=503, detail=str(e), headers={"Retry-After": "1"}
+            )
+        except asyncio.TimeoutError:
+            INGEST_REJECTIONS.inc(reason="timeout")
+            raise HTTPException(
+                status_code=503,
+                detail="Timed out waiting for feedback to be stored.",
+                headers={"Retry-After": "5"},
+            )
+    else:
+        stored, created = await crud.create_feedback_db_async(
+            session=session, feedback_in=feedback_in, submission_key=key
+        )
+    recent_submissions.put(key, stored)
+    if created:
+        # A retry resolving to the original must not count towards a spike again
+        spike_detector.observe(
+            stored.feedback_type, stored.app_version, stored.app_channel, stored.created_at
+        )
+    return stored
+
+
+@app.post("/feedback/batch", response_model=schemas.FeedbackBatchResult)
+async def create_feedback_batch_endpoint(
+    request: Request,
+    session: Session = Depends(get_session),
+):
+    """
+    Create many feedback entries at once (e.g. an offline SDK replaying its buffer).
+    Accepts a JSON array, or NDJSON when Content-Type is application/x-ndjson.
+    Items are validated as they are streamed in and inserted in chunks of
+    INGEST_BULK_CHUNK_SIZE; the response reports the outcome of every item.
+    Each item is charged against its device's and user's rate limits like a
+    single submission; items over the limit are reported as "rate_limited"
+    and not stored, so the client can resend them later.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = iter_ndjson_items(request.stream())
+    else:
+        items = iter_json_array_items(request.stream())
+
+    results: list[schemas.FeedbackBatchItemResult] = []
+    pending: list[tuple[int, schemas.UserFeedbackCreate]] = []
+
+    async def flush_pending():
+        # Retries of rows this process stored in the previous duplicate window
+        # bucket are answered from memory, like on the single endpoint
+        retried = set()
+        for index, feedback_in in pending:
+            original = recent_submissions.get(submission_keys(feedback_in)[1])
+            if original is not None:
+                retried.add(index)
+                results.append(
+                    schemas.FeedbackBatchItemResult(
+                        index=index, status="duplicate", id=original.id
+                    )
+                )
+        if retried:
+            DUPLICATE_SUBMISSIONS.inc(len(retried), source="memory")
+            pending[:] = [item for item in pending if item[0] not in retried]
+        if not pending:
+            return
+        chunk = [feedback_in for _, feedback_in in pending]
+        keys = [submission_keys(feedback_in)[0] for feedback_in in chunk]
+        try:
+            outcomes = await run_in_threadpool(
+                crud.insert_feedback_rows_db, session, chunk, keys
+            )
+        except Exception as e:
+            print(f"Batch insert of {len(chunk)} feedback rows failed: {e}")
+            session.rollback()
+            results.extend(
+                schemas.FeedbackBatchItemResult(
+                    index=index, status="error", error="Failed to store item."
+                )
+                for index, _ in pending
+            )
+        else:
+            results.extend(
+                schemas.FeedbackBatchItemResult(
+                    index=index,
+                    status="created" if created else "duplicate",
+                    id=new_id,
+                )
+                for (index, _), (new_id, created) in zip(pending, outcomes)
+            )
+            for (_, feedback_in), (_, created) in zip(pending, outcomes):
+                if created:
+                    spike_detector.observe(
+                        feedback_in.feedback_type,
+                        feedback_in.app_version,
+                        feedback_in.app_channel,
+                    )
+        pending.clear()
+
+    try:
+        async for index, value, error in items:
+            status = "invalid"
+            if error is None:
+                try:
+                    feedback_in = schemas.UserFeedbackCreate.model_validate(value)
+                except ValidationError as e:
+                    error = "; ".join(
+                        (
+                            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+                            if err["loc"]
+                            else err["msg"]
+                        )
+                        for err in e.errors()
+                    )
+                else:
+                    # Every item takes a token, so batching does not get around
+                    # the per-device / per-user rates
+                    try:
+                        check_rate_limits(feedback_in.device_id, feedback_in.user_uid)
+                    except AdmissionRejected as e:
+                        status, error = "rate_limited", e.detail
+                    else:
+                        pending.append((index, feedback_in))
+            if error is not None:
+                results.append(
+                    schemas.FeedbackBatchItemResult(
+                        index=index, status=status, error=error
+                    )
+                )
+            if len(pending) >= settings.INGEST_BULK_CHUNK_SIZE:
+                await flush_pending()
+    except BatchBodyError as e:
+        # Chunks flushed before the malformed part are already committed.
+        if pending:
+            await flush_pending()
+        results.sort(key=lambda r: r.index)
+        raise HTTPException(
+            status_code=400,
+            detail={"error": str(e), "items": [r.model_dump() for r in results]},
+        )
+    if pending:
+        await flush_pending()
+
+    results.sort(key=lambda r: r.index)
+    created = sum(1 for r in results if r.status == "created")
+    duplicates = sum(1 for r in results if r.status == "duplicate")
+    return schemas.FeedbackBatchResult(
+        created=created,
+        duplicates=duplicates,
+        failed=len(results) - created - duplicates,
+        items=results,
+    )
+
+
+def _to_local_naive(value: datetime) -> datetime:
+    """Aware datetimes are converted to naive UTC+8; naive ones are taken as UTC+8."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone(timedelta(hours=8))).replace(tzinfo=None)
+
+
+def _encode_cursor(created_at: datetime, feedback_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), feedback_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, feedback_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(feedback_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Invalid cursor.")
+
+
+@app.get("/feedback/", response_model=schemas.FeedbackPage)
+def list_feedback_endpoint(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    feedback_type: str | None = None,
+    app_version: str | None = None,
+    app_channel: str | None = None,
+    user_uid: str | None = None,
+    device_id: int | None = None,
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    include_debug: bool = False,
+    session: Session = Depends(get_session),
+):
+    """
+    List feedback newest first with optional filters.
+    Pages are cursor based: pass the returned next_cursor to get the next page.
+    The debug payload is only loaded when include_debug=true.
+    """
+    filters = {
+        field: value
+        for field, value in (
+            ("feedback_type", feedback_type),
+            ("app_version", app_version),
+            ("app_channel", app_channel),
+            ("user_uid", user_uid),
+            ("device_id", device_id),
+        )
+        if value is not None
+    }
+    rows = crud.list_feedback(
+        session,
+        start_naive=_to_local_naive(start) if start else None,
+        end_naive=_to_local_naive(end) if end else None,
+        filters=filters,
+        after=_decode_cursor(cursor) if cursor else None,
+        limit=limit,
+        include_debug=include_debug,
+    )
+    items = [schemas.UserFeedbackRead.model_validate(row) for row in rows]
+    next_cursor = (
+        _encode_cursor(items[-1].created_at, items[-1].id)
+        if len(items) == limit
+        else None
+    )
+    return schemas.FeedbackPage(items=items, next_cursor=next_cursor)
+
+
+@app.get("/feedback/search", response_model=schemas.FeedbackSearchResult)
+def search_feedback_endpoint(
+    q: str = Query(min_length=1),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    session: Session = Depends(get_session),
+):
+    """
+    Full-text search over feedback text (all terms must match), ranked by
+    relevance, with matches highlighted.
+    """
+    rows = crud.search_feedback(session, q, limit=limit, offset=offset)
+    terms = q.split()
+    items = [
+        schemas.FeedbackSearchHit(
+            id=row["id"],
+            created_at=row["created_at"],
+            feedback_type=row["feedback_type"],
+            app_version=row["app_version"],
+            app_channel=row["app_channel"],
+            highlight=crud.highlight_terms(row["feedback"], terms),
+            score=row["score"],
+        )
+        for row in rows
+    ]
+    return schemas.FeedbackSearchResult(
+        query=q,
+        items=items,
+        next_offset=offset + limit if len(items) == limit else None,
+    )
+
+
+@app.get("/feedback/stats", response_model=schemas.FeedbackStats)
+async def feedback_stats_endpoint(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    group_by: List[str] = Query(default=["feedback_type"]),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Feedback counts for [start, end] grouped by any of feedback_type,
+    app_version, app_channel, hour and day. Defaults to the last 24 hours.
+    Served from the hourly rollups, so it never scans the whole feedback table.
+    """
+    invalid = [field for field in group_by if field not in crud.STATS_GROUP_BY_FIELDS]
+    if invalid:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unsupported group_by {invalid}; use {list(crud.STATS_GROUP_BY_FIELDS)}.",
+        )
+    end_naive = (
+        _to_local_naive(end)
+        if end
+        else _to_local_naive(datetime.now(timezone.utc))
+    )
+    start_naive = _to_local_naive(start) if start else end_naive - timedelta(hours=24)
+    if start_naive > end_naive:
+        raise HTTPException(status_code=422, detail="start must not be after end.")
+
+    counts = await crud.count_feedback_grouped_async(
+        session, start_naive, end_naive, group_by
+    )
+    groups = [
+        schemas.FeedbackStatsGroup(
+            key={
+                field: value.isoformat() if isinstance(value, datetime) else str(value)
+                for field, value in zip(group_by, key)
+            },
+            count=count,
+        )
+        for key, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    ]
+    return schemas.FeedbackStats(
+        start=start_naive,
+        end=end_naive,
+        group_by=group_by,
+        total=sum(counts.values()),
+        groups=groups,
+    )
+
+
+WEBHOOK_DELIVERY_STATUSES = ("pending", "delivered", "failed")
+
+
+@app.get("/webhooks/deliveries", response_model=List[schemas.WebhookDeliveryRead])
+def list_webhook_deliveries_endpoint(
+    status: str | None = None,
+    summary_id: int | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    session: Session = Depends(get_session),
+):
+    """Webhook outbox entries, newest first, optionally filtered by status or report."""
+    if status is not None and status not in WEBHOOK_DELIVERY_STATUSES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unsupported status {status!r}; use {list(WEBHOOK_DELIVERY_STATUSES)}.",
+        )
+    return crud.list_webhook_deliveries(session, status, summary_id, limit)
+
+
+@app.get(
+    "/webhooks/deliveries/{delivery_id}", response_model=schemas.WebhookDeliveryRead
+)
+def get_webhook_delivery_endpoint(
+    delivery_id: int, session: Session = Depends(get_session)
+):
+    delivery = session.get(models.WebhookDelivery, delivery_id)
+    if delivery is None:
+        raise HTTPException(status_code=404, detail="Webhook delivery not found.")
+    return delivery
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus metrics in text exposition format."""
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.on_event("startup")
 async def startup_event():
+    # Schema setup runs here rather than at import, and is skipped when the
+    # recorded migration checksums are current
+    with startup_report.phase("migrations"):
+        applied = run_migrations()
+    if applied:
+        print(f"Applied schema migrations: {', '.join(applied)}")
+
+    # Catch-up pass for databases that predate the hourly rollups
+    with startup_report.phase("rollups"):
+        with Session(engine) as session:
+            crud.ensure_hourly_rollups(session)
+
+    # Seed the spike detector so a restart does not reset its baselines
+    if settings.SPIKE_DETECTION_ENABLED:
+        with startup_report.phase("spike_detector"):
+            tracked = await asyncio.to_thread(spike_detector.rebuild)
+        print(f"Spike detector tracking {tracked} feedback buckets.")
+
     # Initialize scheduler or other startup tasks
+    with startup_report.phase("workers"):
+        if settings.FEEDBACK_INGEST_MODE == "group_commit":
+            feedback_writer.start()
+        # Delivers stored report cards, including ones left over from a previous run
+        webhook_outbox.start()
+    # The shared AsyncOpenAI client (and the openai import) is created by the
+    # first summary job, so workers that only ingest never pay for it
+
+    # Every worker schedules the jobs, but only the lease holder runs them
+    with startup_report.phase("leader_lease"):
+        if settings.SCHEDULER_LEADER_ELECTION:
+            await scheduler_lease.start()
+
     print("Application startup: Initializing scheduler...")
-    schedule_feedback_summary()  # Call the scheduling function
+    with startup_report.phase("scheduler"):
+        schedule_feedback_retention()  # Registered first: schedule_feedback_summary starts the scheduler
+        schedule_feedback_summary()  # Call the scheduling function
+    startup_report.log()
 
     # Add a one-time job to run immediately on startup for debugging if configured
     if settings.RUN_SUMMARY_ON_STARTUP:
@@ -51,7 +498,7 @@ async def startup_event():
         )
         # Running in a separate task to avoid blocking startup
         asyncio.create_task(
-            run_feedback_summary_job()
+            run_scheduled_job("feedback_summary_startup", run_feedback_summary_job)
         )  # This should be correct as run_feedback_summary_job is async
 
     # Add a one-time weekly job to run immediately on startup if configured
@@ -60,15 +507,29 @@ async def startup_event():
             "RUN_WEEKLY_SUMMARY_ON_STARTUP is True. Running weekly feedback summary job now..."
         )
         asyncio.create_task(
-            run_weekly_feedback_summary_job()
+            run_scheduled_job(
+                "feedback_summary_weekly_startup", run_weekly_feedback_summary_job
+            )
         )  # This should be correct as run_weekly_feedback_summary_job is async
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     # Clean up scheduler or other shutdown tasks
-    from .tasks.daily_summary import scheduler  # Import scheduler instance
+    from .tasks.daily_summary import cancel_running_jobs, shutdown_scheduler
+
+    shutdown_scheduler()
+
+    # Abort summary jobs still waiting on the LLM instead of blocking shutdown
+    await cancel_running_jobs()
+    await close_llm_client()
+    await webhook_outbox.stop()
+    # Hand over the scheduler lease so another worker takes over right away
+    await scheduler_lease.stop()
+
+    # Flush feedback still waiting in the group-commit queue before exiting
+    await asyncio.to_thread(feedback_writer.stop)
+    await dispose_async_engine()
+
 
-    if scheduler.running:
-        print("Application shutdown: Shutting down scheduler...")
-        scheduler.shutdown()
+startup_report.record("import", time.perf_counter() - _import_started)
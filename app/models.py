@@ -1,10 +1,33 @@
 # app/models.py
-from sqlmodel import Field, SQLModel, Column
-from sqlalchemy import DateTime
+import zlib
+from sqlmodel import Field, Relationship, SQLModel, Column
+from sqlalchemy import DateTime, Index, LargeBinary, UniqueConstraint
 from datetime import datetime
 
 
+def compress_debug(debug: str) -> bytes:
+    return zlib.compress(debug.encode("utf-8"))
+
+
+def decompress_debug(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
 class UserFeedback(SQLModel, table=True):
+    __table_args__ = (
+        # Time-range scans (summary jobs) walk this index in (created_at, id) order
+        Index("ix_userfeedback_created_at_id", "created_at", "id"),
+        Index("ix_userfeedback_feedback_type_created_at", "feedback_type", "created_at"),
+        # One (filter column, created_at) index per GET /feedback/ filter, so any
+        # filter combination is served by an index range scan in time order
+        Index("ix_userfeedback_app_version_created_at", "app_version", "created_at"),
+        Index("ix_userfeedback_app_channel_created_at", "app_channel", "created_at"),
+        Index("ix_userfeedback_user_uid_created_at", "user_uid", "created_at"),
+        Index("ix_userfeedback_device_id_created_at", "device_id", "created_at"),
+        # Idempotency: a retried submission cannot be stored twice
+        Index("uq_userfeedback_submission_key", "submission_key", unique=True),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     user_uid: str
     device_id: int
@@ -14,8 +37,161 @@ class UserFeedback(SQLModel, table=True):
     feedback_type: str
     feedback: str
     image_url: str | None = None
-    debug: str | None = None
     created_at: datetime | None = Field(
         default=None,
         sa_column=Column(DateTime(timezone=False)),  # Storing as naive datetime in DB
     )
+    # Hash of the Idempotency-Key header or of (user, device, text, time window)
+    submission_key: str | None = None
+    # The debug payload lives compressed in a side table and is only loaded
+    # when accessed (or eagerly with selectinload when a listing asks for it)
+    debug_record: "FeedbackDebug" = Relationship(
+        sa_relationship_kwargs={"uselist": False, "cascade": "all, delete-orphan"}
+    )
+
+    @property
+    def debug(self) -> bytes | None:
+        """The zlib-compressed debug payload; schemas.UserFeedbackRead decompresses it."""
+        return self.debug_record.data if self.debug_record is not None else None
+
+
+class FeedbackDebug(SQLModel, table=True):
+    """Compressed debug payload of a feedback row, kept out of the main table."""
+
+    feedback_id: int = Field(
+        foreign_key="userfeedback.id", primary_key=True, ondelete="CASCADE"
+    )
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # zlib
+
+
+class FeedbackSummary(SQLModel, table=True):
+    """A generated report, persisted so later (e.g. weekly) runs can reuse it."""
+
+    __table_args__ = (
+        Index("ix_feedbacksummary_job_name_window_start", "job_name", "window_start"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    job_name: str
+    # app_channel / app_version value of a segmented report ("其他" for the
+    # folded small segments); None for a report over all feedback
+    segment: str | None = None
+    # Window boundaries are naive UTC+8, like UserFeedback.created_at
+    window_start: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    window_end: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    type_distribution: str
+    summary: str
+    feedback_count: int
+    model: str
+    created_at: datetime | None = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=False)),
+    )
+
+
+class WebhookDelivery(SQLModel, table=True):
+    """
+    Outbox entry: one report card for one webhook route. Written together
+    with its summary and delivered by the background worker, which retries
+    it until it is delivered or runs out of attempts.
+    """
+
+    __table_args__ = (
+        Index("ix_webhookdelivery_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    summary_id: int | None = Field(default=None, foreign_key="feedbacksummary.id")
+    route: str
+    url: str
+    payload: str  # JSON request body
+    status: str = "pending"  # pending -> delivered / failed
+    attempts: int = 0
+    last_error: str | None = None
+    # Naive UTC+8, like UserFeedback.created_at
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    next_attempt_at: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    delivered_at: datetime | None = Field(
+        default=None, sa_column=Column(DateTime(timezone=False))
+    )
+
+
+class FeedbackHourlyRollup(SQLModel, table=True):
+    """
+    Feedback counts per hour and dimension, maintained at insert time so
+    statistics never need to scan raw feedback rows.
+    """
+
+    # Start of the hour, naive UTC+8 like UserFeedback.created_at
+    hour_bucket: datetime = Field(
+        sa_column=Column(DateTime(timezone=False), primary_key=True)
+    )
+    feedback_type: str = Field(primary_key=True)
+    app_version: str = Field(primary_key=True)
+    app_channel: str = Field(primary_key=True)
+    count: int = 0
+
+
+class SchedulerLease(SQLModel, table=True):
+    """
+    Leadership lease shared by all workers: only the current owner runs
+    scheduled jobs, and it must renew expires_at before it passes.
+    """
+
+    name: str = Field(primary_key=True)
+    owner: str
+    # Naive UTC+8, like UserFeedback.created_at
+    expires_at: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+
+
+class JobExecution(SQLModel, table=True):
+    """One row per scheduled job occurrence; the unique key makes running it a one-time claim."""
+
+    __table_args__ = (
+        UniqueConstraint("job_id", "occurrence", name="uq_jobexecution_job_id_occurrence"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    job_id: str
+    # Scheduled fire time truncated to the minute, naive UTC+8
+    occurrence: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    owner: str
+    status: str = "running"  # running -> succeeded / failed
+    started_at: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    finished_at: datetime | None = Field(
+        default=None, sa_column=Column(DateTime(timezone=False))
+    )
+
+
+class LLMResponseCache(SQLModel, table=True):
+    """
+    Completions keyed by a hash of (model, system prompt, prompt, temperature),
+    so re-running a summary over the same input costs no API call.
+    """
+
+    __table_args__ = (
+        Index("ix_llmresponsecache_expires_at", "expires_at"),
+        Index("ix_llmresponsecache_last_used_at", "last_used_at"),
+    )
+
+    key: str = Field(primary_key=True)  # sha256 hex digest
+    model: str
+    response: str
+    # Naive UTC+8, like UserFeedback.created_at
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    expires_at: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    last_used_at: datetime = Field(sa_column=Column(DateTime(timezone=False)))
+    hits: int = 0
+
+
+class SchemaMigration(SQLModel, table=True):
+    """
+    A schema setup step applied to this database, with the checksum of its
+    definition; startup skips steps whose checksum has not changed.
+    """
+
+    version: int = Field(primary_key=True)
+    name: str
+    checksum: str
+    # Naive UTC+8, like UserFeedback.created_at
+    applied_at: datetime = Field(sa_column=Column(DateTime(timezone=False)))
@@ -1,6 +1,9 @@
 # app/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime
+from typing import Dict, List
+
+from .models import decompress_debug
 
 
 class UserFeedbackBase(BaseModel):
@@ -23,5 +26,77 @@ class UserFeedbackRead(UserFeedbackBase):
     id: int
     created_at: datetime
 
+    @field_validator("debug", mode="before")
+    @classmethod
+    def decompress_debug(cls, value):
+        # Rows carry the debug payload compressed (see models.FeedbackDebug)
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return decompress_debug(bytes(value))
+        return value
+
     class Config:
         from_attributes = True  # For Pydantic v2 (instead of orm_mode in v1)
+
+
+class FeedbackBatchItemResult(BaseModel):
+    index: int  # Position of the item in the submitted array / NDJSON stream
+    status: str  # "created", "duplicate" (id of the original row), "invalid", "rate_limited" or "error"
+    id: int | None = None
+    error: str | None = None
+
+
+class FeedbackBatchResult(BaseModel):
+    created: int
+    duplicates: int = 0
+    failed: int
+    items: List[FeedbackBatchItemResult]
+
+
+class FeedbackStatsGroup(BaseModel):
+    key: Dict[str, str]  # group_by field -> value (hour/day as ISO datetime)
+    count: int
+
+
+class FeedbackStats(BaseModel):
+    start: datetime  # naive UTC+8, like created_at
+    end: datetime
+    group_by: List[str]
+    total: int
+    groups: List[FeedbackStatsGroup]
+
+
+class FeedbackPage(BaseModel):
+    items: List[UserFeedbackRead]
+    next_cursor: str | None = None  # Pass as `cursor` to fetch the next page
+
+
+class FeedbackSearchHit(BaseModel):
+    id: int
+    created_at: datetime
+    feedback_type: str
+    app_version: str
+    app_channel: str
+    highlight: str  # HTML-escaped feedback text with matches wrapped in <mark></mark>
+    score: float | None = None  # bm25 rank, lower is more relevant
+
+
+class FeedbackSearchResult(BaseModel):
+    query: str
+    items: List[FeedbackSearchHit]
+    next_offset: int | None = None
+
+
+class WebhookDeliveryRead(BaseModel):
+    # The target URL embeds the webhook secret, so only the route name is exposed
+    id: int
+    summary_id: int | None = None
+    route: str
+    status: str  # "pending", "delivered" or "failed"
+    attempts: int
+    last_error: str | None = None
+    created_at: datetime
+    next_attempt_at: datetime
+    delivered_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
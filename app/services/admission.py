@@ -0,0 +1,158 @@
+# app/services/admission.py
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from app.core.config import settings
+from app.core.metrics import INGEST_REJECTIONS
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by client identity, `rate` tokens per second up to
+    `burst`. Buckets live in an LRU-ordered dict capped at `max_keys`: the
+    least recently seen key is evicted first, and a bucket idle for
+    burst / rate seconds is full again anyway, so eviction only forgets
+    clients that are not currently being limited (unless the cap is far too
+    small for the active population).
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_keys = max(1, max_keys)
+        # key -> (tokens, last refill time); tuples keep entries small
+        self._buckets: "OrderedDict[object, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key) -> float:
+        """Takes one token. Returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is None:
+                tokens = self.burst
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens, last = entry
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                self._buckets.move_to_end(key)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class ConcurrencyLimiter:
+    """Non-blocking cap on in-flight operations: callers are turned away instead of queued."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit) if limit > 0 else None
+
+    def try_acquire(self) -> bool:
+        return self._semaphore is None or self._semaphore.acquire(blocking=False)
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+class AdmissionRejected(Exception):
+    """A request was refused; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+device_limiter = TokenBucketLimiter(
+    settings.RATE_LIMIT_DEVICE_PER_MINUTE / 60,
+    settings.RATE_LIMIT_DEVICE_BURST,
+    settings.RATE_LIMIT_MAX_TRACKED_KEYS,
+)
+user_limiter = TokenBucketLimiter(
+    settings.RATE_LIMIT_USER_PER_MINUTE / 60,
+    settings.RATE_LIMIT_USER_BURST,
+    settings.RATE_LIMIT_MAX_TRACKED_KEYS,
+)
+write_slots = ConcurrencyLimiter(settings.INGEST_MAX_IN_FLIGHT_WRITES)
+
+
+def check_rate_limits(device_id: int | None, user_uid: str | None):
+    """Raises AdmissionRejected (429) if the device or user is over its rate."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    if device_id is not None:
+        wait = device_limiter.acquire(device_id)
+        if wait:
+            INGEST_REJECTIONS.inc(reason="device_rate")
+            raise AdmissionRejected(429, "Too many feedback submissions from this device.", wait)
+    if user_uid:
+        wait = user_limiter.acquire(user_uid)
+        if wait:
+            INGEST_REJECTIONS.inc(reason="user_rate")
+            raise AdmissionRejected(429, "Too many feedback submissions from this user.", wait)
+
+
+class WriteAdmissionMiddleware:
+    """
+    Pure ASGI middleware capping in-flight POSTs to the ingestion `paths` at
+    INGEST_MAX_IN_FLIGHT_WRITES. It runs before the request is handed to the
+    threadpool, so excess requests get an immediate 503 with Retry-After
+    instead of waiting in an unbounded threadpool queue.
+    """
+
+    def __init__(self, app, paths=()):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not write_slots.try_acquire():
+            INGEST_REJECTIONS.inc(reason="concurrency")
+            await _send_rejection(
+                send,
+                AdmissionRejected(503, "Too many feedback writes in progress, retry shortly.", 1),
+            )
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            write_slots.release()
+
+
+async def _send_rejection(send, rejection: AdmissionRejected):
+    body = json.dumps({"detail": rejection.detail}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": rejection.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", rejection.headers["Retry-After"].encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
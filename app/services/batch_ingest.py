@@ -0,0 +1,112 @@
+# app/services/batch_ingest.py
+import codecs
+import json
+from typing import Any, AsyncIterator, Tuple
+
+
+class BatchBodyError(ValueError):
+    """Raised when a batch body is not a JSON array / NDJSON stream at all."""
+
+
+_WHITESPACE = " \t\r\n"
+
+
+async def iter_ndjson_items(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[Tuple[int, Any, str | None]]:
+    """
+    Yields (index, value, error) for each non-empty line of an NDJSON body.
+    Lines are decoded as they arrive, so the whole body is never held in memory.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    index = 0
+    done = False
+    while not done:
+        try:
+            chunk = await chunks.__anext__()
+            buffer += decoder.decode(chunk)
+        except StopAsyncIteration:
+            buffer += decoder.decode(b"", final=True)
+            done = True
+        *lines, buffer = buffer.split("\n")
+        if done:
+            lines.append(buffer)
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield index, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield index, None, f"Invalid JSON: {e.msg}"
+            index += 1
+
+
+async def iter_json_array_items(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[Tuple[int, Any, str | None]]:
+    """
+    Yields (index, value, None) for each element of a top-level JSON array,
+    decoding elements one at a time with JSONDecoder.raw_decode as bytes arrive.
+    Raises BatchBodyError if the body is not a well-formed array.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    index = 0
+    state = "start"  # start -> item -> separator -> item ... -> end
+    exhausted = False
+
+    while True:
+        # Skip whitespace and structural characters available in the buffer.
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos < len(buffer):
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    raise BatchBodyError("Body must be a JSON array or NDJSON.")
+                pos += 1
+                state = "first_item"
+                continue
+            if state in ("first_item", "separator") and char == "]":
+                state = "end"
+                pos += 1
+                continue
+            if state == "separator":
+                if char != ",":
+                    raise BatchBodyError(f"Expected ',' or ']' after item {index - 1}.")
+                pos += 1
+                state = "item"
+                continue
+            if state in ("first_item", "item"):
+                try:
+                    value, end = json_decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # The item may simply be incomplete; read more unless we are done.
+                    if exhausted:
+                        raise BatchBodyError(f"Invalid JSON in item {index}.")
+                else:
+                    # A number at the very end of the buffer may still be growing.
+                    if end < len(buffer) or exhausted:
+                        yield index, value, None
+                        index += 1
+                        pos = end
+                        state = "separator"
+                        continue
+            if state == "end":
+                raise BatchBodyError("Unexpected data after the end of the array.")
+
+        if exhausted:
+            if state != "end":
+                raise BatchBodyError("Body ended before the JSON array was closed.")
+            return
+        # Drop consumed text so memory is bounded by the largest single item.
+        buffer = buffer[pos:]
+        pos = 0
+        try:
+            buffer += decoder.decode(await chunks.__anext__())
+        except StopAsyncIteration:
+            buffer += decoder.decode(b"", final=True)
+            exhausted = True
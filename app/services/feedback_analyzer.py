@@ -1,50 +1,56 @@
 # app/services/feedback_analyzer.py
-import openai
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from app.core.config import settings
+from app.core import metrics
 from ..models import UserFeedback  # Assuming UserFeedback model is in app.models
-from typing import List
+from .feedback_dedup import DuplicateCollapser, FeedbackCluster
+from .image_links import strip_invalid_image_links
+from .llm_cache import cache_key, get_cached_completion, store_completion
+from typing import TYPE_CHECKING, AsyncIterable, Iterable, List
 
+if TYPE_CHECKING:
+    # Imported where first used instead: openai is the slowest import in the app
+    import openai
 
-def summarize_feedback_with_openai(feedback_list: List[UserFeedback]) -> str | None:
+SUMMARY_TEMPERATURE = 0.7
+
+# Usage counters of the current track_llm_usage() block, if any
+_llm_usage: ContextVar[dict | None] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_llm_usage():
     """
-    Summarizes a list of user feedback entries using OpenAI.
+    Yields a dict counting the LLM requests, cache hits and tokens of every
+    completion made inside the block, including by tasks it starts.
     """
-    if not feedback_list:
-        return "No new feedback to summarize."
+    usage = {"requests": 0, "cached": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    token = _llm_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _llm_usage.reset(token)
 
-    if (
-        not settings.AI_API_KEY
-        or settings.AI_API_KEY == "your_ai_api_key_please_set_in_env"
-        or settings.AI_API_KEY == "your_actual_ai_api_key_here"
-    ):
-        print(
-            "OpenAI API key is not configured. Please set AI_API_KEY in your .env file."
-        )
-        return None  # Or raise an error
 
-    # Configure OpenAI client
-    if settings.OPENAI_API_BASE_URL:
-        client = openai.OpenAI(
-            api_key=settings.AI_API_KEY, base_url=settings.OPENAI_API_BASE_URL
-        )
-    else:
-        client = openai.OpenAI(api_key=settings.AI_API_KEY)  # Pass API key directly
-
-    # Concatenate feedback messages
-    # You might want to format this more nicely or handle very long inputs
-    feedbacks_text = "\n---\n".join(
-        [
-            f"(类型: {fb.feedback_type}, 上传的图片链接: {fb.image_url}) 的反馈:\n{fb.feedback})"
-            for fb in feedback_list
-        ]
-    )
+def _add_usage(**counts: int):
+    usage = _llm_usage.get()
+    if usage is not None:
+        for name, count in counts.items():
+            usage[name] += count
 
-    prompt = f"""请你扮演一位细致的产品分析师助理，帮助我总结以下用户反馈条目。
-你的任务是：
-1.  识别关键问题、常见抱怨、有价值的建议以及任何积极的反馈。
-2.  针对不同`类型`的反馈（如使用问题、功能建议等，根据实际的值）进行归纳。
 
-请提供一个简洁、结构清晰的中文总结报告。
+SYSTEM_PROMPT = "你是一位专业的AI产品分析助手，核心任务是根据用户提供的指示，将用户反馈精准地总结为包含emoji、结构清晰的中文报告。请严格遵循用户在后续指示中提出的所有格式和内容要求。- 只能使用加粗, 文字链接, <font color='color'> 颜色文本 </font>这三种markdown格式，绝对不能使用##标题以及`-`无序等其他markdown格式。"
+
+# How to treat image links, depending on whether they were checked beforehand
+_IMAGE_LINK_INSTRUCTIONS_UNCHECKED = """如果反馈条目中包含有效的图片链接 (`image_url`不为空或无效链接占位符)，请在总结该条具体反馈时，在其内容后以 "[图片](链接)" 的格式附上。如果链接无效或为空，则忽略。"""
+_IMAGE_LINK_INSTRUCTIONS_CHECKED = """反馈条目中的图片链接均已验证可以访问。如果条目带有图片链接，请在总结该条具体反馈时，在其内容后以 "[图片](链接)" 的格式附上。"""
+
+# Output format shared by the single-pass prompt and the map-reduce prompts
+REPORT_FORMAT_INSTRUCTIONS = """请提供一个简洁、结构清晰的中文总结报告。
 在每个总结点前使用恰当的emoji来增强表达：
     ✅ 表示积极的反馈或已确认的优点。
     ⚠️ 表示需要关注的问题或BUG。
@@ -53,7 +59,7 @@ def summarize_feedback_with_openai(feedback_list: List[UserFeedback]) -> str | N
     🗣️ 表示普遍提及的抱怨或常见问题。
 总结中绝对不能包含用户信息。
 请专注于精准描述用户反馈的“内容”，不要添加任何主观评论或改进建议。
-如果反馈条目中包含有效的图片链接 (`image_url`不为空或无效链接占位符)，请在总结该条具体反馈时，在其内容后以 "[图片](链接)" 的格式附上。如果链接无效或为空，则忽略。
+{image_link_instructions}
 确保总结内容精炼，突出核心信息。
 
 !!!「使用问题」可以再拆一下, 主要是服务于软件开发者的, 需要关注开发者需要注意的问题,大体上是: bug、生成效果、社区
@@ -63,49 +69,453 @@ def summarize_feedback_with_openai(feedback_list: List[UserFeedback]) -> str | N
 **双人图难度高**：用户反馈双人图制作极其困难。
 **男性角色生成问题**：与描述词不符，被质疑男性角色生成能力。
 ————————
-最终输出只需要总结报告的正文，不要包含任何招呼语或额外的解释性文字。
+最终输出只需要总结报告的正文，不要包含任何招呼语或额外的解释性文字。"""
+
+
+def _report_format_instructions() -> str:
+    return REPORT_FORMAT_INSTRUCTIONS.format(
+        image_link_instructions=(
+            _IMAGE_LINK_INSTRUCTIONS_CHECKED
+            if settings.IMAGE_LINK_VALIDATION_ENABLED
+            else _IMAGE_LINK_INSTRUCTIONS_UNCHECKED
+        )
+    )
+
+
+def _build_summary_prompt(feedbacks_text: str) -> str:
+    return f"""请你扮演一位细致的产品分析师助理，帮助我总结以下用户反馈条目。
+你的任务是：
+1.  识别关键问题、常见抱怨、有价值的建议以及任何积极的反馈。
+2.  针对不同`类型`的反馈（如使用问题、功能建议等，根据实际的值）进行归纳。
+
+{_report_format_instructions()}
 
 反馈条目列表如下：
 {feedbacks_text}
 """
 
-    try:
-        response = client.chat.completions.create(
-            model=settings.OPENAI_MODEL_NAME,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "你是一位专业的AI产品分析助手，核心任务是根据用户提供的指示，将用户反馈精准地总结为包含emoji、结构清晰的中文报告。请严格遵循用户在后续指示中提出的所有格式和内容要求。- 只能使用加粗, 文字链接, <font color='color'> 颜色文本 </font>这三种markdown格式，绝对不能使用##标题以及`-`无序等其他markdown格式。",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-        )
-        print(response)
-        if (
-            response.choices
-            and response.choices[0].message
-            and response.choices[0].message.content
-        ):
-            summary_from_openai = response.choices[0].message.content.strip()
-
-            return summary_from_openai
+
+def _build_reduce_prompt(partial_summaries_text: str) -> str:
+    return f"""请你扮演一位细致的产品分析师助理。以下是同一时间段内的用户反馈分批总结后得到的多份部分总结，请将它们合并为一份完整的总结报告。
+你的任务是：
+1.  合并各部分中相同或相似的要点，不要重复罗列；多个部分都提到的问题说明较为普遍，应归入常见抱怨。
+2.  保留各部分针对不同`类型`反馈的归纳，以及已附上的 "[图片](链接)"。
+
+{_report_format_instructions()}
+
+部分总结列表如下：
+{partial_summaries_text}
+"""
+
+
+def _format_feedback_entry(fb) -> str:
+    details = [f"类型: {fb.feedback_type}"]
+    if fb.image_url:
+        details.append(f"上传的图片链接: {fb.image_url}")
+    # Row objects have a tuple .count() method, so check the type explicitly
+    if isinstance(fb, FeedbackCluster) and fb.count > 1:
+        # Collapsed cluster of identical / near-identical feedback
+        details.append(f"相同或相似反馈共{fb.count}条")
+    return f"({', '.join(details)}) 的反馈:\n{fb.feedback})"
+
+
+async def _iter_entries(feedback: "Iterable | AsyncIterable"):
+    if isinstance(feedback, AsyncIterable):
+        async for fb in feedback:
+            yield fb
+    else:
+        for fb in feedback:
+            yield fb
+
+
+async def collect_feedback_entries(
+    feedback: "Iterable | AsyncIterable", group_by=None
+):
+    """
+    The entries to prompt with, consumed from a list or an async iterator of
+    rows (e.g. iter_feedback_in_range_async). With SUMMARY_DEDUP_ENABLED the
+    rows are collapsed into FeedbackClusters as they arrive, so only the
+    clusters stay in memory, and the prompt tokens saved are reported.
+    With `group_by` (a function of a row) returns {group: entries}, each group
+    collapsed on its own, so one pass over the rows serves several reports.
+    """
+    dedup = settings.SUMMARY_DEDUP_ENABLED
+    started = time.perf_counter()
+    collectors: dict = {}
+    tokens_before = 0
+    async for fb in _iter_entries(feedback):
+        group = group_by(fb) if group_by is not None else None
+        collector = collectors.get(group)
+        if collector is None:
+            collector = collectors[group] = (
+                DuplicateCollapser(similarity=settings.SUMMARY_DEDUP_SIMILARITY)
+                if dedup
+                else []
+            )
+        if dedup:
+            collector.add(fb)
+            tokens_before += _estimate_tokens(_format_feedback_entry(fb))
         else:
-            print("OpenAI API returned an empty or unexpected response.")
+            collector.append(fb)
+
+    if dedup:
+        groups = {group: collector.clusters for group, collector in collectors.items()}
+        all_clusters = [c for clusters in groups.values() for c in clusters]
+        tokens_after = sum(_estimate_tokens(_format_feedback_entry(c)) for c in all_clusters)
+        print(
+            f"Dedup: collapsed {sum(c.count for c in all_clusters)} feedback entries "
+            f"into {len(all_clusters)} "
+            f"in {time.perf_counter() - started:.2f}s, saving ~{tokens_before - tokens_after} "
+            f"of ~{tokens_before} prompt tokens."
+        )
+    else:
+        groups = collectors
+    if group_by is not None:
+        return groups
+    return groups.get(None, [])
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate without a tokenizer: CJK characters are ~1 token and
+    take 3 bytes in UTF-8, ASCII text is ~3-4 characters per token.
+    """
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def _is_api_key_configured() -> bool:
+    if (
+        not settings.AI_API_KEY
+        or settings.AI_API_KEY == "your_ai_api_key_please_set_in_env"
+        or settings.AI_API_KEY == "your_actual_ai_api_key_here"
+    ):
+        print(
+            "OpenAI API key is not configured. Please set AI_API_KEY in your .env file."
+        )
+        return False
+    return True
+
+
+# Long-lived client shared by all summary jobs; created at application startup
+_async_client: "openai.AsyncOpenAI | None" = None
+
+
+def _create_async_client() -> "openai.AsyncOpenAI":
+    import openai
+
+    # Retries are handled by _request_completion so they can use jittered backoff
+    kwargs = {
+        "api_key": settings.AI_API_KEY,
+        "timeout": settings.OPENAI_REQUEST_TIMEOUT_SECONDS,
+        "max_retries": 0,
+    }
+    if settings.OPENAI_API_BASE_URL:
+        kwargs["base_url"] = settings.OPENAI_API_BASE_URL
+    return openai.AsyncOpenAI(**kwargs)
+
+
+def init_llm_client() -> "openai.AsyncOpenAI":
+    """Creates the shared AsyncOpenAI client (and its connection pool) if needed."""
+    global _async_client
+    if _async_client is None:
+        _async_client = _create_async_client()
+    return _async_client
+
+
+async def close_llm_client():
+    """Closes the shared client and its pooled connections."""
+    global _async_client
+    if _async_client is not None:
+        client, _async_client = _async_client, None
+        await client.close()
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+    cap = min(
+        settings.OPENAI_RETRY_MAX_DELAY_SECONDS,
+        settings.OPENAI_RETRY_BASE_DELAY_SECONDS * (2**attempt),
+    )
+    delay = random.uniform(0, cap)
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), settings.OPENAI_RETRY_MAX_DELAY_SECONDS))
+        except ValueError:
+            pass
+    return delay
+
+
+async def _request_completion(client: "openai.AsyncOpenAI", prompt: str) -> str | None:
+    """
+    Sends one prompt to the chat completions API and returns the stripped text.
+    429, 5xx, timeouts and connection errors are retried up to OPENAI_MAX_RETRIES
+    times. Cancellation (e.g. on shutdown) propagates immediately.
+    Identical requests are answered from the LLM response cache.
+    """
+    key = cache_key(settings.OPENAI_MODEL_NAME, SYSTEM_PROMPT, prompt, SUMMARY_TEMPERATURE)
+    cached = await get_cached_completion(key)
+    if cached is not None:
+        _add_usage(cached=1)
+        return cached
+
+    import openai
+
+    attempt = 0
+    while True:
+        try:
+            response = await client.chat.completions.create(
+                model=settings.OPENAI_MODEL_NAME,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": SYSTEM_PROMPT,
+                    },
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=SUMMARY_TEMPERATURE,
+            )
+            print(response)
+            _add_usage(requests=1)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, kind="prompt")
+                metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, kind="completion")
+                _add_usage(
+                    prompt_tokens=usage.prompt_tokens or 0,
+                    completion_tokens=usage.completion_tokens or 0,
+                )
+            if (
+                response.choices
+                and response.choices[0].message
+                and response.choices[0].message.content
+            ):
+                summary_from_openai = response.choices[0].message.content.strip()
+
+                metrics.LLM_REQUESTS.inc(outcome="success")
+                await store_completion(key, settings.OPENAI_MODEL_NAME, summary_from_openai)
+                return summary_from_openai
+            else:
+                print("OpenAI API returned an empty or unexpected response.")
+                metrics.LLM_REQUESTS.inc(outcome="failure")
+                return None
+        except openai.APIError as e:
+            if _is_retryable(e) and attempt < settings.OPENAI_MAX_RETRIES:
+                delay = _retry_delay(e, attempt)
+                attempt += 1
+                metrics.LLM_REQUESTS.inc(outcome="retry")
+                print(
+                    f"OpenAI request failed ({type(e).__name__}); retry {attempt}/{settings.OPENAI_MAX_RETRIES} in {delay:.1f}s."
+                )
+                await asyncio.sleep(delay)
+                continue
+            if isinstance(e, openai.APIStatusError):  # More specific error for status-related issues
+                print("OpenAI API Status Error encountered:")
+                print(f"  Status Code: {e.status_code}")
+                print(f"  Message: {e.message}")
+                if e.response and hasattr(e.response, "text"):
+                    print(f"  Response Body: {e.response.text}")
+            else:  # Catch other OpenAI API errors
+                print(f"OpenAI API Error encountered: {e}")
+            metrics.LLM_REQUESTS.inc(outcome="failure")
+            return None
+        except Exception as e:
+            print(f"An unexpected error occurred while calling OpenAI API: {e}")
+            import traceback
+
+            traceback.print_exc()
+            metrics.LLM_REQUESTS.inc(outcome="failure")
             return None
-    except openai.APIStatusError as e:  # More specific error for status-related issues
-        print("OpenAI API Status Error encountered:")
-        print(f"  Status Code: {e.status_code}")
-        print(f"  Message: {e.message}")
-        if e.response and hasattr(e.response, "text"):
-            print(f"  Response Body: {e.response.text}")
+
+
+def summarize_feedback_with_openai(feedback_list: List[UserFeedback]) -> str | None:
+    """
+    Summarizes a list of user feedback entries using OpenAI.
+    Synchronous wrapper around summarize_feedback_hierarchical for scripts; it
+    runs its own event loop and client, so do not call it from async code.
+    """
+
+    async def run() -> str | None:
+        client = _create_async_client()
+        try:
+            return await summarize_feedback_hierarchical(feedback_list, client=client)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def _split_into_chunks(feedback_list: List[UserFeedback], token_budget: int) -> List[str]:
+    """
+    Groups entries by feedback_type and packs them into chunks whose formatted
+    text stays within token_budget. Small types share a chunk; a large type is
+    split across several chunks, but a chunk never interleaves types.
+    """
+    by_type: dict = {}
+    for fb in feedback_list:
+        by_type.setdefault(fb.feedback_type or "未知类型", []).append(
+            _format_feedback_entry(fb)
+        )
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for entries in by_type.values():
+        for entry in entries:
+            entry_tokens = _estimate_tokens(entry)
+            if current and current_tokens + entry_tokens > token_budget:
+                chunks.append("\n---\n".join(current))
+                current, current_tokens = [], 0
+            current.append(entry)
+            current_tokens += entry_tokens
+    if current:
+        chunks.append("\n---\n".join(current))
+    return chunks
+
+
+async def summarize_feedback_hierarchical(
+    feedback: "Iterable | AsyncIterable",
+    client: "openai.AsyncOpenAI | None" = None,
+) -> str | None:
+    """
+    Map-reduce summarization for windows too large for a single prompt.
+    `feedback` is a list or an async iterator of rows (or FeedbackClusters);
+    duplicates are collapsed while it is consumed (collect_feedback_entries)
+    and broken image links dropped (see image_links.strip_invalid_image_links),
+    then feedback is split into SUMMARY_CHUNK_TOKEN_BUDGET sized chunks
+    (grouped by feedback_type), chunks are summarized concurrently (at most
+    SUMMARY_MAX_CONCURRENCY requests in flight), and partial summaries are
+    merged by reduce passes into the final report. Small inputs use a single
+    call.
+    Uses the shared AsyncOpenAI client unless one is passed in.
+    """
+    if isinstance(feedback, list) and all(
+        isinstance(fb, FeedbackCluster) for fb in feedback
+    ):
+        feedback_list = feedback  # Already collected by collect_feedback_entries
+    else:
+        feedback_list = await collect_feedback_entries(feedback)
+    if not feedback_list:
+        return "No new feedback to summarize."
+
+    if not _is_api_key_configured():
+        return None
+
+    if settings.IMAGE_LINK_VALIDATION_ENABLED:
+        # Broken links are dropped here instead of asking the model to judge them
+        feedback_list = await strip_invalid_image_links(feedback_list)
+
+    budget = max(1, settings.SUMMARY_CHUNK_TOKEN_BUDGET)
+    started = time.perf_counter()
+    chunks = _split_into_chunks(feedback_list, budget)
+    print(
+        f"Split {len(feedback_list)} feedback entries into {len(chunks)} chunk(s) "
+        f"(budget {budget} tokens) in {time.perf_counter() - started:.3f}s."
+    )
+
+    if client is None:
+        client = init_llm_client()
+    if len(chunks) == 1:
+        return await _request_completion(client, _build_summary_prompt(chunks[0]))
+
+    semaphore = asyncio.Semaphore(max(1, settings.SUMMARY_MAX_CONCURRENCY))
+
+    async def complete(prompt: str) -> str | None:
+        async with semaphore:
+            return await _request_completion(client, prompt)
+
+    map_started = time.perf_counter()
+    partials = await asyncio.gather(
+        *(complete(_build_summary_prompt(chunk)) for chunk in chunks)
+    )
+    print(
+        f"Map stage: summarized {len(chunks)} chunk(s) in {time.perf_counter() - map_started:.2f}s."
+    )
+    if any(partial is None for partial in partials):
+        print("Map stage failed for at least one chunk; aborting summary.")
         return None
-    except openai.APIError:  # Catch other OpenAI API errors
-        print("OpenAI API Error encountered:")
+
+    merged = await _reduce_partials(list(partials), complete, budget)
+    if merged is None:
         return None
-    except Exception as e:
-        print(f"An unexpected error occurred while calling OpenAI API: {e}")
-        import traceback
 
-        traceback.print_exc()
+    print(f"Hierarchical summary finished in {time.perf_counter() - started:.2f}s.")
+    return merged
+
+
+async def _reduce_partials(partials: List[str], complete, budget: int) -> str | None:
+    """
+    Merges partial summaries with reduce prompts, in several rounds if they do
+    not all fit into one prompt of `budget` tokens.
+    """
+    reduce_round = 0
+    while len(partials) > 1:
+        reduce_round += 1
+        reduce_started = time.perf_counter()
+        groups: List[List[str]] = [[]]
+        group_tokens = 0
+        for partial in partials:
+            partial_tokens = _estimate_tokens(partial)
+            if groups[-1] and group_tokens + partial_tokens > budget:
+                groups.append([])
+                group_tokens = 0
+            groups[-1].append(partial)
+            group_tokens += partial_tokens
+        if len(groups) == len(partials):
+            # Every partial fills a prompt on its own; merge pairwise to make progress.
+            groups = [partials[i : i + 2] for i in range(0, len(partials), 2)]
+        partials = await asyncio.gather(
+            *(
+                complete(_build_reduce_prompt("\n======\n".join(group)))
+                if len(group) > 1
+                else asyncio.sleep(0, result=group[0])
+                for group in groups
+            )
+        )
+        print(
+            f"Reduce stage round {reduce_round}: merged into {len(partials)} summary(ies) "
+            f"in {time.perf_counter() - reduce_started:.2f}s."
+        )
+        if any(partial is None for partial in partials):
+            print("Reduce stage failed; aborting summary.")
+            return None
+    return partials[0] if partials else None
+
+
+async def merge_summaries(
+    summaries: List[str], client: "openai.AsyncOpenAI | None" = None
+) -> str | None:
+    """
+    Merges already generated summaries (e.g. stored daily reports) into one
+    report with the reduce prompt, without re-reading the raw feedback.
+    """
+    summaries = [summary for summary in summaries if summary]
+    if not summaries:
+        return None
+    if len(summaries) == 1:
+        return summaries[0]
+    if not _is_api_key_configured():
         return None
+
+    if client is None:
+        client = init_llm_client()
+    semaphore = asyncio.Semaphore(max(1, settings.SUMMARY_MAX_CONCURRENCY))
+
+    async def complete(prompt: str) -> str | None:
+        async with semaphore:
+            return await _request_completion(client, prompt)
+
+    return await _reduce_partials(
+        summaries, complete, max(1, settings.SUMMARY_CHUNK_TOKEN_BUDGET)
+    )
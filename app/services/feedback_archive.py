@@ -0,0 +1,116 @@
+# app/services/feedback_archive.py
+"""
+Cold storage for feedback past its retention age: one gzip-compressed JSONL
+file per month of created_at (feedback-YYYY-MM.jsonl.gz) under
+FEEDBACK_ARCHIVE_DIR. Batches are appended as separate gzip members, which
+gzip readers concatenate transparently.
+"""
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List
+
+from app.core.config import settings
+from ..models import FeedbackDebug, UserFeedback, compress_debug
+
+_FILE_RE = re.compile(r"^feedback-(\d{4})-(\d{2})\.jsonl\.gz$")
+
+ARCHIVED_FIELDS = (
+    "id",
+    "user_uid",
+    "device_id",
+    "app_version",
+    "app_channel",
+    "user_agent",
+    "feedback_type",
+    "feedback",
+    "image_url",
+    "submission_key",
+)
+
+
+def _archive_dir() -> str:
+    return settings.FEEDBACK_ARCHIVE_DIR
+
+
+def _month_path(month: date) -> str:
+    return os.path.join(_archive_dir(), f"feedback-{month.year:04d}-{month.month:02d}.jsonl.gz")
+
+
+def archived_months() -> List[date]:
+    """Months (as the first day) that have an archive file, oldest first."""
+    try:
+        names = os.listdir(_archive_dir())
+    except FileNotFoundError:
+        return []
+    months = []
+    for name in names:
+        match = _FILE_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def append_records(records: Iterable[dict]) -> Dict[date, int]:
+    """
+    Appends records (dicts with a naive created_at datetime) to their month
+    files, fsyncing each file before returning so the caller can safely
+    delete the rows. Returns the number of records written per month.
+    """
+    by_month: Dict[date, List[str]] = {}
+    for record in records:
+        created_at = record["created_at"]
+        line = json.dumps(
+            {**record, "created_at": created_at.isoformat()}, ensure_ascii=False
+        )
+        by_month.setdefault(created_at.date().replace(day=1), []).append(line)
+
+    os.makedirs(_archive_dir(), exist_ok=True)
+    for month, lines in by_month.items():
+        with open(_month_path(month), "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+                archive.write(("\n".join(lines) + "\n").encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+    return {month: len(lines) for month, lines in by_month.items()}
+
+
+def _iter_month(month: date) -> Iterator[dict]:
+    with gzip.open(_month_path(month), "rt", encoding="utf-8") as archive:
+        for line in archive:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _to_feedback(record: dict) -> UserFeedback:
+    feedback = UserFeedback(**{field: record.get(field) for field in ARCHIVED_FIELDS})
+    feedback.created_at = datetime.fromisoformat(record["created_at"])
+    debug = record.get("debug")
+    feedback.debug_record = (
+        FeedbackDebug(feedback_id=feedback.id, data=compress_debug(debug))
+        if debug is not None
+        else None
+    )
+    return feedback
+
+
+def read_archived_feedback(start_naive: datetime, end_naive: datetime) -> List[UserFeedback]:
+    """
+    Returns archived feedback with created_at in [start_naive, end_naive] as
+    transient (never added to a session) UserFeedback objects. Only the
+    month files overlapping the range are opened.
+    """
+    first_month = start_naive.date().replace(day=1)
+    rows: Dict[int, UserFeedback] = {}
+    for month in archived_months():
+        if month < first_month or month > end_naive.date():
+            continue
+        for record in _iter_month(month):
+            created_at = datetime.fromisoformat(record["created_at"])
+            if start_naive <= created_at <= end_naive:
+                # A batch interrupted between writing and deleting is archived
+                # again by the next run; ids make the copies identical.
+                rows[record["id"]] = _to_feedback(record)
+    return list(rows.values())
@@ -0,0 +1,157 @@
+# app/services/feedback_dedup.py
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Iterable, List
+
+# Everything except letters/digits (incl. CJK) is ignored when comparing texts
+_NOISE_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+_SHINGLE_SIZE = 3
+_MINHASH_BINS = 16
+_BAND_SIZE = 2  # 8 bands of 2 bins: pairs with Jaccard >= ~0.8 almost always collide
+_MAX_CANDIDATES = 8  # Clusters verified per entry, keeps the worst case linear
+_EMPTY_BIN = (1 << 64) - 1
+_MAX_IMAGE_URLS = 5  # Links kept per cluster
+
+
+@dataclass
+class FeedbackCluster:
+    """One representative feedback standing in for `count` identical/similar entries."""
+
+    feedback_type: str
+    feedback: str
+    count: int = 1
+    image_urls: List[str] = field(default_factory=list)
+
+    @property
+    def image_url(self) -> str | None:
+        return ", ".join(self.image_urls) if self.image_urls else None
+
+
+def _normalize(text: str) -> str:
+    return _NOISE_RE.sub("", (text or "").lower())
+
+
+def _shingles(normalized: str) -> frozenset:
+    if len(normalized) <= _SHINGLE_SIZE:
+        return frozenset([normalized])
+    return frozenset(
+        normalized[i : i + _SHINGLE_SIZE]
+        for i in range(len(normalized) - _SHINGLE_SIZE + 1)
+    )
+
+
+def _band_keys(shingles: frozenset) -> List[tuple]:
+    """
+    One-permutation MinHash: each shingle hash is routed to one of
+    _MINHASH_BINS bins by its low bits and every bin keeps its minimum, so the
+    signature costs a single pass over the shingles. Bands made only of empty
+    bins are skipped so short texts do not all collide with each other.
+    Shingles are hashed with CRC-32 rather than hash(), which is salted per
+    process, so the clusters (and the prompts built from them) are the same
+    on every run and worker.
+    """
+    bins = [_EMPTY_BIN] * _MINHASH_BINS
+    for shingle in shingles:
+        h = zlib.crc32(shingle.encode("utf-8"))
+        index = h % _MINHASH_BINS
+        if h < bins[index]:
+            bins[index] = h
+    keys = []
+    for band in range(0, _MINHASH_BINS, _BAND_SIZE):
+        values = tuple(bins[band : band + _BAND_SIZE])
+        if all(value == _EMPTY_BIN for value in values):
+            continue
+        keys.append((band, values))
+    return keys
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+
+class DuplicateCollapser:
+    """
+    Incremental form of collapse_duplicates: entries are added one at a time
+    (e.g. straight from a database cursor) and only the clusters and their
+    shingle / LSH indexes are kept, never the entries themselves. Adding a
+    FeedbackCluster merges its whole count, so already collapsed clusters can
+    be collapsed again.
+    """
+
+    def __init__(self, similarity: float = 0.8):
+        self.similarity = similarity
+        self.clusters: List[FeedbackCluster] = []
+        self._cluster_shingles: List[frozenset] = []
+        self._exact: dict = {}
+        self._buckets: dict = {}
+
+    def add(self, fb):
+        feedback_type = getattr(fb, "feedback_type", None) or "未知类型"
+        text = getattr(fb, "feedback", "") or ""
+        # Row objects have a tuple .count() method, so check the type explicitly
+        if isinstance(fb, FeedbackCluster):
+            weight, image_urls = fb.count, fb.image_urls
+        else:
+            image_url = getattr(fb, "image_url", None)
+            weight, image_urls = 1, [image_url] if image_url else []
+        normalized = _normalize(text)
+
+        cluster_index = self._exact.get((feedback_type, normalized))
+        keys = None
+        if cluster_index is None and normalized:
+            shingles = _shingles(normalized)
+            keys = _band_keys(shingles)
+            checked = set()
+            for key in keys:
+                candidate = self._buckets.get((feedback_type, key))
+                if candidate is None or candidate in checked:
+                    continue
+                checked.add(candidate)
+                if _jaccard(shingles, self._cluster_shingles[candidate]) >= self.similarity:
+                    cluster_index = candidate
+                    break
+                if len(checked) >= _MAX_CANDIDATES:
+                    break
+
+        if cluster_index is None:
+            cluster_index = len(self.clusters)
+            self.clusters.append(
+                FeedbackCluster(feedback_type=feedback_type, feedback=text, count=weight)
+            )
+            self._cluster_shingles.append(
+                _shingles(normalized) if normalized else frozenset()
+            )
+            for key in keys or _band_keys(self._cluster_shingles[-1]):
+                self._buckets.setdefault((feedback_type, key), cluster_index)
+        else:
+            self.clusters[cluster_index].count += weight
+        self._exact.setdefault((feedback_type, normalized), cluster_index)
+
+        cluster = self.clusters[cluster_index]
+        for image_url in image_urls:
+            if len(cluster.image_urls) >= _MAX_IMAGE_URLS:
+                break
+            if image_url not in cluster.image_urls:
+                cluster.image_urls.append(image_url)
+
+
+def collapse_duplicates(
+    feedback_list: Iterable, similarity: float = 0.8
+) -> List[FeedbackCluster]:
+    """
+    Collapses identical and near-identical feedback into FeedbackClusters.
+    Entries are only merged within the same feedback_type. Exact duplicates
+    (after dropping case, whitespace and punctuation) are found by hashing;
+    near duplicates by MinHash LSH candidates verified with the Jaccard
+    similarity of character 3-gram shingles. Runs in roughly linear time.
+    Clusters keep first-seen order; the first entry is the representative.
+    """
+    collapser = DuplicateCollapser(similarity)
+    for fb in feedback_list:
+        collapser.add(fb)
+    return collapser.clusters
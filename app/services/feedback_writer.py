@@ -0,0 +1,221 @@
+# app/services/feedback_writer.py
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.database import engine
+from .. import crud, schemas
+
+
+class IngestQueueFullError(Exception):
+    """Raised when the group-commit queue is full or the writer is not accepting rows."""
+
+
+class GroupCommitWriter:
+    """
+    Write-behind queue for feedback ingestion.
+    Requests enqueue rows and wait on (or await) a Future; a single background thread
+    drains the queue and commits rows in batches, so many requests share one fsync.
+    A batch is flushed when INGEST_BATCH_MAX_SIZE rows are queued or
+    INGEST_BATCH_MAX_WAIT_MS has passed since the first row of the batch arrived.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        max_batch_size: int,
+        max_wait_ms: int,
+        max_queue_size: int,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max(0, max_wait_ms) / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_queue_size))
+        self._thread: threading.Thread | None = None
+        self._accepting = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._accepting = True
+        self._thread = threading.Thread(
+            target=self._run, name="feedback-group-commit", daemon=True
+        )
+        self._thread.start()
+        print(
+            f"Group-commit writer started (batch size {self.max_batch_size}, max wait {self.max_wait_seconds * 1000:.0f}ms)."
+        )
+
+    def submit(
+        self,
+        feedback_in: schemas.UserFeedbackCreate,
+        timeout: float,
+        submission_key: str | None = None,
+    ) -> Tuple[schemas.UserFeedbackRead, bool]:
+        """
+        Enqueues a row and blocks until the batch containing it is committed.
+        Returns (row, created): the stored row including its assigned id, or
+        the original row and False if `submission_key` was already stored.
+        On timeout the row is withdrawn and TimeoutError raised, unless the
+        writer has already picked it up; then the commit is waited for, so a
+        caller is never told a row failed that is stored anyway.
+        """
+        future = self._enqueue(feedback_in, submission_key)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise
+            return future.result()
+
+    async def submit_async(
+        self,
+        feedback_in: schemas.UserFeedbackCreate,
+        timeout: float,
+        submission_key: str | None = None,
+    ) -> Tuple[schemas.UserFeedbackRead, bool]:
+        """
+        Like submit, but awaits the commit instead of blocking a thread.
+        Raises asyncio.TimeoutError if the row was withdrawn before the writer
+        picked it up.
+        """
+        future = self._enqueue(feedback_in, submission_key)
+        try:
+            # shield: cancellation is decided below, under the writer's claim
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), timeout
+            )
+        except asyncio.TimeoutError:
+            if future.cancel():
+                raise
+            return await asyncio.wrap_future(future)
+
+    def _enqueue(
+        self, feedback_in: schemas.UserFeedbackCreate, submission_key: str | None
+    ) -> Future:
+        if not self._accepting:
+            raise IngestQueueFullError("Group-commit writer is not running.")
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((feedback_in, submission_key, future))
+        except queue.Full:
+            raise IngestQueueFullError("Group-commit queue is full.")
+        return future
+
+    def stop(self, timeout: float | None = None):
+        """Stops accepting rows, flushes everything already queued and joins the thread."""
+        if not self.running:
+            return
+        self._accepting = False
+        print(f"Draining group-commit writer ({self._queue.qsize()} queued rows)...")
+        self._queue.put(self._STOP)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        print("Group-commit writer stopped.")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is self._STOP:
+                break
+            batch: List[Tuple[schemas.UserFeedbackCreate, str | None, Future]] = [first]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = (
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+        # Drain whatever was queued before the stop marker was observed.
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not self._STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.max_batch_size):
+            self._flush(leftover[start : start + self.max_batch_size])
+
+    def _flush(self, batch: List[Tuple[schemas.UserFeedbackCreate, str | None, Future]]):
+        # Claim the rows; ones whose request already gave up (cancelled) are
+        # skipped, and claimed ones can no longer be cancelled.
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # Retries of the same submission queued together are stored once
+        unique: dict = {}
+        waiters: List[Tuple[object, Future]] = []
+        for position, (feedback_in, key, future) in enumerate(batch):
+            slot = key if key is not None else position
+            unique.setdefault(slot, (feedback_in, key))
+            waiters.append((slot, future))
+        slots = list(unique)
+        try:
+            results = self._store([unique[slot] for slot in slots])
+        except Exception as e:
+            print(f"Group-commit flush of {len(batch)} rows failed: {e}")
+            for _, future in waiters:
+                future.set_exception(e)
+            return
+        by_slot = dict(zip(slots, results))
+        for slot, future in waiters:
+            row, created = by_slot[slot]
+            future.set_result((row, created))
+            # Later retries in the same batch resolve to the row just created
+            by_slot[slot] = (row, False)
+
+    def _store(
+        self, items: List[Tuple[schemas.UserFeedbackCreate, str | None]]
+    ) -> List[Tuple[schemas.UserFeedbackRead, bool]]:
+        try:
+            with Session(engine, expire_on_commit=False) as session:
+                rows = crud.create_feedback_batch_db(
+                    session,
+                    [feedback_in for feedback_in, _ in items],
+                    [key for _, key in items],
+                )
+                return [
+                    (schemas.UserFeedbackRead.model_validate(row), True) for row in rows
+                ]
+        except IntegrityError:
+            # A submission in the batch was stored before (e.g. by another
+            # worker); insert row by row so only that one resolves to the original.
+            results = []
+            for feedback_in, key in items:
+                with Session(engine, expire_on_commit=False) as session:
+                    row, created = crud.create_feedback_db(session, feedback_in, key)
+                    results.append(
+                        (schemas.UserFeedbackRead.model_validate(row), created)
+                    )
+            return results
+
+
+feedback_writer = GroupCommitWriter(
+    max_batch_size=settings.INGEST_BATCH_MAX_SIZE,
+    max_wait_ms=settings.INGEST_BATCH_MAX_WAIT_MS,
+    max_queue_size=settings.INGEST_QUEUE_MAX_SIZE,
+)
@@ -0,0 +1,82 @@
+# app/services/idempotency.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from app.core.config import settings
+from .. import schemas
+
+
+def _hash_key(material: str) -> str:
+    # 128 bits is plenty against accidental collisions and keeps the index small
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+def _auto_key(feedback_in: schemas.UserFeedbackCreate, bucket: int) -> str:
+    return _hash_key(
+        f"auto\0{feedback_in.user_uid}\0{feedback_in.device_id}\0"
+        f"{feedback_in.feedback}\0{bucket}"
+    )
+
+
+def submission_keys(
+    feedback_in: schemas.UserFeedbackCreate,
+    idempotency_key: str | None = None,
+    now: float | None = None,
+) -> Tuple[str | None, str | None]:
+    """
+    (key, previous_key). `key` is stored in UserFeedback.submission_key
+    (unique). A client supplied Idempotency-Key is scoped to the user and has
+    no previous key. Without one, identical (user_uid, device_id, feedback)
+    submissions share a key per DUPLICATE_WINDOW_SECONDS bucket, and
+    `previous_key` is the key of the bucket before. A retry less than one
+    window after the original is at most one bucket later, so treating a row
+    stored under either key as the original catches every such retry; as a
+    consequence identical re-submissions up to 2 * DUPLICATE_WINDOW_SECONDS
+    apart are suppressed too. Only `key` is backed by the unique index:
+    `previous_key` is checked in recent_submissions, so a retry crossing a
+    bucket boundary is caught while this process still remembers the original.
+    """
+    if not settings.IDEMPOTENCY_ENABLED:
+        return None, None
+    if idempotency_key:
+        return _hash_key(f"key\0{feedback_in.user_uid}\0{idempotency_key}"), None
+    window = max(1, settings.DUPLICATE_WINDOW_SECONDS)
+    bucket = int((time.time() if now is None else now) // window)
+    return _auto_key(feedback_in, bucket), _auto_key(feedback_in, bucket - 1)
+
+
+class RecentSubmissions:
+    """
+    Bounded LRU of submission key -> stored row, so a retry seen by this
+    process is answered without touching the database. The unique index on
+    submission_key remains the source of truth (other workers, evicted keys).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, schemas.UserFeedbackRead]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str | None) -> schemas.UserFeedbackRead | None:
+        if key is None:
+            return None
+        with self._lock:
+            row = self._entries.get(key)
+            if row is not None:
+                self._entries.move_to_end(key)
+            return row
+
+    def put(self, key: str | None, row: schemas.UserFeedbackRead):
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = row
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+recent_submissions = RecentSubmissions(settings.IDEMPOTENCY_CACHE_MAX_ENTRIES)
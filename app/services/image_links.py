@@ -0,0 +1,192 @@
+# app/services/image_links.py
+import asyncio
+import ipaddress
+import re
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.core.metrics import IMAGE_LINK_CHECKS
+from .feedback_dedup import FeedbackCluster
+
+if TYPE_CHECKING:
+    import httpx  # Imported on first use to keep application startup fast
+
+# image_url may hold several links (clusters join theirs with ", ")
+_URL_SPLIT_RE = re.compile(r"[\s,，]+")
+# HEAD answers that are final; anything else non-2xx is retried with GET,
+# since some CDNs and object stores reject HEAD (403/405/501)
+_HEAD_DEFINITIVE_FAILURES = {404, 410}
+
+# url -> (valid, monotonic expiry); most recently used last
+_cache: "OrderedDict[str, tuple[bool, float]]" = OrderedDict()
+
+
+def _split_urls(image_url: str | None) -> List[str]:
+    return [url for url in _URL_SPLIT_RE.split(image_url or "") if url]
+
+
+def _is_allowed_target(url: str) -> bool:
+    """Only http(s) links, and no loopback/private hosts unless explicitly allowed."""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    if settings.IMAGE_CHECK_ALLOW_PRIVATE_HOSTS:
+        return True
+    if parts.hostname == "localhost" or parts.hostname.endswith(".localhost"):
+        return False
+    try:
+        address = ipaddress.ip_address(parts.hostname)
+    except ValueError:
+        return True  # A domain name
+    return address.is_global
+
+
+async def _guard_redirect(request: "httpx.Request"):
+    import httpx
+
+    # Redirects must not lead the checker to hosts it would refuse to call directly
+    if not _is_allowed_target(str(request.url)):
+        raise httpx.RequestError(f"Refusing to request {request.url.host}", request=request)
+
+
+def _cache_get(url: str) -> bool | None:
+    entry = _cache.get(url)
+    if entry is None:
+        return None
+    valid, expires_at = entry
+    if expires_at < time.monotonic():
+        del _cache[url]
+        return None
+    _cache.move_to_end(url)
+    return valid
+
+
+def _cache_put(url: str, valid: bool):
+    _cache[url] = (valid, time.monotonic() + settings.IMAGE_CHECK_CACHE_TTL_SECONDS)
+    _cache.move_to_end(url)
+    while len(_cache) > settings.IMAGE_CHECK_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def _looks_like_image(response: "httpx.Response") -> bool:
+    if not response.is_success:
+        return False
+    # Broken links on many hosts come back as a 200 HTML error page
+    content_type = response.headers.get("content-type", "").lower()
+    return not content_type.startswith("text/html")
+
+
+async def _check_url(client: "httpx.AsyncClient", url: str) -> bool | None:
+    """True/False for a definite answer, None if the host could not be reached."""
+    import httpx
+
+    try:
+        response = await client.head(url)
+        if response.is_success or response.status_code in _HEAD_DEFINITIVE_FAILURES:
+            return _looks_like_image(response)
+        # Fall back to a GET of the first byte only
+        async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+            return _looks_like_image(response)
+    except httpx.HTTPError:
+        return None
+
+
+async def validate_image_urls(
+    urls: Iterable[str], client: "httpx.AsyncClient | None" = None
+) -> Dict[str, bool]:
+    """
+    Checks each distinct URL at most once, concurrently (at most
+    IMAGE_CHECK_CONCURRENCY requests in flight). Answers are cached for
+    IMAGE_CHECK_CACHE_TTL_SECONDS, so a weekly run reuses the daily checks;
+    unreachable hosts count as invalid but are not cached.
+    """
+    results: Dict[str, bool] = {}
+    pending: List[str] = []
+    for url in dict.fromkeys(urls):
+        cached = _cache_get(url)
+        if cached is not None:
+            results[url] = cached
+            IMAGE_LINK_CHECKS.inc(result="cached")
+        elif not _is_allowed_target(url):
+            results[url] = False
+            IMAGE_LINK_CHECKS.inc(result="rejected")
+        else:
+            pending.append(url)
+    if not pending:
+        return results
+
+    concurrency = max(1, settings.IMAGE_CHECK_CONCURRENCY)
+    semaphore = asyncio.Semaphore(concurrency)
+    owns_client = client is None
+    if owns_client:
+        import httpx
+
+        client = httpx.AsyncClient(
+            timeout=settings.IMAGE_CHECK_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency),
+            event_hooks={"request": [_guard_redirect]},
+        )
+
+    async def check(url: str):
+        async with semaphore:
+            valid = await _check_url(client, url)
+        if valid is None:
+            results[url] = False
+            IMAGE_LINK_CHECKS.inc(result="error")
+        else:
+            results[url] = valid
+            _cache_put(url, valid)
+            IMAGE_LINK_CHECKS.inc(result="valid" if valid else "invalid")
+
+    answered_locally = len(results)
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(check(url) for url in pending))
+    finally:
+        if owns_client:
+            await client.aclose()
+    print(
+        f"Image links: checked {len(pending)} URL(s) in {time.perf_counter() - started:.2f}s "
+        f"({answered_locally} answered from cache/rules), "
+        f"{sum(1 for url in pending if not results[url])} invalid."
+    )
+    return results
+
+
+async def strip_invalid_image_links(
+    feedback_list: list, client: "httpx.AsyncClient | None" = None
+) -> List[FeedbackCluster]:
+    """
+    Returns the feedback as FeedbackClusters (rows become clusters of one)
+    keeping only image links that were verified to work.
+    """
+    entry_urls = [_split_urls(getattr(fb, "image_url", None)) for fb in feedback_list]
+    valid = await validate_image_urls(
+        (url for urls in entry_urls for url in urls), client=client
+    )
+    cleaned = []
+    for fb, urls in zip(feedback_list, entry_urls):
+        kept = [url for url in urls if valid.get(url)]
+        if isinstance(fb, FeedbackCluster):
+            fb.image_urls = kept
+            cleaned.append(fb)
+        else:
+            cleaned.append(
+                FeedbackCluster(
+                    feedback_type=fb.feedback_type or "未知类型",
+                    feedback=fb.feedback or "",
+                    image_urls=kept,
+                )
+            )
+    return cleaned
@@ -0,0 +1,88 @@
+# app/services/leader_election.py
+import asyncio
+import os
+import socket
+import time
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.crud import release_lease, try_acquire_lease
+from app.database import engine
+
+
+class LeaderLease:
+    """
+    DB-backed leadership lease. Every worker heartbeats: the owner renews the
+    lease, the others try to take it, so when the leader dies (and stops
+    renewing) another worker takes over within about one TTL.
+
+    Leadership is tracked locally against the monotonic clock from the moment
+    the last successful heartbeat started, so a worker that cannot reach the
+    database stops considering itself leader before its lease can be taken.
+    """
+
+    def __init__(self, name: str, owner: str, ttl_seconds: float, renew_seconds: float):
+        self.name = name
+        self.owner = owner
+        self.ttl_seconds = ttl_seconds
+        self.renew_seconds = max(1.0, min(renew_seconds, ttl_seconds / 2))
+        self._valid_until = 0.0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    def heartbeat(self) -> bool:
+        """Renews or tries to acquire the lease (blocking). Returns leadership."""
+        was_leader = self.is_leader
+        started = time.monotonic()
+        with Session(engine) as session:
+            acquired = try_acquire_lease(session, self.name, self.owner, self.ttl_seconds)
+        self._valid_until = started + self.ttl_seconds if acquired else 0.0
+        if acquired and not was_leader:
+            print(f"[lease:{self.name}] {self.owner} is now the leader.")
+        elif was_leader and not acquired:
+            print(f"[lease:{self.name}] {self.owner} lost leadership.")
+        return acquired
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.renew_seconds)
+            try:
+                await asyncio.to_thread(self.heartbeat)
+            except Exception as e:
+                # Keep the current lease until it runs out; retry on the next beat
+                print(f"[lease:{self.name}] Heartbeat failed: {e}")
+
+    async def start(self):
+        """Makes a first acquisition attempt, then heartbeats in the background."""
+        if self._task is not None:
+            return
+        try:
+            await asyncio.to_thread(self.heartbeat)
+        except Exception as e:
+            print(f"[lease:{self.name}] Initial acquisition failed: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops heartbeating and hands the lease back so failover is immediate."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self.is_leader:
+            self._valid_until = 0.0
+            with Session(engine) as session:
+                await asyncio.to_thread(release_lease, session, self.name, self.owner)
+            print(f"[lease:{self.name}] Released by {self.owner}.")
+
+
+scheduler_lease = LeaderLease(
+    "scheduler",
+    owner=settings.WORKER_ID or f"{socket.gethostname()}:{os.getpid()}",
+    ttl_seconds=settings.SCHEDULER_LEASE_TTL_SECONDS,
+    renew_seconds=settings.SCHEDULER_LEASE_RENEW_SECONDS,
+)
@@ -0,0 +1,62 @@
+# app/services/llm_cache.py
+import asyncio
+import hashlib
+import json
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.metrics import LLM_CACHE_LOOKUPS
+from app.crud import get_cached_llm_response, store_llm_response
+from app.database import engine
+
+
+def cache_key(model: str, system_prompt: str, prompt: str, temperature: float) -> str:
+    """Hash of everything that determines a completion's input."""
+    material = json.dumps(
+        [model, system_prompt, prompt, temperature], ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _lookup(key: str) -> str | None:
+    with Session(engine) as session:
+        return get_cached_llm_response(session, key)
+
+
+def _store(key: str, model: str, response: str):
+    with Session(engine) as session:
+        store_llm_response(
+            session,
+            key,
+            model,
+            response,
+            settings.LLM_CACHE_TTL_SECONDS,
+            settings.LLM_CACHE_MAX_ENTRIES,
+        )
+
+
+async def get_cached_completion(key: str) -> str | None:
+    """
+    The cached completion for `key`, or None. Database errors count as a
+    miss: the cache must never stop a summary from being generated.
+    """
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    try:
+        response = await asyncio.to_thread(_lookup, key)
+    except Exception as e:
+        print(f"LLM cache lookup failed: {e}")
+        LLM_CACHE_LOOKUPS.inc(result="error")
+        return None
+    LLM_CACHE_LOOKUPS.inc(result="hit" if response is not None else "miss")
+    return response
+
+
+async def store_completion(key: str, model: str, response: str):
+    if not settings.LLM_CACHE_ENABLED:
+        return
+    try:
+        await asyncio.to_thread(_store, key, model, response)
+    except Exception as e:
+        print(f"LLM cache store failed: {e}")
@@ -0,0 +1,259 @@
+# app/services/spike_detector.py
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.metrics import SPIKE_ALERTS
+from app.crud import (
+    ROLLUP_DIMENSIONS,
+    count_feedback_grouped,
+    enqueue_webhook_deliveries,
+    iter_feedback_in_range,
+)
+from app.database import engine
+from app.models import UserFeedback, WebhookDelivery
+from app.services.webhook_outbox import webhook_outbox
+from app.services.webhook_sender import build_spike_alert_card, select_routes
+
+_EPOCH = datetime(1970, 1, 1)
+_SWEEP_INTERVAL_MINUTES = 60
+
+# (feedback_type, app_version, app_channel), in ROLLUP_DIMENSIONS order
+BucketKey = Tuple[str, str, str]
+
+
+def _now_naive() -> datetime:
+    return datetime.now(timezone(timedelta(hours=8))).replace(tzinfo=None)
+
+
+def _minute(value: datetime) -> int:
+    """Minutes since the epoch of a naive UTC+8 timestamp."""
+    return int((value - _EPOCH).total_seconds() // 60)
+
+
+class _Bucket:
+    """Sliding-window counts and baseline rate of one dimension combination."""
+
+    __slots__ = ("slots", "minute", "total", "baseline", "last_alert")
+
+    def __init__(self, window: int, minute: int, baseline: float = 0.0):
+        self.slots = [0] * window  # Count per minute; minute m lives at m % window
+        self.minute = minute  # Newest minute in the window
+        self.total = 0  # Sum of slots
+        self.baseline = baseline  # Decayed submissions per minute over closed minutes
+        self.last_alert: int | None = None
+
+
+class SpikeDetector:
+    """
+    Watches ingestion for sudden surges per (feedback_type, app_version,
+    app_channel). Each combination keeps per-minute counts for the last
+    SPIKE_WINDOW_MINUTES and an exponentially decayed baseline rate that
+    every closed minute is folded into, so recording a submission is O(1)
+    (amortized over the minutes it advances). When the window count reaches
+    SPIKE_MIN_COUNT and exceeds SPIKE_THRESHOLD_MULTIPLIER times what the
+    baseline predicts, an alert card is queued in the webhook outbox; the
+    same combination alerts again only after SPIKE_ALERT_COOLDOWN_MINUTES.
+
+    State is per process and rebuilt from the hourly rollups plus the raw
+    rows of the current window on startup. With several workers each one
+    only sees its share of submissions against a baseline seeded from all
+    of them, so detection is less sensitive until the baselines adapt.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[BucketKey, _Bucket] = {}
+        self._last_sweep = 0
+        self._pending: set = set()  # Alert tasks, referenced until they finish
+
+    @property
+    def window(self) -> int:
+        return max(1, settings.SPIKE_WINDOW_MINUTES)
+
+    @property
+    def decay(self) -> float:
+        """Weight kept by the baseline per minute."""
+        half_life = max(1.0, settings.SPIKE_BASELINE_HALF_LIFE_HOURS * 60)
+        return 0.5 ** (1 / half_life)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _advance(self, bucket: _Bucket, minute: int):
+        """Closes the minutes up to `minute`, folding them into the baseline."""
+        gap = minute - bucket.minute
+        if gap <= 0:
+            return
+        window, decay = self.window, self.decay
+        closed = bucket.slots[bucket.minute % window]
+        # The last active minute counts `closed`, the idle ones after it zero
+        bucket.baseline = (bucket.baseline * decay + closed * (1 - decay)) * decay ** (gap - 1)
+        for step in range(1, min(gap, window) + 1):
+            index = (bucket.minute + step) % window
+            bucket.total -= bucket.slots[index]
+            bucket.slots[index] = 0
+        bucket.minute = minute
+
+    def _add(
+        self, buckets: Dict[BucketKey, _Bucket], key: BucketKey, minute: int
+    ) -> _Bucket | None:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _Bucket(self.window, minute)
+        self._advance(bucket, minute)
+        if minute <= bucket.minute - self.window:
+            return None  # Older than the window
+        bucket.slots[minute % self.window] += 1
+        bucket.total += 1
+        return bucket
+
+    def observe(
+        self,
+        feedback_type: str,
+        app_version: str,
+        app_channel: str,
+        created_at: datetime | None = None,
+    ):
+        """Records one stored submission (call on the event loop)."""
+        if not settings.SPIKE_DETECTION_ENABLED:
+            return
+        minute = _minute(created_at or _now_naive())
+        key = (feedback_type, app_version, app_channel)
+        bucket = self._add(self._buckets, key, minute)
+        if bucket is not None:
+            self._check(key, bucket)
+        if minute - self._last_sweep >= _SWEEP_INTERVAL_MINUTES:
+            self._sweep(minute)
+
+    def _check(self, key: BucketKey, bucket: _Bucket):
+        expected = bucket.baseline * self.window
+        if bucket.total < settings.SPIKE_MIN_COUNT:
+            return
+        if bucket.total <= expected * settings.SPIKE_THRESHOLD_MULTIPLIER:
+            return
+        if (
+            bucket.last_alert is not None
+            and bucket.minute - bucket.last_alert < settings.SPIKE_ALERT_COOLDOWN_MINUTES
+        ):
+            return
+        bucket.last_alert = bucket.minute
+        feedback_type, app_version, app_channel = key
+        SPIKE_ALERTS.inc(feedback_type=feedback_type)
+        print(
+            f"[spike] {feedback_type} / {app_version} / {app_channel}: {bucket.total} "
+            f"submissions in {self.window} min (baseline {expected:.1f})."
+        )
+        card = build_spike_alert_card(
+            feedback_type, app_version, app_channel, bucket.total, self.window, expected
+        )
+        task = asyncio.get_running_loop().create_task(
+            self._enqueue_alert(card, {feedback_type: bucket.total})
+        )
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _enqueue_alert(self, card: dict, type_counts: Dict[str, int]):
+        body = json.dumps(card, ensure_ascii=False)
+        deliveries = [
+            WebhookDelivery(route=route.name, url=route.url, payload=body)
+            for route in select_routes(type_counts)
+        ]
+        if not deliveries:
+            return
+
+        def store():
+            with Session(engine) as session:
+                enqueue_webhook_deliveries(session, deliveries)
+
+        try:
+            await asyncio.to_thread(store)
+        except Exception as e:
+            print(f"[spike] Failed to queue alert: {e}")
+            return
+        webhook_outbox.notify()
+
+    def _sweep(self, minute: int):
+        """Forgets combinations that are idle and whose baseline has decayed to nothing."""
+        self._last_sweep = minute
+        idle = [
+            key
+            for key, bucket in self._buckets.items()
+            if bucket.minute <= minute - self.window
+            and bucket.baseline * self.decay ** (minute - bucket.minute) * self.window < 0.01
+        ]
+        for key in idle:
+            del self._buckets[key]
+
+    def rebuild(self, now: datetime | None = None) -> int:
+        """
+        Seeds the state from the database (blocking; call from a thread before
+        serving requests): baselines from the hourly rollups of the last
+        SPIKE_BASELINE_LOOKBACK_HOURS, the window from the raw rows it covers.
+        Returns the number of tracked combinations.
+        """
+        now = now or _now_naive()
+        window = self.window
+        now_minute = _minute(now)
+        window_start = _EPOCH + timedelta(minutes=now_minute - window + 1)
+        lookback_start = now.replace(minute=0, second=0, microsecond=0) - timedelta(
+            hours=max(1, settings.SPIKE_BASELINE_LOOKBACK_HOURS)
+        )
+        with Session(engine) as session:
+            hourly = count_feedback_grouped(
+                session,
+                lookback_start,
+                window_start - timedelta(microseconds=1),
+                [*ROLLUP_DIMENSIONS, "hour"],
+            )
+            recent = list(
+                iter_feedback_in_range(
+                    session,
+                    window_start,
+                    now,
+                    columns=[
+                        UserFeedback.created_at,
+                        UserFeedback.feedback_type,
+                        UserFeedback.app_version,
+                        UserFeedback.app_channel,
+                    ],
+                )
+            )
+
+        history: Dict[BucketKey, Dict[datetime, int]] = {}
+        for (*key, hour), count in hourly.items():
+            history.setdefault(tuple(key), {})[hour] = count
+        hours: List[datetime] = []
+        hour = lookback_start
+        while hour < window_start:
+            hours.append(hour)
+            hour += timedelta(hours=1)
+
+        decay = self.decay
+        start_minute = _minute(window_start) - 1
+        buckets: Dict[BucketKey, _Bucket] = {}
+        for key, counts in history.items():
+            # Start from the plain average so the first hours do not pull it to zero
+            minutes = max(1, _minute(window_start) - _minute(lookback_start))
+            baseline = sum(counts.values()) / minutes
+            for hour in hours:
+                span = min(60, _minute(window_start) - _minute(hour))
+                weight = decay**span
+                baseline = baseline * weight + counts.get(hour, 0) / span * (1 - weight)
+            buckets[key] = _Bucket(window, start_minute, baseline)
+
+        for row in recent:
+            key = (row.feedback_type, row.app_version, row.app_channel)
+            self._add(buckets, key, _minute(row.created_at))
+        for bucket in buckets.values():
+            self._advance(bucket, now_minute)
+
+        self._buckets = buckets
+        self._last_sweep = now_minute
+        return len(buckets)
+
+
+spike_detector = SpikeDetector()
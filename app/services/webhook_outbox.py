@@ -0,0 +1,188 @@
+# app/services/webhook_outbox.py
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, List
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.metrics import WEBHOOK_DELIVERIES, WEBHOOK_DELIVERY_SECONDS
+from app.crud import claim_due_webhook_deliveries, record_webhook_delivery_result
+from app.database import engine
+from app.models import WebhookDelivery
+from app.services.webhook_sender import (
+    WebhookDeliveryError,
+    build_summary_card,
+    post_to_webhook,
+    select_routes,
+)
+
+if TYPE_CHECKING:
+    import httpx  # Imported when the client is created to keep application startup fast
+
+# Entries claimed per poll; the worker keeps polling while batches come back full
+_CLAIM_BATCH_SIZE = 100
+
+
+def build_summary_deliveries(
+    summary: str,
+    summary_type: str,
+    totalnum: int,
+    typestring: str,
+    type_counts: Dict[str, int],
+    segment: str | None = None,
+) -> List[WebhookDelivery]:
+    """
+    Outbox entries (one per matching route) for a report, to be stored with
+    it through crud.create_feedback_summary_db.
+    """
+    body = json.dumps(
+        build_summary_card(summary, summary_type, totalnum, typestring),
+        ensure_ascii=False,
+    )
+    return [
+        WebhookDelivery(route=route.name, url=route.url, payload=body)
+        for route in select_routes(type_counts, segment)
+    ]
+
+
+def _retry_at(attempts: int) -> datetime:
+    """Full-jitter exponential backoff after the given number of attempts."""
+    cap = min(
+        settings.WEBHOOK_RETRY_MAX_DELAY_SECONDS,
+        settings.WEBHOOK_RETRY_BASE_DELAY_SECONDS * (2 ** max(0, attempts - 1)),
+    )
+    delay = random.uniform(0, cap)
+    now = datetime.now(timezone(timedelta(hours=8))).replace(tzinfo=None)
+    return now + timedelta(seconds=delay)
+
+
+class WebhookOutbox:
+    """
+    Background worker delivering pending WebhookDelivery rows with one pooled
+    httpx.AsyncClient. Every process may run it: entries are claimed in the
+    database before they are sent, so each attempt happens on one worker.
+    Delivery is at-least-once; an attempt interrupted after the POST went
+    out (e.g. on shutdown) is retried once its claim runs out.
+    """
+
+    def __init__(self):
+        self._client: "httpx.AsyncClient | None" = None
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    @property
+    def claim_seconds(self) -> float:
+        # Comfortably longer than one attempt can take
+        return max(60.0, settings.WEBHOOK_TIMEOUT_SECONDS * 4)
+
+    def init_client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+
+            concurrency = max(1, settings.WEBHOOK_DELIVERY_CONCURRENCY)
+            self._client = httpx.AsyncClient(
+                timeout=settings.WEBHOOK_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=concurrency, max_keepalive_connections=concurrency
+                ),
+            )
+        return self._client
+
+    def notify(self):
+        """Wakes the worker (call from the event loop) after new entries were stored."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _claim(self) -> List[WebhookDelivery]:
+        with Session(engine) as session:
+            return claim_due_webhook_deliveries(
+                session, _CLAIM_BATCH_SIZE, self.claim_seconds
+            )
+
+    def _record(self, delivery_id: int, error: str | None, retry_at: datetime | None):
+        with Session(engine) as session:
+            record_webhook_delivery_result(session, delivery_id, error, retry_at)
+
+    async def _deliver(self, client: "httpx.AsyncClient", delivery: WebhookDelivery):
+        started = time.perf_counter()
+        error, retryable = None, False
+        try:
+            await post_to_webhook(client, delivery.url, delivery.payload)
+        except WebhookDeliveryError as e:
+            error, retryable = str(e), e.retryable
+        WEBHOOK_DELIVERY_SECONDS.observe(time.perf_counter() - started, route=delivery.route)
+
+        retry_at = None
+        if error is None:
+            outcome = "delivered"
+            print(f"[webhook:{delivery.route}] Delivered outbox entry {delivery.id}.")
+        elif retryable and delivery.attempts < settings.WEBHOOK_MAX_ATTEMPTS:
+            outcome = "retry"
+            retry_at = _retry_at(delivery.attempts)
+            print(
+                f"[webhook:{delivery.route}] Entry {delivery.id} attempt {delivery.attempts} "
+                f"failed ({error}); retrying at {retry_at:%Y-%m-%d %H:%M:%S}."
+            )
+        else:
+            outcome = "failed"
+            print(
+                f"[webhook:{delivery.route}] Entry {delivery.id} failed after "
+                f"{delivery.attempts} attempts: {error}"
+            )
+        WEBHOOK_DELIVERIES.inc(route=delivery.route, outcome=outcome)
+        await asyncio.to_thread(self._record, delivery.id, error, retry_at)
+
+    async def deliver_due(self) -> int:
+        """Claims and delivers one batch of due entries concurrently. Returns how many were claimed."""
+        claimed = await asyncio.to_thread(self._claim)
+        if not claimed:
+            return 0
+        client = self.init_client()
+        semaphore = asyncio.Semaphore(max(1, settings.WEBHOOK_DELIVERY_CONCURRENCY))
+
+        async def deliver(delivery: WebhookDelivery):
+            async with semaphore:
+                await self._deliver(client, delivery)
+
+        await asyncio.gather(*(deliver(delivery) for delivery in claimed))
+        return len(claimed)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                while await self.deliver_due() >= _CLAIM_BATCH_SIZE:
+                    pass
+            except Exception as e:
+                print(f"[webhook] Delivery pass failed: {e}")
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=settings.WEBHOOK_POLL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Starts the delivery worker on the running event loop."""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the worker and closes the pooled connections."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._wakeup = None
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+
+webhook_outbox = WebhookOutbox()
@@ -1,30 +1,81 @@
 # app/services/webhook_sender.py
-import httpx
+import json
 from datetime import datetime, timezone, timedelta
+from typing import TYPE_CHECKING, Dict, List
+
+from pydantic import BaseModel, ValidationError
+
 from app.core.config import settings
 
+if TYPE_CHECKING:
+    import httpx  # Imported on first use to keep application startup fast
+
+
+class WebhookRoute(BaseModel):
+    name: str
+    url: str
+    # Only send reports whose window contains feedback of these types; None sends all
+    feedback_types: List[str] | None = None
+    # Only send segmented reports (SUMMARY_SEGMENT_BY) for these segment values,
+    # e.g. ["beta", "其他"]; None also sends combined reports and alerts
+    segments: List[str] | None = None
+
+    def matches(self, type_counts: Dict[str, int], segment: str | None = None) -> bool:
+        if self.segments and segment not in self.segments:
+            return False
+        if not self.feedback_types:
+            return True
+        return any(type_counts.get(ftype) for ftype in self.feedback_types)
+
 
-def send_summary_to_webhook(
-    summary: str, summary_type: str, totalnum: int, typestring: str
-) -> bool:
+def _is_configured(url: str) -> bool:
+    return bool(url) and url != "your_webhook_url_please_set_in_env"
+
+
+def load_webhook_routes() -> List[WebhookRoute]:
     """
-    Sends the summarized feedback to the configured webhook URL.
-    Returns True if successful, False otherwise.
+    Routes from WEBHOOK_ROUTES (a JSON list), or a single "default" route to
+    WEBHOOK_URL when that is empty. Invalid configuration is reported and
+    yields no routes rather than failing the summary job.
     """
-    if (
-        not settings.WEBHOOK_URL
-        or settings.WEBHOOK_URL == "your_webhook_url_please_set_in_env"
-    ):
-        print(
-            "Webhook URL is not configured. Please set WEBHOOK_URL in your .env file."
-        )
-        return False
+    if not settings.WEBHOOK_ROUTES.strip():
+        if not _is_configured(settings.WEBHOOK_URL):
+            print(
+                "Webhook URL is not configured. Please set WEBHOOK_URL in your .env file."
+            )
+            return []
+        return [WebhookRoute(name="default", url=settings.WEBHOOK_URL)]
+    try:
+        routes = [WebhookRoute(**route) for route in json.loads(settings.WEBHOOK_ROUTES)]
+    except (ValueError, TypeError, ValidationError) as e:
+        print(f"Invalid WEBHOOK_ROUTES, no webhooks will be sent: {e}")
+        return []
+    return [route for route in routes if _is_configured(route.url)]
+
+
+def select_routes(
+    type_counts: Dict[str, int], segment: str | None = None
+) -> List[WebhookRoute]:
+    """Routes that should receive a report covering `type_counts` (of `segment`, if segmented)."""
+    return [
+        route for route in load_webhook_routes() if route.matches(type_counts, segment)
+    ]
+
+
+def build_summary_card(
+    summary: str,
+    summary_type: str,
+    totalnum: int,
+    typestring: str,
+    now: datetime | None = None,
+) -> dict:
+    """The Lark interactive card message for a report."""
     utc_plus8 = timezone(timedelta(hours=8))
-    now = datetime.now(utc_plus8)
+    now = now or datetime.now(utc_plus8)
     content = f"""**<font color="green">总反馈{totalnum}条</font>**: <font color="green">{typestring}</font>\n{summary}
     """
     weekdays_zh = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
-    payload = {
+    return {
         "msg_type": "interactive",
         "card": {
             "header": {
@@ -53,17 +104,78 @@ def send_summary_to_webhook(
         },
     }
 
+
+def build_spike_alert_card(
+    feedback_type: str,
+    app_version: str,
+    app_channel: str,
+    window_count: int,
+    window_minutes: int,
+    expected: float,
+    now: datetime | None = None,
+) -> dict:
+    """The Lark interactive card message for a feedback spike alert."""
+    utc_plus8 = timezone(timedelta(hours=8))
+    now = now or datetime.now(utc_plus8)
+    ratio = f"{window_count / expected:.1f}倍" if expected > 0 else "新出现"
+    content = (
+        f"**<font color=\"red\">最近{window_minutes}分钟收到{window_count}条反馈</font>** "
+        f"(基线约{expected:.1f}条, {ratio})\n"
+        f"类型: {feedback_type}\n版本: {app_version}\n渠道: {app_channel}\n"
+        f"时间: {now.strftime('%Y-%m-%d %H:%M')}"
+    )
+    return {
+        "msg_type": "interactive",
+        "card": {
+            "header": {
+                "title": {"tag": "plain_text", "content": "用户反馈激增告警"},
+                "template": "red",
+            },
+            "elements": [
+                {
+                    "tag": "div",
+                    "text": {
+                        "content": content,
+                        "tag": "lark_md",
+                    },
+                }
+            ],
+        },
+    }
+
+
+class WebhookDeliveryError(Exception):
+    """A delivery attempt failed; `retryable` is False for errors a retry cannot fix."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+async def post_to_webhook(client: "httpx.AsyncClient", url: str, body: str):
+    """
+    POSTs a JSON body. Raises WebhookDeliveryError on transport errors, HTTP
+    errors (4xx other than 408/429 are not retryable) and on Lark's
+    HTTP 200 responses carrying a non-zero error code.
+    """
+    import httpx
+
     try:
-        with httpx.Client() as client:
-            response = client.post(settings.WEBHOOK_URL, json=payload)
-            response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-        print(f"Summary successfully sent to webhook: {settings.WEBHOOK_URL}")
-        return True
+        response = await client.post(
+            url, content=body, headers={"Content-Type": "application/json"}
+        )
     except httpx.RequestError as e:
-        print(f"Error sending summary to webhook: {e}")
-        return False
-    except httpx.HTTPStatusError as e:
-        print(
-            f"Webhook returned an error: {e.response.status_code} - {e.response.text}"
+        raise WebhookDeliveryError(f"{type(e).__name__}: {e}") from e
+    if response.status_code >= 400:
+        retryable = response.status_code in (408, 429) or response.status_code >= 500
+        raise WebhookDeliveryError(
+            f"HTTP {response.status_code}: {response.text[:200]}", retryable
+        )
+    try:
+        result = response.json()
+    except ValueError:
+        return
+    if isinstance(result, dict) and result.get("code") not in (None, 0):
+        raise WebhookDeliveryError(
+            f"Webhook error code {result.get('code')}: {result.get('msg')}"
         )
-        return False
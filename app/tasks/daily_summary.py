@@ -1,79 +1,428 @@
 # app/tasks/daily_summary.py
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-from apscheduler.triggers.interval import IntervalTrigger
+import asyncio
+import time
 from datetime import datetime, timedelta, timezone
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
-from app.database import get_session  # To get a new session for the task
-from app.services.feedback_analyzer import summarize_feedback_with_openai
-from app.services.webhook_sender import send_summary_to_webhook
-from app.crud import get_feedback_since
+from app.core.metrics import SUMMARY_RUNS, SUMMARY_STAGE_SECONDS
+from app.database import async_session  # To get a new session for the task
+from app.services.feedback_analyzer import (
+    collect_feedback_entries,
+    merge_summaries,
+    summarize_feedback_hierarchical,
+    track_llm_usage,
+)
+from app.services.feedback_dedup import FeedbackCluster
+from app.services.leader_election import scheduler_lease
+from app.services.webhook_outbox import build_summary_deliveries, webhook_outbox
+from app.crud import (
+    claim_job_execution_async,
+    count_feedback_by_type_in_range_async,
+    count_feedback_grouped_async,
+    create_feedback_summary_db_async,
+    finish_job_execution_async,
+    get_feedback_summaries_in_range_async,
+    get_stale_job_executions_async,
+    iter_feedback_in_range_async,
+)
+from app.models import FeedbackSummary, UserFeedback
+
+
+# Summary jobs currently running on the event loop, so shutdown can cancel them
+_running_jobs: set = set()
+
+
+def _track_current_job():
+    task = asyncio.current_task()
+    if task is not None:
+        _running_jobs.add(task)
+        task.add_done_callback(_running_jobs.discard)
+
+
+async def cancel_running_jobs():
+    """Cancels in-flight summary jobs (and their LLM calls) and waits for them."""
+    tasks = [task for task in _running_jobs if not task.done()]
+    if not tasks:
+        return
+    print(f"Cancelling {len(tasks)} running summary job(s)...")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+DAILY_JOB_NAME = "用户反馈日报"
+WEEKLY_JOB_NAME = "用户反馈周报"
+SEGMENT_DIMENSIONS = ("app_channel", "app_version")
+OTHER_SEGMENT = "其他"
+
+
+def _to_local_naive(datetime_utc: datetime) -> datetime:
+    """Converts an aware datetime to the naive UTC+8 form stored in the database."""
+    return datetime_utc.astimezone(utc_plus_8).replace(tzinfo=None)
+
+
+def _iter_feedback(
+    db: AsyncSession, start_naive: datetime, end_naive: datetime, extra_columns=()
+):
+    """
+    Streams [start_naive, end_naive] in keyset pages, selecting only the
+    columns the prompt needs (never the debug payload) plus `extra_columns`.
+    Consumed by collect_feedback_entries, which keeps only the collapsed
+    clusters, so memory follows the number of distinct feedback, not rows.
+    """
+    return iter_feedback_in_range_async(
+        db,
+        start_naive,
+        end_naive,
+        columns=[
+            UserFeedback.feedback_type,
+            UserFeedback.image_url,
+            UserFeedback.feedback,
+            *extra_columns,
+        ],
+        batch_size=settings.SUMMARY_FETCH_BATCH_SIZE,
+    )
+
+
+def _format_type_distribution(type_counts: dict) -> str:
+    merged_counts = {}
+    for ftype, count in type_counts.items():
+        if not ftype:  # Handles None or empty string
+            ftype = "未知类型"
+        merged_counts[ftype] = merged_counts.get(ftype, 0) + count
+    type_counts = merged_counts
+    total_items = sum(type_counts.values())
+
+    distribution_parts = []
+    # Sort by count (descending), then by type name (ascending) for consistent output
+    sorted_type_counts = sorted(type_counts.items(), key=lambda x: (-x[1], x[0]))
+
+    for ftype, count in sorted_type_counts:
+        percentage = (count / total_items) * 100
+        distribution_parts.append(f"{ftype}: {count}条 ({percentage:.1f}%)")
+
+    if distribution_parts:
+        return " | ".join(distribution_parts)
+    # This fallback is unlikely if there is any feedback in the window
+    return "类型分布: 无数据"
+
+
+async def _save_and_send_summary(
+    db: AsyncSession,
+    job_name: str,
+    start_naive: datetime,
+    end_naive: datetime,
+    summary: str | None,
+    total_items: int,
+    type_counts: dict,
+    segment: str | None = None,
+):
+    label = f"{job_name} · {segment}" if segment is not None else job_name
+    if not summary:
+        print(f"[{label}] Failed to generate summary or summary was empty.")
+        SUMMARY_RUNS.inc(job=job_name, outcome="failure")
+        return
+
+    print(f"[{label}] Summary generated: {summary[:200]}...")
+    typestring = _format_type_distribution(type_counts)
+    # The report and its webhook outbox entries are stored together, so the
+    # (paid-for) summary is kept and delivered even if a webhook is down
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="enqueue"):
+        deliveries = build_summary_deliveries(
+            summary, label, total_items, typestring, type_counts, segment
+        )
+        await create_feedback_summary_db_async(
+            db,
+            FeedbackSummary(
+                job_name=job_name,
+                segment=segment,
+                window_start=start_naive,
+                window_end=end_naive,
+                type_distribution=typestring,
+                summary=summary,
+                feedback_count=total_items,
+                model=settings.OPENAI_MODEL_NAME,
+            ),
+            deliveries,
+        )
+    webhook_outbox.notify()
+    print(f"[{label}] Queued {len(deliveries)} webhook deliveries.")
+    SUMMARY_RUNS.inc(job=job_name, outcome="success")
 
 
 async def _process_and_send_summary(
-    db: Session, since_datetime_utc: datetime, job_name: str
+    db: AsyncSession, since_datetime_utc: datetime, job_name: str
 ):
     """Helper function to process and send feedback summary."""
+    if settings.SUMMARY_SEGMENT_BY:
+        if settings.SUMMARY_SEGMENT_BY in SEGMENT_DIMENSIONS:
+            await _process_and_send_segmented_summary(db, since_datetime_utc, job_name)
+            return
+        print(
+            f"[{job_name}] Unsupported SUMMARY_SEGMENT_BY {settings.SUMMARY_SEGMENT_BY!r} "
+            f"(use {' or '.join(SEGMENT_DIMENSIONS)}); sending a combined report."
+        )
+    start_naive = _to_local_naive(since_datetime_utc)
+    end_naive = _to_local_naive(datetime.now(timezone.utc))
     print(
         f"[{job_name}] Fetching feedback since {since_datetime_utc.astimezone(utc_plus_8).strftime('%Y-%m-%d %H:%M:%S %Z')}"
     )
-    feedback_to_summarize = get_feedback_since(
-        db, since_datetime_utc=since_datetime_utc
-    )
+    # Type distribution comes from the hourly rollups instead of re-counting
+    # rows; the total does too, so the card's numbers always agree
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="aggregate"):
+        type_counts = await count_feedback_by_type_in_range_async(
+            db, start_naive, end_naive
+        )
+    total_items = sum(type_counts.values())
 
-    if not feedback_to_summarize:
+    if not total_items:
         print(
             f"[{job_name}] No new feedback to summarize for the period since {since_datetime_utc.astimezone(utc_plus_8).strftime('%Y-%m-%d %H:%M:%S %Z')}."
         )
+        SUMMARY_RUNS.inc(job=job_name, outcome="empty")
         return
 
+    print(f"[{job_name}] Found {total_items} feedback entries to summarize.")
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="fetch"):
+        entries = await collect_feedback_entries(
+            _iter_feedback(db, start_naive, end_naive)
+        )
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="llm"):
+        summary = await summarize_feedback_hierarchical(entries)
+    await _save_and_send_summary(
+        db,
+        job_name,
+        start_naive,
+        end_naive,
+        summary,
+        total_items,
+        type_counts,
+    )
+
+
+def _fold_small_segments(counts_by_value: dict, min_count: int) -> dict:
+    """
+    {segment: values}, largest first. Values with fewer than `min_count`
+    entries share the OTHER_SEGMENT report (a lone small value keeps its own
+    name).
+    """
+    segments = {}
+    small = []
+    for value, count in sorted(counts_by_value.items(), key=lambda item: -item[1]):
+        if count >= min_count:
+            segments[value] = [value]
+        else:
+            small.append(value)
+    if len(small) == 1:
+        segments[small[0]] = small
+    elif small:
+        segments[OTHER_SEGMENT] = small
+    return segments
+
+
+async def _process_and_send_segmented_summary(
+    db: AsyncSession, since_datetime_utc: datetime, job_name: str
+):
+    """
+    One report per SUMMARY_SEGMENT_BY value, each routed to the webhooks whose
+    `segments` include it. Segments are summarized concurrently (at most
+    SUMMARY_SEGMENT_CONCURRENCY at a time) and each is stored as soon as it is
+    done, so a slow segment does not hold back the others.
+    """
+    dimension = settings.SUMMARY_SEGMENT_BY
+    column = getattr(UserFeedback, dimension)
+    start_naive = _to_local_naive(since_datetime_utc)
+    end_naive = _to_local_naive(datetime.now(timezone.utc))
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="aggregate"):
+        grouped = await count_feedback_grouped_async(
+            db, start_naive, end_naive, [dimension, "feedback_type"]
+        )
+    counts_by_value: dict = {}
+    for (value, _), count in grouped.items():
+        counts_by_value[value] = counts_by_value.get(value, 0) + count
+    if not counts_by_value:
+        print(f"[{job_name}] No new feedback to summarize.")
+        SUMMARY_RUNS.inc(job=job_name, outcome="empty")
+        return
+
+    segments = _fold_small_segments(
+        counts_by_value, max(1, settings.SUMMARY_SEGMENT_MIN_COUNT)
+    )
+    segment_of = {value: segment for segment, values in segments.items() for value in values}
     print(
-        f"[{job_name}] Found {len(feedback_to_summarize)} feedback entries to summarize."
+        f"[{job_name}] {sum(counts_by_value.values())} feedback entries in "
+        f"{len(counts_by_value)} {dimension} values -> {len(segments)} segment report(s)."
     )
-    summary = summarize_feedback_with_openai(feedback_to_summarize)
-    type_counts = {}
-    for item in feedback_to_summarize:
-        ftype = getattr(item, "feedback_type", "未知类型")
-        if not ftype:  # Handles None or empty string
-            ftype = "未知类型"
-        type_counts[ftype] = type_counts.get(ftype, 0) + 1
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="fetch"):
+        # One pass over the window, each row collapsed into its segment's clusters
+        entries_by_segment = await collect_feedback_entries(
+            _iter_feedback(db, start_naive, end_naive, [column]),
+            group_by=lambda row: segment_of.get(getattr(row, dimension), OTHER_SEGMENT),
+        )
+    # Largest segments first; rows of values the rollups did not count come last
+    segment_entries = {
+        segment: (segments.get(segment, []), entries_by_segment[segment])
+        for segment in [*segments, *entries_by_segment]
+        if segment in entries_by_segment
+    }
 
-    total_items = len(feedback_to_summarize)
+    semaphore = asyncio.Semaphore(max(1, settings.SUMMARY_SEGMENT_CONCURRENCY))
+    save_lock = asyncio.Lock()  # The session cannot run statements concurrently
 
-    distribution_parts = []
-    # Sort by count (descending), then by type name (ascending) for consistent output
-    sorted_type_counts = sorted(type_counts.items(), key=lambda x: (-x[1], x[0]))
+    async def summarize_segment(segment: str, values: list, entries: list):
+        type_counts: dict = {}
+        for (value, feedback_type), count in grouped.items():
+            if value in values:
+                type_counts[feedback_type] = type_counts.get(feedback_type, 0) + count
+        async with semaphore:
+            started = time.perf_counter()
+            with track_llm_usage() as usage:
+                summary = await summarize_feedback_hierarchical(entries)
+            print(
+                f"[{job_name} · {segment}] {sum(type_counts.values())} entries summarized in "
+                f"{time.perf_counter() - started:.2f}s: {usage['requests']} LLM requests "
+                f"({usage['cached']} cached), {usage['prompt_tokens']} prompt + "
+                f"{usage['completion_tokens']} completion tokens."
+            )
+        async with save_lock:
+            await _save_and_send_summary(
+                db,
+                job_name,
+                start_naive,
+                end_naive,
+                summary,
+                sum(type_counts.values()),
+                type_counts,
+                segment,
+            )
 
-    for ftype, count in sorted_type_counts:
-        percentage = (count / total_items) * 100
-        distribution_parts.append(f"{ftype}: {count}条 ({percentage:.1f}%)")
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="llm"):
+        # A failing segment must not cancel or hide the others' reports
+        results = await asyncio.gather(
+            *(
+                summarize_segment(segment, values, entries)
+                for segment, (values, entries) in segment_entries.items()
+            ),
+            return_exceptions=True,
+        )
+    for segment, result in zip(segment_entries, results):
+        if isinstance(result, Exception):
+            SUMMARY_RUNS.inc(job=job_name, outcome="failure")
+            print(f"[{job_name} · {segment}] Error: {result!r}")
 
-    if distribution_parts:
-        typestring = " | ".join(distribution_parts)
-    else:
-        # This fallback is unlikely if feedback_to_summarize is not empty
-        typestring = "类型分布: 无数据"
 
-    if summary:
-        print(f"[{job_name}] Summary generated: {summary[:200]}...")
-        send_summary_to_webhook(
-            summary, job_name, len(feedback_to_summarize), typestring=typestring
+# Daily windows end at the job's wall-clock start, so consecutive ones can
+# overlap by scheduler jitter; overlaps up to this are not a reason to drop one
+_WINDOW_OVERLAP_TOLERANCE = timedelta(minutes=5)
+
+
+def _chain_daily_windows(
+    stored: list, start_naive: datetime, end_naive: datetime
+) -> tuple:
+    """
+    (used, uncovered): a chain of non-overlapping daily summaries out of
+    `stored` (ordered by window start) and the non-empty ranges of
+    [start_naive, end_naive] they leave uncovered. A daily overlapping the
+    chain by at most _WINDOW_OVERLAP_TOLERANCE is clipped to where the chain
+    ends; one overlapping it by more (interval schedules) is skipped.
+    """
+    used = []
+    uncovered = []
+    covered_until = start_naive
+    for daily in stored:
+        if daily.window_end <= covered_until:
+            continue
+        if covered_until - daily.window_start > _WINDOW_OVERLAP_TOLERANCE:
+            continue
+        if daily.window_start > covered_until:
+            uncovered.append((covered_until, daily.window_start))
+        used.append(daily)
+        covered_until = daily.window_end
+    if covered_until < end_naive:
+        uncovered.append((covered_until, end_naive))
+    return used, uncovered
+
+
+async def _process_and_send_incremental_summary(
+    db: AsyncSession, since_datetime_utc: datetime, job_name: str
+):
+    """
+    Builds a report for a long window (the weekly report) from the stored daily
+    summaries that fall inside it, plus a summary of only the raw feedback those
+    daily reports do not cover (gaps and the not-yet-summarized tail).
+    Falls back to _process_and_send_summary when there are no daily summaries.
+    """
+    start_naive = _to_local_naive(since_datetime_utc)
+    end_naive = _to_local_naive(datetime.now(timezone.utc))
+
+    stored = await get_feedback_summaries_in_range_async(
+        db, DAILY_JOB_NAME, start_naive - _WINDOW_OVERLAP_TOLERANCE, end_naive
+    )
+    used, uncovered = _chain_daily_windows(stored, start_naive, end_naive)
+
+    if not used:
+        print(f"[{job_name}] No stored daily summaries in window; summarizing raw feedback.")
+        await _process_and_send_summary(db, since_datetime_utc, job_name)
+        return
+
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="aggregate"):
+        type_counts = await count_feedback_by_type_in_range_async(
+            db, start_naive, end_naive
         )
-    else:
-        print(f"[{job_name}] Failed to generate summary or summary was empty.")
+    total_items = sum(type_counts.values())
+    if not total_items:
+        print(f"[{job_name}] No feedback in window; nothing to summarize.")
+        SUMMARY_RUNS.inc(job=job_name, outcome="empty")
+        return
+
+    async def uncovered_rows():
+        for range_start, range_end in uncovered:
+            async for row in _iter_feedback(db, range_start, range_end):
+                yield row
+
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="fetch"):
+        raw_entries = await collect_feedback_entries(uncovered_rows())
+    raw_count = sum(
+        entry.count if isinstance(entry, FeedbackCluster) else 1 for entry in raw_entries
+    )
+    print(
+        f"[{job_name}] Reusing {len(used)} daily summaries; "
+        f"{raw_count} of {total_items} feedback entries are not yet summarized."
+    )
+
+    partials = [daily.summary for daily in used]
+    with SUMMARY_STAGE_SECONDS.time(job=job_name, stage="llm"):
+        if raw_entries:
+            tail_summary = await summarize_feedback_hierarchical(raw_entries)
+            if tail_summary is None:
+                print(f"[{job_name}] Failed to summarize uncovered feedback.")
+                SUMMARY_RUNS.inc(job=job_name, outcome="failure")
+                return
+            partials.append(tail_summary)
+
+        summary = await merge_summaries(partials)
+    await _save_and_send_summary(
+        db,
+        job_name,
+        start_naive,
+        end_naive,
+        summary,
+        total_items,
+        type_counts,
+    )
 
 
 async def run_feedback_summary_job():
     """
     Job to fetch recent feedback based on configured interval/schedule, summarize it, and send it to a webhook.
     """
-    job_name = "用户反馈日报"
+    job_name = DAILY_JOB_NAME
+    _track_current_job()
     print(
         f"Starting {job_name} job at {datetime.now(utc_plus_8).strftime('%Y-%m-%d %H:%M:%S %Z')}"
     )
-    db: Session = next(get_session())  # Get a new database session
+    db = async_session()  # Get a new database session
     try:
         hours_to_look_back = (
             settings.SUMMARY_INTERVAL_HOURS
@@ -85,52 +434,180 @@ async def run_feedback_summary_job():
         )
         await _process_and_send_summary(db, since_datetime_utc, job_name)
     except Exception as e:
+        SUMMARY_RUNS.inc(job=job_name, outcome="failure")
         print(f"Error in {job_name}: {e}")
         import traceback
 
         traceback.print_exc()
     finally:
         print(f"Finished {job_name} job.")
-        db.close()
+        await db.close()
 
 
 async def run_weekly_feedback_summary_job():
     """
     Job to fetch feedback from the last 7 days, summarize it, and send it to a webhook.
     """
-    job_name = "用户反馈周报"
+    job_name = WEEKLY_JOB_NAME
+    _track_current_job()
     print(
         f"Starting {job_name} job at {datetime.now(utc_plus_8).strftime('%Y-%m-%d %H:%M:%S %Z')}"
     )
-    db: Session = next(get_session())
+    db = async_session()
     try:
         since_datetime_utc = datetime.now(timezone.utc) - timedelta(days=7)
-        await _process_and_send_summary(db, since_datetime_utc, job_name)
+        if settings.WEEKLY_SUMMARY_MODE == "incremental":
+            await _process_and_send_incremental_summary(
+                db, since_datetime_utc, job_name
+            )
+        else:
+            await _process_and_send_summary(db, since_datetime_utc, job_name)
     except Exception as e:
+        SUMMARY_RUNS.inc(job=job_name, outcome="failure")
         print(f"Error in {job_name}: {e}")
         import traceback
 
         traceback.print_exc()
     finally:
         print(f"Finished {job_name} job.")
-        db.close()
+        await db.close()
+
+
+# Far enough back to find the previous fire time of every job (the weekly one)
+_OCCURRENCE_LOOKBACK = timedelta(days=8)
+
+
+def _scheduled_occurrence(job_id: str, now: datetime) -> datetime:
+    """
+    The latest scheduled fire time of `job_id` at or before `now`, as naive
+    UTC+8 truncated to the minute. Workers firing late (misfire grace) or
+    taking over as leader therefore agree on the occurrence. Jobs not in the
+    scheduler (the run-on-startup ones) use `now`.
+    """
+    job = _scheduler.get_job(job_id) if _scheduler is not None else None
+    fire_time = None
+    if job is not None:
+        candidate = job.trigger.get_next_fire_time(None, now - _OCCURRENCE_LOOKBACK)
+        while candidate is not None and candidate <= now:
+            fire_time = candidate
+            candidate = job.trigger.get_next_fire_time(
+                candidate, candidate + timedelta(seconds=1)
+            )
+    occurrence = (fire_time or now).astimezone(utc_plus_8)
+    return occurrence.replace(second=0, microsecond=0, tzinfo=None)
+
+
+# (job_id, occurrence) pairs this process is running, so their claims are
+# never mistaken for ones left behind by a dead leader
+_running_occurrences: set = set()
+
+
+async def run_scheduled_job(
+    job_id: str, job_func, occurrence: datetime | None = None
+):
+    """
+    Runs `job_func` for the current occurrence of `job_id` at most once across
+    all workers: only the lease holder runs it, and the occurrence (scheduled
+    fire time, truncated to the minute) is claimed in the database first, so
+    a worker taking over mid-occurrence does not repeat it. A claim still
+    "running" after SCHEDULER_LEASE_TTL_SECONDS belongs to a leader that died
+    mid-job and is taken over (see resume_stale_job_executions).
+    """
+    if not settings.SCHEDULER_LEADER_ELECTION:
+        await job_func()
+        return
+    if not scheduler_lease.is_leader:
+        print(f"[{job_id}] Skipped: this worker is not the scheduler leader.")
+        return
+
+    occurrence = occurrence or _scheduled_occurrence(job_id, datetime.now(utc_plus_8))
+    if (job_id, occurrence) in _running_occurrences:
+        print(f"[{job_id}] Occurrence {occurrence} is already running; skipping.")
+        return
+    async with async_session() as db:
+        execution = await claim_job_execution_async(
+            db,
+            job_id,
+            occurrence,
+            scheduler_lease.owner,
+            settings.SCHEDULER_LEASE_TTL_SECONDS,
+        )
+        if execution is None:
+            print(f"[{job_id}] Occurrence {occurrence} already executed; skipping.")
+            return
+        _running_occurrences.add((job_id, occurrence))
+        status = "failed"
+        try:
+            await job_func()
+            status = "succeeded"
+        finally:
+            _running_occurrences.discard((job_id, occurrence))
+            await finish_job_execution_async(db, execution, status)
+
+
+async def resume_stale_job_executions():
+    """
+    On the leader, re-runs the current occurrence of scheduled jobs whose claim
+    was left "running" by a leader that died mid-job. Older occurrences are
+    not repeated: the next run covers their feedback anyway.
+    """
+    if not scheduler_lease.is_leader:
+        return
+    async with async_session() as db:
+        stale = await get_stale_job_executions_async(
+            db, settings.SCHEDULER_LEASE_TTL_SECONDS
+        )
+    now = datetime.now(utc_plus_8)
+    for execution in stale:
+        job = _scheduler.get_job(execution.job_id) if _scheduler is not None else None
+        if job is None or execution.occurrence != _scheduled_occurrence(job.id, now):
+            continue
+        print(
+            f"[{job.id}] Resuming occurrence {execution.occurrence} left running "
+            f"by {execution.owner}."
+        )
+        await run_scheduled_job(job.id, job.args[1], execution.occurrence)
 
 
 # Define UTC+8 timezone object
 utc_plus_8 = timezone(timedelta(hours=8))
 
-scheduler = AsyncIOScheduler(timezone=utc_plus_8)  # Set scheduler timezone to UTC+8
+_scheduler = None
+
+
+def get_scheduler():
+    """The shared AsyncIOScheduler (UTC+8); apscheduler is imported on first use."""
+    global _scheduler
+    if _scheduler is None:
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+        _scheduler = AsyncIOScheduler(timezone=utc_plus_8)  # Set scheduler timezone to UTC+8
+    return _scheduler
+
+
+def shutdown_scheduler():
+    if _scheduler is not None and _scheduler.running:
+        print("Application shutdown: Shutting down scheduler...")
+        _scheduler.shutdown(wait=False)
 
 
 def schedule_feedback_summary():
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    scheduler = get_scheduler()
     if settings.SUMMARY_INTERVAL_HOURS > 0:
         print(
             f"Scheduling feedback summary to run every {settings.SUMMARY_INTERVAL_HOURS} hours (Timezone: UTC+8)."
         )
         scheduler.add_job(
-            run_feedback_summary_job,
+            run_scheduled_job,
+            args=["feedback_summary_interval", run_feedback_summary_job],
+            # A fixed start keeps the fire times identical on every worker
             trigger=IntervalTrigger(
-                hours=settings.SUMMARY_INTERVAL_HOURS, timezone=utc_plus_8
+                hours=settings.SUMMARY_INTERVAL_HOURS,
+                start_date=datetime(2024, 1, 1, tzinfo=utc_plus_8),
+                timezone=utc_plus_8,
             ),
             id="feedback_summary_interval",
             name="Feedback Summary (Interval)",
@@ -151,7 +628,8 @@ def schedule_feedback_summary():
                         f"Scheduling feedback summary to run daily at {hour:02}:00 (Timezone: UTC+8)."
                     )
                     scheduler.add_job(
-                        run_feedback_summary_job,
+                        run_scheduled_job,
+                        args=[f"feedback_summary_daily_{hour:02}", run_feedback_summary_job],
                         trigger=CronTrigger(hour=hour, minute=0, timezone=utc_plus_8),
                         id=f"feedback_summary_daily_{hour:02}",
                         name=f"Feedback Summary (Daily at {hour:02}:00 UTC+8)",
@@ -174,13 +652,23 @@ def schedule_feedback_summary():
         "Scheduling weekly feedback summary to run on Sunday at 19:00 (Timezone: UTC+8)."
     )
     scheduler.add_job(
-        run_weekly_feedback_summary_job,
+        run_scheduled_job,
+        args=["feedback_summary_weekly", run_weekly_feedback_summary_job],
         trigger=CronTrigger(day_of_week="sun", hour=19, minute=0, timezone=utc_plus_8),
         id="feedback_summary_weekly",
         name="Feedback Summary (Weekly Sun 19:00 UTC+8)",
         replace_existing=True,
     )
 
+    if settings.SCHEDULER_LEADER_ELECTION:
+        scheduler.add_job(
+            resume_stale_job_executions,
+            trigger=IntervalTrigger(seconds=max(1, settings.SCHEDULER_LEASE_TTL_SECONDS)),
+            id="resume_stale_job_executions",
+            name="Resume Job Occurrences Left Running by a Dead Leader",
+            replace_existing=True,
+        )
+
     if scheduler.get_jobs():
         try:
             if not scheduler.running:
@@ -0,0 +1,62 @@
+# app/tasks/retention.py
+import asyncio
+from datetime import datetime, timedelta
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.database import engine
+from app.crud import archive_feedback_batch
+from app.tasks.daily_summary import get_scheduler, run_scheduled_job, utc_plus_8
+
+
+def _archive_one_batch(cutoff_naive: datetime) -> int:
+    with Session(engine) as db:
+        return archive_feedback_batch(
+            db, cutoff_naive, settings.FEEDBACK_ARCHIVE_BATCH_SIZE
+        )
+
+
+async def run_feedback_retention_job():
+    """
+    Moves feedback older than FEEDBACK_RETENTION_DAYS to the archive, one
+    batch per transaction. Each batch runs in a worker thread and the loop
+    yields in between, so ingestion keeps getting the write lock.
+    """
+    cutoff_naive = datetime.now(utc_plus_8).replace(tzinfo=None) - timedelta(
+        days=settings.FEEDBACK_RETENTION_DAYS
+    )
+    print(f"Starting feedback retention job (archiving rows before {cutoff_naive})...")
+    total = 0
+    try:
+        while True:
+            moved = await asyncio.to_thread(_archive_one_batch, cutoff_naive)
+            total += moved
+            if moved < settings.FEEDBACK_ARCHIVE_BATCH_SIZE:
+                break
+            await asyncio.sleep(0)
+    except Exception as e:
+        print(f"Error in feedback retention job after archiving {total} rows: {e}")
+        raise
+    print(f"Finished feedback retention job: archived {total} rows.")
+
+
+def schedule_feedback_retention():
+    """Adds the daily retention job to the shared scheduler (call before it is started)."""
+    if settings.FEEDBACK_RETENTION_DAYS <= 0:
+        print("FEEDBACK_RETENTION_DAYS is 0; feedback retention is disabled.")
+        return
+    from apscheduler.triggers.cron import CronTrigger
+
+    hour = settings.FEEDBACK_RETENTION_HOUR % 24
+    print(
+        f"Scheduling feedback retention ({settings.FEEDBACK_RETENTION_DAYS} days) "
+        f"to run daily at {hour:02}:30 (Timezone: UTC+8)."
+    )
+    get_scheduler().add_job(
+        run_scheduled_job,
+        args=["feedback_retention", run_feedback_retention_job],
+        trigger=CronTrigger(hour=hour, minute=30, timezone=utc_plus_8),
+        id="feedback_retention",
+        name=f"Feedback Retention (Daily at {hour:02}:30 UTC+8)",
+        replace_existing=True,
+    )
@@ -0,0 +1,10 @@
+# benchmarks/__init__.py
+"""
+Reproducible benchmarks for ingestion, summarization and cold start.
+
+    python -m benchmarks.bench_ingest --requests 5000 --concurrency 64
+    python -m benchmarks.bench_summary --sizes 100,1000,10000,100000,500000
+    python -m benchmarks.bench_startup --runs 5
+
+All print a JSON document (or write it with --output) so runs can be diffed.
+"""
@@ -0,0 +1,150 @@
+# benchmarks/bench_ingest.py
+"""
+Drives POST /feedback/ with a fixed number of concurrent clients and reports
+throughput and latency percentiles.
+
+By default the app runs in-process (httpx ASGITransport) against a temporary
+SQLite database; pass --url to benchmark an already running server instead.
+
+    python -m benchmarks.bench_ingest --requests 5000 --concurrency 64 --mode group_commit
+    python -m benchmarks.bench_ingest --url http://127.0.0.1:8000 --payload-bytes 2048
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+
+import httpx
+
+from .common import (
+    emit_json,
+    environment_info,
+    make_feedback_payload,
+    percentiles,
+    use_temp_database,
+)
+
+
+async def _drive(client: httpx.AsyncClient, args) -> dict:
+    rng = random.Random(args.seed)
+    warmup = [
+        make_feedback_payload(rng, args.payload_bytes) for _ in range(args.warmup)
+    ]
+    payloads = [
+        make_feedback_payload(rng, args.payload_bytes) for _ in range(args.requests)
+    ]
+    # Every measured request is a new submission: a repeat would be answered by
+    # the duplicate suppression instead of being written
+    for index, payload in enumerate(payloads):
+        payload["user_uid"] = f"{payload['user_uid']}-{index}"
+    # Warm up connections / lazy initialisation outside the measured window
+    for payload in warmup:
+        await client.post("/feedback/", json=payload)
+
+    latencies = []
+    statuses: dict = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(payloads):
+            payload = payloads[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await client.post("/feedback/", json=payload)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            **percentiles(latencies),
+            "max": round(max(latencies) * 1000, 3) if latencies else 0.0,
+        },
+        "status_counts": statuses,
+    }
+
+
+async def _run_in_process(args) -> dict:
+    # Settings are read at import time, so configure the environment first.
+    database_path = use_temp_database("ingest")
+    os.environ["FEEDBACK_INGEST_MODE"] = args.mode
+    from app.database import run_migrations
+    from app.main import app
+    from app.services.feedback_writer import feedback_writer
+
+    # ASGITransport does not run startup events; start only what ingestion needs.
+    run_migrations()
+    if args.mode == "group_commit":
+        feedback_writer.start()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=args.timeout
+        ) as client:
+            result = await _drive(client, args)
+    finally:
+        if args.mode == "group_commit":
+            await asyncio.to_thread(feedback_writer.stop)
+    result["database_path"] = database_path
+    return result
+
+
+async def _run_against_url(args) -> dict:
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, limits=limits
+    ) as client:
+        return await _drive(client, args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--payload-bytes", type=int, default=0, help="Pad feedback text to about this many bytes")
+    parser.add_argument("--mode", choices=["sync", "group_commit"], default="sync", help="FEEDBACK_INGEST_MODE for in-process runs")
+    parser.add_argument("--url", help="Benchmark a running server instead of an in-process app")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    runner = _run_against_url if args.url else _run_in_process
+    # The app logs with print(); keep stdout for the JSON document.
+    with redirect_stdout(sys.stderr):
+        result = asyncio.run(runner(args))
+    emit_json(
+        {
+            "benchmark": "ingest",
+            "environment": environment_info(),
+            "parameters": {
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "payload_bytes": args.payload_bytes,
+                "mode": None if args.url else args.mode,
+                "target": args.url or "in-process",
+                "seed": args.seed,
+            },
+            "result": result,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
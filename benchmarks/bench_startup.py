@@ -0,0 +1,88 @@
+# benchmarks/bench_startup.py
+"""
+Measures cold start: each run spawns a fresh interpreter that imports
+app.main and runs the startup events against a temporary SQLite database,
+then reports the per-phase startup report. The first run applies the schema
+migrations; later runs against the same database show the skipped path.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from .common import emit_json, environment_info, use_temp_database
+
+_CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+from app.main import app
+from app.core.startup import startup_report
+
+async def main():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter() - started
+    return ready
+
+ready = asyncio.run(main())
+sys.stdout.write("\\n" + json.dumps({"phases": startup_report.as_dict(), "ready_seconds": round(ready, 4)}))
+"""
+
+
+def _run_once(env: dict) -> dict:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    database_path = use_temp_database("startup")
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])),
+        "SCHEDULER_LEADER_ELECTION": "false",
+    }
+    runs = []
+    for index in range(max(1, args.runs)):
+        runs.append(_run_once(env))
+        print(f"[bench] run {index + 1}: {runs[-1]['process_seconds']:.3f}s", file=sys.stderr)
+
+    warm = runs[1:] or runs
+    emit_json(
+        {
+            "benchmark": "startup",
+            "environment": environment_info(),
+            "parameters": {"runs": args.runs, "database_path": database_path},
+            "result": {
+                "first_run": runs[0],
+                "median_process_seconds": statistics.median(r["process_seconds"] for r in warm),
+                "median_phase_seconds": {
+                    phase: round(statistics.median(r["phases"].get(phase, 0) for r in warm), 4)
+                    for phase in warm[0]["phases"]
+                },
+                "runs": runs,
+            },
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
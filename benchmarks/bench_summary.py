@@ -0,0 +1,203 @@
+# benchmarks/bench_summary.py
+"""
+Runs the daily summary pipeline (_process_and_send_summary) end to end against
+a temporary SQLite database, a fake OpenAI-compatible server and a fake Lark
+webhook (plus a fake image host for the link checks), for growing dataset
+sizes.
+
+Sizes are cumulative: rows are added to the same 24h window until each size is
+reached, so a 500k run also produces the smaller data points on the way.
+
+    python -m benchmarks.bench_summary --sizes 100,1000,10000,100000,500000 \
+        --llm-latency-ms 300 --completion-tokens 600
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+from .common import (
+    emit_json,
+    environment_info,
+    make_feedback_payload,
+    parse_sizes,
+    use_temp_database,
+)
+from .fake_servers import FakeImageHost, FakeLarkWebhook, FakeOpenAIServer
+
+_STAGES = ("fetch", "aggregate", "llm", "enqueue")
+_SEED_CHUNK_SIZE = 5000
+_WINDOW_HOURS = 20  # Seeded rows fall inside the 24h look-back of the daily job
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _seed(engine, rng: random.Random, count: int, image_base_url: str):
+    """Inserts `count` rows spread over the last _WINDOW_HOURS (UTC+8 naive)."""
+    from sqlalchemy import insert
+
+    from app.models import UserFeedback
+
+    now_local = datetime.now(timezone(timedelta(hours=8))).replace(tzinfo=None)
+    window_seconds = _WINDOW_HOURS * 3600
+    remaining = count
+    while remaining > 0:
+        size = min(_SEED_CHUNK_SIZE, remaining)
+        rows = []
+        for _ in range(size):
+            row = make_feedback_payload(rng, image_base_url=image_base_url)
+            row.pop("debug")  # Stored in the feedbackdebug side table, not userfeedback
+            row["created_at"] = now_local - timedelta(
+                seconds=rng.uniform(60, window_seconds)
+            )
+            rows.append(row)
+        with engine.begin() as conn:
+            conn.execute(insert(UserFeedback), rows)
+        remaining -= size
+
+
+async def _run(args) -> list:
+    database_path = use_temp_database("summary")
+    llm = FakeOpenAIServer(args.llm_latency_ms, args.completion_tokens).start()
+    lark = FakeLarkWebhook(args.webhook_latency_ms).start()
+    images = FakeImageHost().start()
+    os.environ["AI_API_KEY"] = "bench-key"
+    os.environ["OPENAI_API_BASE_URL"] = llm.base_url
+    os.environ["WEBHOOK_URL"] = f"{lark.url}/open-apis/bot/v2/hook/bench"
+    os.environ["OPENAI_MAX_RETRIES"] = "0"
+    os.environ["IMAGE_CHECK_ALLOW_PRIVATE_HOSTS"] = "true"  # The image host is on loopback
+
+    from sqlmodel import Session
+
+    from app import crud
+    from app.core.metrics import SUMMARY_STAGE_SECONDS
+    from app.database import async_session, create_db_and_tables, dispose_async_engine, engine
+    from app.services.feedback_analyzer import close_llm_client, init_llm_client
+    from app.services.webhook_outbox import webhook_outbox
+    from app.tasks.daily_summary import DAILY_JOB_NAME, _process_and_send_summary
+
+    create_db_and_tables()
+    init_llm_client()
+    rng = random.Random(args.seed)
+    results = []
+    seeded = 0
+    try:
+        for size in args.sizes:
+            seed_started = time.perf_counter()
+            _seed(engine, rng, size - seeded, images.url)
+            seeded = size
+            with Session(engine) as session:
+                crud.rebuild_hourly_rollups(session)
+            seed_seconds = time.perf_counter() - seed_started
+
+            stages_before = {
+                stage: SUMMARY_STAGE_SECONDS.snapshot(job=DAILY_JOB_NAME, stage=stage)[1]
+                for stage in _STAGES
+            }
+            llm_before, lark_before = llm.snapshot(), lark.snapshot()
+            images_before = images.snapshot()
+            started = time.perf_counter()
+            async with async_session() as session:
+                await _process_and_send_summary(
+                    session,
+                    datetime.now(timezone.utc) - timedelta(hours=24),
+                    DAILY_JOB_NAME,
+                )
+            elapsed = time.perf_counter() - started
+            # The job only queues the card; deliver it like the outbox worker would
+            delivery_started = time.perf_counter()
+            await webhook_outbox.deliver_due()
+            delivery_seconds = time.perf_counter() - delivery_started
+            llm_after, lark_after = llm.snapshot(), lark.snapshot()
+
+            results.append(
+                {
+                    "rows": size,
+                    "seed_seconds": round(seed_seconds, 3),
+                    "summary_seconds": round(elapsed, 3),
+                    "stage_seconds": {
+                        stage: round(
+                            SUMMARY_STAGE_SECONDS.snapshot(job=DAILY_JOB_NAME, stage=stage)[1]
+                            - stages_before[stage],
+                            3,
+                        )
+                        for stage in _STAGES
+                    },
+                    "webhook_delivery_seconds": round(delivery_seconds, 3),
+                    "llm_requests": int(llm_after["requests"] - llm_before["requests"]),
+                    "llm_prompt_tokens": int(
+                        llm_after.get("prompt_tokens", 0) - llm_before.get("prompt_tokens", 0)
+                    ),
+                    "llm_request_bytes": int(
+                        llm_after["request_bytes"] - llm_before["request_bytes"]
+                    ),
+                    "webhook_requests": int(lark_after["requests"] - lark_before["requests"]),
+                    "image_check_requests": int(
+                        images.snapshot()["requests"] - images_before["requests"]
+                    ),
+                    "peak_rss_mb": _peak_rss_mb(),
+                }
+            )
+            print(f"[bench] {size} rows: {elapsed:.2f}s", file=sys.stderr)
+    finally:
+        await close_llm_client()
+        await dispose_async_engine()
+        await webhook_outbox.stop()
+        llm.stop()
+        lark.stop()
+        images.stop()
+    print(f"[bench] database: {database_path}", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes("100,1000,10000,100000,500000"))
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=400)
+    parser.add_argument("--webhook-latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    # The pipeline logs with print(); keep stdout for the JSON document.
+    with redirect_stdout(sys.stderr):
+        results = asyncio.run(_run(args))
+    emit_json(
+        {
+            "benchmark": "summary",
+            "environment": environment_info(),
+            "parameters": {
+                "sizes": args.sizes,
+                "llm_latency_ms": args.llm_latency_ms,
+                "completion_tokens": args.completion_tokens,
+                "webhook_latency_ms": args.webhook_latency_ms,
+                "seed": args.seed,
+                "settings": {
+                    name: os.environ.get(name)
+                    for name in (
+                        "SUMMARY_CHUNK_TOKEN_BUDGET",
+                        "SUMMARY_MAX_CONCURRENCY",
+                        "SUMMARY_DEDUP_ENABLED",
+                        "SUMMARY_FETCH_BATCH_SIZE",
+                        "IMAGE_LINK_VALIDATION_ENABLED",
+                    )
+                },
+            },
+            "results": results,
+        },
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/common.py
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, List, Sequence
+
+FEEDBACK_TYPES = ["功能异常", "体验问题", "功能建议", "内容问题", "其他"]
+APP_CHANNELS = ["appstore", "huawei", "xiaomi", "oppo", "vivo", "official"]
+APP_VERSIONS = ["2.3.0", "2.3.1", "2.4.0", "2.4.1", "2.5.0"]
+_PHRASES = [
+    "打开页面后一直白屏",
+    "登录时提示网络错误",
+    "希望增加夜间模式",
+    "视频播放卡顿严重",
+    "消息推送不及时",
+    "搜索结果不准确",
+    "上传图片总是失败",
+    "会员续费后没有生效",
+    "字体太小看不清",
+    "希望支持批量导出",
+]
+
+
+def use_temp_database(prefix: str) -> str:
+    """
+    Points DATABASE_URL at a fresh SQLite file. Must run before anything from
+    `app` is imported, because settings and the engine are created at import.
+    """
+    directory = tempfile.mkdtemp(prefix=f"feedback-{prefix}-")
+    path = os.path.join(directory, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("DATABASE_ECHO", "false")
+    return path
+
+
+def make_feedback_payload(
+    rng: random.Random,
+    payload_bytes: int = 0,
+    image_base_url: str = "https://img.example.com",
+) -> Dict:
+    """
+    A plausible feedback body; `payload_bytes` pads the text to roughly that
+    size. About 10% carry an image link, a fifth of which are broken.
+    """
+    text = "，".join(rng.sample(_PHRASES, rng.randint(1, 3)))
+    if rng.random() < 0.5:
+        text += f"（第{rng.randint(1, 50)}次出现）"
+    if payload_bytes > 0:
+        filler = "详细描述" * (payload_bytes // 12 + 1)
+        text = (text + filler).encode("utf-8")[:payload_bytes].decode("utf-8", "ignore")
+    return {
+        "user_uid": f"u{rng.randint(1, 200000)}",
+        "device_id": rng.randint(1, 10**9),
+        "app_version": rng.choice(APP_VERSIONS),
+        "app_channel": rng.choice(APP_CHANNELS),
+        "user_agent": "Mozilla/5.0 (Linux; Android 14) bench",
+        "feedback_type": rng.choice(FEEDBACK_TYPES),
+        "feedback": text,
+        "image_url": (
+            f"{image_base_url}/{'broken/' if rng.random() < 0.2 else ''}{rng.randint(1, 10**6)}.jpg"
+            if rng.random() < 0.1
+            else None
+        ),
+        "debug": None,
+    }
+
+
+def percentiles(samples: Sequence[float], points=(50, 95, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles in milliseconds, keyed p50/p95/..."""
+    if not samples:
+        return {f"p{p}": 0.0 for p in points}
+    ordered = sorted(samples)
+    result = {}
+    for p in points:
+        rank = max(1, -(-p * len(ordered) // 100))  # ceil(p/100 * n)
+        result[f"p{p}"] = round(ordered[rank - 1] * 1000, 3)
+    return result
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info() -> Dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def emit_json(result: Dict, output: str | None):
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Results written to {output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def parse_sizes(value: str) -> List[int]:
+    sizes = sorted({int(part) for part in value.split(",") if part.strip()})
+    if not sizes or sizes[0] <= 0:
+        raise ValueError("Sizes must be positive integers, e.g. 100,1000,10000")
+    return sizes
@@ -0,0 +1,170 @@
+# benchmarks/fake_servers.py
+"""
+Local stand-ins for the OpenAI-compatible chat API and the Lark webhook, built
+on http.server so benchmarks need no network access or API keys.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen backlog of 5 drops connections under concurrent
+    # clients, which then stall for a 1s SYN retransmit
+    request_queue_size = 1024
+
+
+class _FakeServer:
+    def __init__(self):
+        self.stats: Dict[str, float] = {"requests": 0, "request_bytes": 0}
+        self._stats_lock = threading.Lock()
+        self._server = _HTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _record(self, **amounts):
+        with self._stats_lock:
+            for key, amount in amounts.items():
+                self.stats[key] = self.stats.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def handle_post(self, path: str, body: bytes) -> tuple[int, dict]:
+        return 405, {"error": "method not allowed"}
+
+    def handle_get(self, path: str) -> tuple[int, str, bytes]:
+        """Returns (status, content type, body) for GET and HEAD requests."""
+        return 404, "text/plain", b"not found"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                fake._record(requests=1, request_bytes=len(body))
+                status, payload = fake.handle_post(self.path, body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_get(self, include_body: bool):
+                fake._record(requests=1)
+                status, content_type, data = fake.handle_get(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if include_body:
+                    self.wfile.write(data)
+
+            def do_GET(self):
+                self._send_get(include_body=True)
+
+            def do_HEAD(self):
+                self._send_get(include_body=False)
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output clean
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name=type(self).__name__, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeOpenAIServer(_FakeServer):
+    """
+    Answers POST .../chat/completions after `latency_ms`, with a completion of
+    `completion_tokens` tokens (one CJK character per token) and usage figures.
+    """
+
+    def __init__(self, latency_ms: float = 200.0, completion_tokens: int = 400):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.completion_tokens = completion_tokens
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    def handle_post(self, path, body):
+        if not path.rstrip("/").endswith("/chat/completions"):
+            return 404, {"error": {"message": f"Unknown path {path}"}}
+        request = json.loads(body or b"{}")
+        prompt_chars = sum(
+            len(message.get("content") or "") for message in request.get("messages", [])
+        )
+        time.sleep(self.latency_ms / 1000)
+        # Same rough estimate the summarizer uses for budgeting
+        prompt_tokens = prompt_chars
+        self._record(prompt_tokens=prompt_tokens, completion_tokens=self.completion_tokens)
+        content = "## 概要\n" + "反" * max(0, self.completion_tokens - 4)
+        return 200, {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "bench-model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": prompt_tokens + self.completion_tokens,
+            },
+        }
+
+
+class FakeLarkWebhook(_FakeServer):
+    """Accepts any POST like a Lark bot webhook and answers {"code": 0}."""
+
+    def __init__(self, latency_ms: float = 20.0):
+        super().__init__()
+        self.latency_ms = latency_ms
+
+    def handle_post(self, path, body):
+        time.sleep(self.latency_ms / 1000)
+        return 200, {"code": 0, "msg": "success", "data": {}}
+
+
+class FakeImageHost(_FakeServer):
+    """Serves image links: paths containing "broken" are 404, everything else a tiny JPEG."""
+
+    def handle_get(self, path):
+        if "broken" in path:
+            return 404, "text/plain", b"not found"
+        return 200, "image/jpeg", b"\xff\xd8\xff\xd9"
@@ -0,0 +1,124 @@
+# tests/test_image_links.py
+"""
+Image link checks against a local stub server.
+
+    python -m unittest tests.test_image_links
+"""
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core.config import settings
+from app.services import image_links
+
+
+class _StubImageHandler(BaseHTTPRequestHandler):
+    # path -> (HEAD status, GET status, content type)
+    ROUTES = {
+        "/ok.jpg": (200, 200, "image/jpeg"),
+        "/no-head.jpg": (405, 206, "image/jpeg"),  # Rejects HEAD like some object stores
+        "/missing.jpg": (404, 404, "text/plain"),
+        "/error-page.jpg": (200, 200, "text/html; charset=utf-8"),
+    }
+
+    def _respond(self, method: str):
+        self.server.requests.append((method, self.path))
+        head_status, get_status, content_type = self.ROUTES.get(
+            self.path, (404, 404, "text/plain")
+        )
+        body = b"\xff" if method == "GET" else b""
+        self.send_response(head_status if method == "HEAD" else get_status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._respond("HEAD")
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageLinkValidationTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubImageHandler)
+        cls.server.requests = []
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+        image_links.clear_cache()
+        self._saved = {
+            name: getattr(settings, name)
+            for name in ("IMAGE_CHECK_ALLOW_PRIVATE_HOSTS", "IMAGE_CHECK_CACHE_TTL_SECONDS")
+        }
+        settings.IMAGE_CHECK_ALLOW_PRIVATE_HOSTS = True  # The stub is on loopback
+
+    def tearDown(self):
+        for name, value in self._saved.items():
+            setattr(settings, name, value)
+        image_links.clear_cache()
+
+    def _validate(self, *paths: str) -> dict:
+        urls = [self.base_url + path for path in paths]
+        results = asyncio.run(image_links.validate_image_urls(urls))
+        return {url[len(self.base_url):]: valid for url, valid in results.items()}
+
+    def test_head_answers_and_get_fallback(self):
+        results = self._validate(
+            "/ok.jpg", "/no-head.jpg", "/missing.jpg", "/error-page.jpg"
+        )
+        self.assertEqual(
+            results,
+            {
+                "/ok.jpg": True,
+                "/no-head.jpg": True,
+                "/missing.jpg": False,
+                "/error-page.jpg": False,
+            },
+        )
+        # Only the link whose HEAD was rejected is fetched with GET
+        gets = [path for method, path in self.server.requests if method == "GET"]
+        self.assertEqual(gets, ["/no-head.jpg"])
+
+    def test_answers_are_cached_until_they_expire(self):
+        settings.IMAGE_CHECK_CACHE_TTL_SECONDS = 3600
+        self._validate("/ok.jpg", "/missing.jpg")
+        self._validate("/ok.jpg", "/missing.jpg")
+        self.assertEqual(len(self.server.requests), 2)
+
+        image_links.clear_cache()
+        settings.IMAGE_CHECK_CACHE_TTL_SECONDS = -1  # Entries expire immediately
+        self._validate("/ok.jpg")
+        self._validate("/ok.jpg")
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_private_and_non_http_targets_are_rejected(self):
+        settings.IMAGE_CHECK_ALLOW_PRIVATE_HOSTS = False
+        urls = [
+            self.base_url + "/ok.jpg",
+            "http://localhost/ok.jpg",
+            "http://10.0.0.8/ok.jpg",
+            "http://[::1]/ok.jpg",
+            "file:///etc/passwd",
+        ]
+        results = asyncio.run(image_links.validate_image_urls(urls))
+        self.assertEqual(results, {url: False for url in urls})
+        self.assertEqual(self.server.requests, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+# tests/test_incremental_summary.py
+"""
+Chaining stored daily summaries into a weekly report window.
+
+    python -m unittest tests.test_incremental_summary
+"""
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.tasks.daily_summary import _chain_daily_windows
+
+WEEK_END = datetime(2024, 6, 9, 19, 0)
+
+
+def _daily(end: datetime, hours: int = 24) -> SimpleNamespace:
+    return SimpleNamespace(window_start=end - timedelta(hours=hours), window_end=end)
+
+
+def _duration(ranges: list) -> timedelta:
+    return sum((end - start for start, end in ranges), timedelta())
+
+
+class ChainDailyWindowsTest(unittest.TestCase):
+    def test_jittered_daily_windows_are_all_reused(self):
+        # Each daily run starts a few ms earlier or later in its cycle than the
+        # one before, so neighbouring windows overlap or leave a gap of ms
+        jitter_ms = [3, 1, 5, 2, 6, 0, 4]
+        stored = [
+            _daily(WEEK_END - timedelta(days=6 - day, milliseconds=-jitter))
+            for day, jitter in enumerate(jitter_ms)
+        ]
+        start = WEEK_END - timedelta(days=7, milliseconds=-2)
+        end = WEEK_END + timedelta(milliseconds=8)
+
+        used, uncovered = _chain_daily_windows(stored, start, end)
+
+        self.assertEqual(used, stored)
+        self.assertLess(_duration(uncovered), timedelta(seconds=1))
+        for range_start, range_end in uncovered:
+            self.assertLess(range_start, range_end)
+
+    def test_overlapping_interval_windows_are_skipped(self):
+        # A 24h window every 12h: only every other one can be chained
+        stored = [_daily(WEEK_END - timedelta(hours=12 * i)) for i in range(4, -1, -1)]
+        start = WEEK_END - timedelta(days=3)
+
+        used, uncovered = _chain_daily_windows(stored, start, WEEK_END)
+
+        self.assertEqual(used, stored[::2])
+        self.assertEqual(uncovered, [])
+
+    def test_gaps_and_tail_are_uncovered(self):
+        stored = [_daily(WEEK_END - timedelta(days=5)), _daily(WEEK_END - timedelta(days=2))]
+        start = WEEK_END - timedelta(days=7)
+
+        used, uncovered = _chain_daily_windows(stored, start, WEEK_END)
+
+        self.assertEqual(used, stored)
+        self.assertEqual(
+            uncovered,
+            [
+                (start, WEEK_END - timedelta(days=6)),
+                (WEEK_END - timedelta(days=5), WEEK_END - timedelta(days=3)),
+                (WEEK_END - timedelta(days=2), WEEK_END),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
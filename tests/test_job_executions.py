@@ -0,0 +1,82 @@
+# tests/test_job_executions.py
+"""
+Claims on scheduled job occurrences, against an in-memory SQLite database.
+
+    python -m unittest tests.test_job_executions
+"""
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import crud, models
+
+OCCURRENCE = datetime(2024, 6, 2, 17, 0)
+TTL_SECONDS = 30
+
+
+class JobExecutionClaimTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        SQLModel.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def _claim(self, owner: str) -> models.JobExecution | None:
+        with Session(self.engine, expire_on_commit=False) as session:
+            return crud.claim_job_execution(
+                session, "daily", OCCURRENCE, owner, TTL_SECONDS
+            )
+
+    def _age(self, execution: models.JobExecution, seconds: float):
+        """Moves a claim's start back in time, as if it had been made `seconds` ago."""
+        with Session(self.engine) as session:
+            row = session.get(models.JobExecution, execution.id)
+            row.started_at -= timedelta(seconds=seconds)
+            session.add(row)
+            session.commit()
+
+    def test_running_claim_is_exclusive_within_the_ttl(self):
+        self.assertIsNotNone(self._claim("worker-a"))
+        self.assertIsNone(self._claim("worker-b"))
+
+    def test_stale_running_claim_is_taken_over_once(self):
+        first = self._claim("worker-a")
+        self._age(first, TTL_SECONDS + 1)
+
+        taken = self._claim("worker-b")
+        self.assertIsNotNone(taken)
+        self.assertEqual(taken.id, first.id)
+        self.assertEqual(taken.owner, "worker-b")
+        self.assertEqual(taken.status, "running")
+        # The takeover restarts the clock, so nobody else takes it right away
+        self.assertIsNone(self._claim("worker-c"))
+
+    def test_finished_claim_is_never_taken_over(self):
+        first = self._claim("worker-a")
+        with Session(self.engine) as session:
+            crud.finish_job_execution(
+                session, session.get(models.JobExecution, first.id), "failed"
+            )
+        self._age(first, TTL_SECONDS + 1)
+        self.assertIsNone(self._claim("worker-b"))
+
+    def test_stale_claims_are_listed(self):
+        stale = self._claim("worker-a")
+        self._age(stale, TTL_SECONDS + 1)
+        with Session(self.engine) as session:
+            crud.claim_job_execution(
+                session, "weekly", OCCURRENCE, "worker-a", TTL_SECONDS
+            )
+            listed = crud.get_stale_job_executions(session, TTL_SECONDS)
+        self.assertEqual([execution.id for execution in listed], [stale.id])
+
+
+if __name__ == "__main__":
+    unittest.main()